@@ -1,23 +1,31 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, Response, send_file, session, flash
+from flask import Flask, render_template, request, redirect, url_for, jsonify, Response, send_file, session, flash, g, stream_with_context
 from datetime import datetime, timedelta
+import hmac
+import io
 import json
 import time
 import random
 import logging
 from collections import deque
-from io import BytesIO
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from functools import wraps
 import atexit
-from reportlab.lib.units import inch
 import os
+import numpy as np
 import psycopg2
 import psycopg2.extras
 from werkzeug.security import generate_password_hash, check_password_hash
 from dotenv import load_dotenv
+from database import get_db_connection, release_db_connection, get_pool, request_queries
+from events import publish_event, get_broker, stream_events, long_lived_streams
+from reports import submit_report_job, get_report_job
+from cache import tenant_cached, invalidate_tenant, get_cache
+from listings import fetch_orders, fetch_inventory, fetch_history, parse_page_size, serialize_row
+from listings import search_inventory, DEFAULT_SEARCH_RESULTS, MAX_SEARCH_RESULTS
+from forecast_store import refresh_item_models, item_forecasts
+from replenishment import replenishment_settings, replenishment_plan, plan_records
+from request_metrics import RequestMetrics, prometheus_text, server_timing
+from inventory_import import import_inventory
+from exports import EXPORTS, MIMETYPES, parse_date_range, export_stream, accepts_gzip
 
 # Load environment variables
 load_dotenv()
@@ -28,17 +36,50 @@ app.secret_key = os.getenv('SECRET_KEY')
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
 
-# Database connection helper
-def get_db_connection():
-    conn = psycopg2.connect(
-        host=os.getenv('DB_HOST'),
-        database=os.getenv('DB_NAME'),
-        user=os.getenv('DB_USER'),
-        password=os.getenv('DB_PASSWORD'),
-        port=os.getenv('DB_PORT')
-    )
-    conn.autocommit = True
-    return conn
+# Largest batch accepted by /add_orders_bulk
+MAX_BULK_ORDERS = int(os.getenv('MAX_BULK_ORDERS', 500))
+
+# Database connections are borrowed from a per-worker pool and
+# returned when the request's app context is torn down
+app.teardown_appcontext(release_db_connection)
+
+# Per-endpoint request and SQL timings, exposed at /metrics
+endpoint_metrics = RequestMetrics()
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 500))
+
+# Precomputed forecasts older than this are not shown
+FORECAST_MAX_AGE_DAYS = int(os.getenv('FORECAST_MAX_AGE_DAYS', 2))
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Add Server-Timing, count the request's queries and log it if slow"""
+    start = g.get('request_start')
+    if start is None:
+        return response
+    
+    seconds = time.perf_counter() - start
+    queries = request_queries()
+    endpoint = request.endpoint or 'unknown'
+    slow = seconds * 1000 >= SLOW_REQUEST_MS
+    
+    response.headers['Server-Timing'] = server_timing(seconds, queries)
+    endpoint_metrics.record(endpoint, request.method, response.status_code, seconds, queries, slow)
+    
+    if slow:
+        query_log = '\n'.join(
+            f"  {duration * 1000:8.1f}ms  {' '.join(sql.split())[:300]}"
+            for sql, duration in queries
+        )
+        app.logger.warning(
+            f"Slow request {request.method} {request.path} ({endpoint}): "
+            f"{seconds * 1000:.1f}ms, {len(queries)} queries, "
+            f"{sum(duration for _, duration in queries) * 1000:.1f}ms in SQL\n{query_log}"
+        )
+    return response
 
 # Login required decorator
 def login_required(f):
@@ -49,6 +90,24 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Metrics endpoints are for scrapers, not users: they are authenticated by
+# METRICS_TOKEN (sent as "Authorization: Bearer <token>") instead of a
+# session, and are disabled while no token is configured
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ROUTES = ['metrics', 'db_pool_metrics', 'event_metrics', 'cache_metrics']
+
+def metrics_token_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not METRICS_TOKEN:
+            return Response('Metrics are disabled; set METRICS_TOKEN\n', status=404, mimetype='text/plain')
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(token.strip(), METRICS_TOKEN):
+            return Response('Invalid metrics token\n', status=401, mimetype='text/plain',
+                            headers={'WWW-Authenticate': 'Bearer'})
+        return f(*args, **kwargs)
+    return decorated_function
+
 # Helper functions - make sure these are the ONLY definitions of these functions
 def get_low_stock_products(user_email):
     """Get low stock products for specific user"""
@@ -111,6 +170,7 @@ def get_category_data(user_email):
         'quantity_data': quantity_data
     }
 
+@tenant_cached('sales_data')
 def get_sales_data(user_email):
     """Get sales data for charts"""
     conn = get_db_connection()
@@ -148,6 +208,7 @@ def get_sales_data(user_email):
         }
     }
 
+@tenant_cached('inventory_data')
 def get_inventory_data(user_email):
     """Get both category and item-wise inventory data"""
     conn = get_db_connection()
@@ -222,43 +283,49 @@ def get_inventory_data(user_email):
         }
     }
 
+@tenant_cached('forecasting_data')
 def get_forecasting_data(user_email):
     """Get forecasting data for specific user"""
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    
-    forecast = {}
+    cur = conn.cursor()
     
-    # Calculate average daily sales for each product
-    cur.execute("SELECT item_name, SUM(quantity) as total_quantity, COUNT(DISTINCT DATE(created_at)) as days_with_sales FROM order_items WHERE user_id = %s AND created_at >= NOW() - INTERVAL '30 days' GROUP BY item_name", (session['user_id'],))
-    sales_data = cur.fetchall()
+    # Top 10 products by 7-day forecast, precomputed by forecast_job
+    cur.execute("""
+        SELECT series, forecast FROM forecasts
+        WHERE user_id = %s AND kind = 'item' AND horizon_days = 7
+          AND computed_for >= %s
+        ORDER BY forecast DESC
+        LIMIT 10
+    """, (session['user_id'], datetime.now().date() - timedelta(days=FORECAST_MAX_AGE_DAYS)))
+    precomputed = cur.fetchall()
     
-    for sale in sales_data:
-        name = sale['item_name']
-        total_quantity = sale['total_quantity']
-        days_with_sales = sale['days_with_sales']
-        
-        avg_daily_sales = total_quantity / max(days_with_sales, 1)
-        forecast[name] = max(0, avg_daily_sales * 7)  # 7-day forecast
+    if precomputed:
+        cur.close()
+        conn.close()
+        return {
+            'labels': [row[0] for row in precomputed],
+            'data': [round(row[1], 2) for row in precomputed]
+        }
     
-    # Sort by forecasted quantity
-    sorted_forecast = sorted(forecast.items(), 
-                           key=lambda x: x[1],
-                           reverse=True)[:10]  # Top 10 items
+    # Tenants the nightly job has not reached recently are forecast in
+    # memory; storing models is left to the job, not a GET
+    models = refresh_item_models(cur, session['user_id'], save=False)
+    cur.close()
+    conn.close()
     
     # Ensure we have at least some data
-    if not sorted_forecast:
+    if len(models) == 0:
         return {
             'labels': ['No Data'],
             'data': [0]
         }
     
-    cur.close()
-    conn.close()
+    forecast = item_forecasts(models, horizons=(7,))[7]['forecast']
+    top = np.argsort(-forecast, kind='stable')[:10]
     
     return {
-        'labels': [item[0] for item in sorted_forecast],
-        'data': [item[1] for item in sorted_forecast]
+        'labels': [str(models['series'].iloc[i]) for i in top],
+        'data': [round(float(forecast[i]), 2) for i in top]
     }
 
 def format_indian_currency(amount):
@@ -369,66 +436,59 @@ def dashboard():
     
     user_id = session['user_id']
     
-    # Get inventory count
-    cur.execute("SELECT COUNT(*) FROM inventory WHERE user_id = %s", (user_id,))
-    inventory_count = cur.fetchone()[0]
-    
-    # Get categories count
-    cur.execute("SELECT COUNT(*) FROM categories WHERE user_id = %s", (user_id,))
-    categories_count = cur.fetchone()[0]
-    
-    # Get orders count
-    cur.execute("SELECT COUNT(*) FROM orders WHERE user_id = %s", (user_id,))
-    orders_count = cur.fetchone()[0]
-    
-    # Get total stock value
-    cur.execute(
-        "SELECT COALESCE(SUM(quantity * price), 0) FROM inventory WHERE user_id = %s", 
-        (user_id,)
-    )
-    stock_value = cur.fetchone()[0]
-    
-    # Get total sales (sum of all orders)
-    cur.execute(
-        "SELECT COALESCE(SUM(total), 0) FROM orders WHERE user_id = %s",
-        (user_id,)
-    )
-    total_sales = cur.fetchone()[0]
-    
-    # Get low stock items - RENAMED TO low_stock_products
-    cur.execute("""
-        SELECT * FROM inventory 
-        WHERE user_id = %s AND quantity <= min_stock AND quantity > 0
-        ORDER BY quantity ASC
-        LIMIT 5
-    """, (user_id,))
-    low_stock_products = cur.fetchall()  # Changed variable name from low_stock to low_stock_products
-    
-    # Get recent orders
-    cur.execute("""
-        SELECT o.id, o.order_number, o.customer, o.total, o.created_at,
-               to_char(o.created_at, 'YYYY-MM-DD') as formatted_date
-        FROM orders o 
-        WHERE o.user_id = %s 
-        ORDER BY o.created_at DESC 
-        LIMIT 5
-    """, (user_id,))
-    orders = cur.fetchall()
-    
-    # Get recent activities
+    # Everything the dashboard shows in one statement, so the page costs a
+    # single round trip to the database
     cur.execute("""
-        SELECT *, to_char(created_at, 'YYYY-MM-DD HH24:MI:SS') as formatted_date
-        FROM history 
-        WHERE user_id = %s 
-        ORDER BY created_at DESC 
-        LIMIT 10
-    """, (user_id,))
-    recent_activities = cur.fetchall()
-    
-    # Get company name
-    cur.execute("SELECT company_name FROM users WHERE id = %s", (user_id,))
-    user_result = cur.fetchone()
-    company_name = user_result['company_name'] if user_result else ''
+        SELECT json_build_object(
+            'stats', (
+                SELECT row_to_json(s) FROM (
+                    SELECT inventory_count, categories_count, orders_count, stock_value, total_sales
+                    FROM tenant_stats
+                    WHERE user_id = %(user_id)s
+                ) s
+            ),
+            'low_stock_products', COALESCE((
+                SELECT json_agg(i ORDER BY i.quantity) FROM (
+                    SELECT * FROM inventory
+                    WHERE user_id = %(user_id)s AND quantity <= min_stock AND quantity > 0
+                    ORDER BY quantity ASC
+                    LIMIT 5
+                ) i
+            ), '[]'::json),
+            'orders', COALESCE((
+                SELECT json_agg(o ORDER BY o.created_at DESC) FROM (
+                    SELECT o.id, o.order_number, o.customer, o.total, o.created_at,
+                           to_char(o.created_at, 'YYYY-MM-DD') as formatted_date
+                    FROM orders o
+                    WHERE o.user_id = %(user_id)s
+                    ORDER BY o.created_at DESC
+                    LIMIT 5
+                ) o
+            ), '[]'::json),
+            'recent_activities', COALESCE((
+                SELECT json_agg(h ORDER BY h.created_at DESC) FROM (
+                    SELECT *, to_char(created_at, 'YYYY-MM-DD HH24:MI:SS') as formatted_date
+                    FROM history
+                    WHERE user_id = %(user_id)s
+                    ORDER BY created_at DESC
+                    LIMIT 10
+                ) h
+            ), '[]'::json),
+            'company_name', (SELECT company_name FROM users WHERE id = %(user_id)s)
+        )
+    """, {'user_id': user_id})
+    data = cur.fetchone()[0]
+    
+    stats = data['stats'] or {}
+    inventory_count = stats.get('inventory_count', 0)
+    categories_count = stats.get('categories_count', 0)
+    orders_count = stats.get('orders_count', 0)
+    stock_value = stats.get('stock_value', 0)
+    total_sales = stats.get('total_sales', 0)
+    low_stock_products = data['low_stock_products']
+    orders = data['orders']
+    recent_activities = data['recent_activities']
+    company_name = data['company_name'] or ''
     
     cur.close()
     conn.close()
@@ -455,40 +515,8 @@ def orders_page():
     
     user_id = session['user_id']
     
-    # Get all orders
-    cur.execute("""
-        SELECT * FROM orders
-        WHERE user_id = %s
-        ORDER BY id DESC
-    """, (user_id,))
-    
-    orders_data = cur.fetchall()
-    
-    # Convert DictRow objects to regular dictionaries to allow adding keys
-    orders = []
-    for order_row in orders_data:
-        # Convert to regular dictionary
-        order = dict(order_row)
-        
-        # Get items for this order
-        cur.execute("""
-            SELECT oi.*, i.name as item_name, i.category_id, c.name as category_name
-            FROM order_items oi
-            JOIN inventory i ON oi.item_id = i.id
-            LEFT JOIN categories c ON i.category_id = c.id
-            WHERE oi.order_id = %s
-        """, (order['id'],))
-        
-        order_items = cur.fetchall()
-        
-        # Convert order items to regular dictionaries too
-        items = []
-        for item in order_items:
-            items.append(dict(item))
-        
-        # Add items to the order dictionary
-        order['items'] = items
-        orders.append(order)
+    # Get the first page of orders; later pages come from /api/orders
+    orders, next_cursor = fetch_orders(cur, user_id)
     
     # Get currency setting
     cur.execute("""
@@ -501,7 +529,148 @@ def orders_page():
     cur.close()
     conn.close()
     
-    return render_template('orders.html', orders=orders, currency=currency)
+    return render_template('orders.html', orders=orders, next_cursor=next_cursor, currency=currency)
+
+def parse_order_lines(data):
+    """Collect (item_id, quantity, price) tuples from order form or JSON data"""
+    item_ids = data.get('order_items') or []
+    quantities = data.get('quantities') or []
+    prices = data.get('prices') or []
+    
+    if not item_ids:
+        raise ValueError("Order has no items")
+    if not len(item_ids) == len(quantities) == len(prices):
+        raise ValueError("order_items, quantities and prices must have the same length")
+    
+    return [
+        (int(item_ids[i]), int(quantities[i]), float(prices[i]))
+        for i in range(len(item_ids))
+    ]
+
+def next_order_number(cur, user_id):
+    """Allocate the next ORD-YYYYMMDD-XXXX number for a tenant.
+    
+    Numbers come from a per-tenant, per-day counter row, so allocation is a
+    single-row upsert. The row lock is held until the caller's transaction
+    ends, which serializes concurrent checkouts of the same tenant only.
+    """
+    today = datetime.now().date()
+    prefix = f"ORD-{today.strftime('%Y%m%d')}-"
+    
+    cur.execute(
+        """
+        UPDATE order_number_counters
+        SET last_value = last_value + 1
+        WHERE user_id = %s AND day = %s
+        RETURNING last_value
+        """,
+        (user_id, today)
+    )
+    result = cur.fetchone()
+    
+    if result is None:
+        # First order of the day: seed the counter from numbers already
+        # issued today (e.g. before the counter table existed)
+        cur.execute(
+            """
+            SELECT MAX(order_number) FROM orders
+            WHERE user_id = %s AND order_number LIKE %s
+            """,
+            (user_id, prefix + '%')
+        )
+        max_number = cur.fetchone()[0]
+        seed = int(max_number.split('-')[-1]) if max_number else 0
+        
+        cur.execute(
+            """
+            INSERT INTO order_number_counters (user_id, day, last_value)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (user_id, day)
+            DO UPDATE SET last_value = order_number_counters.last_value + 1
+            RETURNING last_value
+            """,
+            (user_id, today, seed + 1)
+        )
+        result = cur.fetchone()
+    
+    # Format order number with leading zeros (4 digits)
+    return f'{prefix}{result[0]:04d}'
+
+def create_order(cur, user_id, customer, lines):
+    """Insert an order and its items and decrement stock with set-based statements.
+    
+    Must run inside a transaction; the caller commits or rolls back.
+    """
+    order_number = next_order_number(cur, user_id)
+    
+    # Calculate the total order amount
+    total = sum(quantity * price for _, quantity, price in lines)
+    
+    # Look up the names of all ordered items at once
+    item_ids = sorted({item_id for item_id, _, _ in lines})
+    cur.execute(
+        "SELECT id, name FROM inventory WHERE user_id = %s AND id = ANY(%s)",
+        (user_id, item_ids)
+    )
+    item_names = {row['id']: row['name'] for row in cur.fetchall()}
+    
+    missing = [item_id for item_id in item_ids if item_id not in item_names]
+    if missing:
+        raise ValueError(f"Item with ID {missing[0]} not found")
+    
+    # Insert the order with order_number, customer and total
+    cur.execute(
+        """
+        INSERT INTO orders 
+        (user_id, order_number, customer, total, status) 
+        VALUES (%s, %s, %s, %s, 'pending')
+        RETURNING id
+        """,
+        (user_id, order_number, customer, total)
+    )
+    order_id = cur.fetchone()['id']
+    
+    # Insert all order items in one statement
+    psycopg2.extras.execute_values(
+        cur,
+        """
+        INSERT INTO order_items
+        (order_id, item_id, item_name, quantity, price, user_id)
+        VALUES %s
+        """,
+        [(order_id, item_id, item_names[item_id], quantity, price, user_id)
+         for item_id, quantity, price in lines]
+    )
+    
+    # Decrement stock in one statement. Quantities are summed per item first
+    # because UPDATE ... FROM applies only one matching row per target row
+    stock_changes = {}
+    for item_id, quantity, _ in lines:
+        stock_changes[item_id] = stock_changes.get(item_id, 0) + quantity
+    
+    psycopg2.extras.execute_values(
+        cur,
+        """
+        UPDATE inventory AS i
+        SET quantity = i.quantity - v.quantity
+        FROM (VALUES %s) AS v(item_id, quantity, user_id)
+        WHERE i.id = v.item_id AND i.user_id = v.user_id
+        """,
+        [(item_id, quantity, user_id) for item_id, quantity in stock_changes.items()]
+    )
+    
+    publish_event(cur, user_id, 'order_created', {
+        "order_id": order_id,
+        "order_number": order_number,
+        "customer": customer,
+        "total": total
+    })
+    
+    return {
+        "order_id": order_id,
+        "order_number": order_number,
+        "total": total
+    }
 
 # Add order route (protected)
 @app.route('/add_order', methods=['POST'])
@@ -522,117 +691,105 @@ def add_order():
                 'prices': request.form.getlist('prices[]')
             }
         
+        lines = parse_order_lines(data)
+        
         conn = get_db_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
         
-        # Generate an order number (format: ORD-YYYYMMDD-XXXX)
-        from datetime import datetime
-        today = datetime.now().strftime('%Y%m%d')
+        # Run the whole order in one transaction so it is never partially applied
+        conn.autocommit = False
+        try:
+            with conn:
+                order = create_order(cur, user_id, data.get('customer', 'Walk-in Customer'), lines)
+        finally:
+            conn.autocommit = True
         
-        # Get the latest order number for today to increment
-        cur.execute(
-            """
-            SELECT MAX(order_number) as max_number FROM orders 
-            WHERE order_number LIKE %s
-            """, 
-            (f'ORD-{today}-%',)
-        )
+        invalidate_tenant(user_id)
         
-        result = cur.fetchone()
-        if result and result['max_number']:
-            # Extract the sequence number and increment
-            last_seq = int(result['max_number'].split('-')[-1])
-            new_seq = last_seq + 1
-        else:
-            # First order of the day
-            new_seq = 1
-            
-        # Format order number with leading zeros (4 digits)
-        order_number = f'ORD-{today}-{new_seq:04d}'
+        cur.close()
+        conn.close()
         
-        # Calculate the total order amount
-        total = 0
-        for i in range(len(data['order_items'])):
-            quantity = int(data['quantities'][i])
-            price = float(data['prices'][i])
-            total += quantity * price
+        return jsonify({
+            "success": True,
+            **order,
+            "message": "Order created successfully"
+        })
         
-        # Insert the order with order_number, customer and total
-        cur.execute(
-            """
-            INSERT INTO orders 
-            (user_id, order_number, customer, total, status) 
-            VALUES (%s, %s, %s, %s, 'pending')
-            RETURNING id
-            """,
-            (user_id, order_number, data.get('customer', 'Walk-in Customer'), total)
-        )
-        order_id = cur.fetchone()['id']
+    except Exception as e:
+        print(f"Error creating order: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+# Bulk order route for POS sync (protected)
+@app.route('/add_orders_bulk', methods=['POST'])
+@login_required
+def add_orders_bulk():
+    try:
+        user_id = session['user_id']
         
-        # Insert order items
-        for i in range(len(data['order_items'])):
-            item_id = int(data['order_items'][i])
-            quantity = int(data['quantities'][i])
-            price = float(data['prices'][i])
-            
-            # Get the item name from the inventory table
-            cur.execute(
-                """
-                SELECT name FROM inventory
-                WHERE id = %s AND user_id = %s
-                """,
-                (item_id, user_id)
-            )
-            
-            item_result = cur.fetchone()
-            if not item_result:
-                raise Exception(f"Item with ID {item_id} not found")
-                
-            item_name = item_result['name']
-            
-            # Insert order item with the item name
-            cur.execute(
-                """
-                INSERT INTO order_items
-                (order_id, item_id, item_name, quantity, price)
-                VALUES (%s, %s, %s, %s, %s)
-                """,
-                (order_id, item_id, item_name, quantity, price)
-            )
-            
-            # Update inventory quantity
-            cur.execute(
-                """
-                UPDATE inventory
-                SET quantity = quantity - %s
-                WHERE id = %s AND user_id = %s
-                """,
-                (quantity, item_id, user_id)
-            )
+        data = request.get_json(silent=True) or {}
+        orders_data = data.get('orders')
+        if not isinstance(orders_data, list) or not orders_data:
+            return jsonify({
+                "success": False,
+                "error": "Request must contain a non-empty 'orders' list"
+            }), 400
+        
+        if len(orders_data) > MAX_BULK_ORDERS:
+            return jsonify({
+                "success": False,
+                "error": f"At most {MAX_BULK_ORDERS} orders per request"
+            }), 400
+        
+        # Validate every order before touching the database
+        parsed = [
+            (order.get('customer', 'Walk-in Customer'), parse_order_lines(order))
+            for order in orders_data
+        ]
+        
+        conn = get_db_connection()
+        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        
+        # All orders are created in one transaction: either every order is
+        # recorded or none is, so the sync job can safely retry the batch
+        conn.autocommit = False
+        try:
+            with conn:
+                created = [create_order(cur, user_id, customer, lines) for customer, lines in parsed]
+        finally:
+            conn.autocommit = True
+        
+        invalidate_tenant(user_id)
         
-        conn.commit()
         cur.close()
         conn.close()
         
         return jsonify({
             "success": True,
-            "order_id": order_id,
-            "order_number": order_number,
-            "total": total,
-            "message": "Order created successfully"
+            "orders": created,
+            "message": f"{len(created)} orders created successfully"
         })
         
     except Exception as e:
-        print(f"Error creating order: {str(e)}")
+        print(f"Error creating bulk orders: {str(e)}")
         return jsonify({
             "success": False,
             "error": str(e)
         }), 500
 
+@app.context_processor
+def inject_live_events():
+    return {'live_events': long_lived_streams()}
+
 # Protect all other routes
 @app.before_request
 def require_login():
     allowed_routes = ['login', 'register', 'static']
+    # Metrics routes check their own token in metrics_token_required
+    if request.endpoint in METRICS_ROUTES:
+        return None
     if request.endpoint not in allowed_routes and 'username' not in session:
         flash('Please login to access this page.', 'error')
         return redirect(url_for('login'))
@@ -647,18 +804,8 @@ def inventory():
         
         user_id = session['user_id']
         
-        # Get inventory items
-        cur.execute("""
-            SELECT i.*, c.name as category_name 
-            FROM inventory i
-            LEFT JOIN categories c ON i.category_id = c.id
-            WHERE i.user_id = %s
-            ORDER BY i.name ASC
-        """, (user_id,))
-        items = cur.fetchall()
-        
-        # Print for debugging
-        print(f"Retrieved {len(items)} inventory items for user {user_id}")
+        # Get the first page of inventory items; later pages come from /api/inventory
+        items, next_cursor = fetch_inventory(cur, user_id)
         
         # Get categories for dropdown
         cur.execute("""
@@ -680,12 +827,12 @@ def inventory():
         conn.close()
         
         # Convert DictRow objects to regular dictionaries to avoid template issues
-        items_list = [dict(item) for item in items]
         categories_list = [dict(category) for category in categories]
         
         return render_template(
             'inventory.html',
-            items=items_list,
+            items=items,
+            next_cursor=next_cursor,
             categories=categories_list,
             currency=currency
         )
@@ -756,11 +903,19 @@ def add_category():
             (name, user_id)
         )
         new_id = cur.fetchone()['id']
+        
+        publish_event(cur, user_id, 'category_added', {
+            "category_id": new_id,
+            "name": name
+        })
+        
         conn.commit()
         
         cur.close()
         conn.close()
         
+        invalidate_tenant(user_id)
+        
         return jsonify({
             "success": True,
             "id": new_id,
@@ -782,19 +937,121 @@ def history_page():
     
     user_id = session['user_id']
     
-    # Get all history items
-    cur.execute("""
-        SELECT *, to_char(created_at, 'YYYY-MM-DD HH24:MI:SS') as formatted_date
-        FROM history 
-        WHERE user_id = %s 
-        ORDER BY created_at DESC
-    """, (user_id,))
-    history_items = cur.fetchall()
+    # Get the first page of history; later pages come from /api/history
+    history_items, next_cursor = fetch_history(cur, user_id)
+    
+    cur.close()
+    conn.close()
+    
+    return render_template('history.html', history=history_items, next_cursor=next_cursor)
+
+@app.route('/api/orders')
+@login_required
+def api_orders():
+    """Keyset-paginated order listing with optional filters"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        
+        orders, next_cursor = fetch_orders(
+            cur, session['user_id'],
+            cursor=request.args.get('cursor'),
+            limit=parse_page_size(request.args.get('limit')),
+            status=request.args.get('status') or None,
+            category_id=request.args.get('category_id', type=int),
+            q=request.args.get('q', '').strip() or None
+        )
+        
+        cur.close()
+        conn.close()
+        
+        return jsonify({
+            "success": True,
+            "orders": [serialize_row(order) for order in orders],
+            "next_cursor": next_cursor
+        })
+    
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+@app.route('/api/inventory')
+@login_required
+def api_inventory():
+    """Keyset-paginated inventory listing with optional filters"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        
+        items, next_cursor = fetch_inventory(
+            cur, session['user_id'],
+            cursor=request.args.get('cursor'),
+            limit=parse_page_size(request.args.get('limit')),
+            category_id=request.args.get('category_id', type=int),
+            low_stock=request.args.get('low_stock') in ('1', 'true'),
+            q=request.args.get('q', '').strip() or None
+        )
+        
+        cur.close()
+        conn.close()
+        
+        return jsonify({
+            "success": True,
+            "items": [serialize_row(item) for item in items],
+            "next_cursor": next_cursor
+        })
+    
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+@app.route('/search_items')
+@login_required
+def search_items():
+    """Ranked item lookup by SKU, barcode or name for search boxes and scanners"""
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({"success": False, "error": "q is required"}), 400
+    
+    limit = request.args.get('limit', DEFAULT_SEARCH_RESULTS, type=int)
+    limit = max(1, min(limit, MAX_SEARCH_RESULTS))
     
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    items = search_inventory(cur, session['user_id'], q, limit)
     cur.close()
     conn.close()
     
-    return render_template('history.html', history=history_items)
+    return jsonify({
+        "success": True,
+        "items": [serialize_row(item) for item in items]
+    })
+
+@app.route('/api/history')
+@login_required
+def api_history():
+    """Keyset-paginated history listing with optional filters"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        
+        history_items, next_cursor = fetch_history(
+            cur, session['user_id'],
+            cursor=request.args.get('cursor'),
+            limit=parse_page_size(request.args.get('limit')),
+            action=request.args.get('action') or None,
+            q=request.args.get('q', '').strip() or None
+        )
+        
+        cur.close()
+        conn.close()
+        
+        return jsonify({
+            "success": True,
+            "history": [serialize_row(entry) for entry in history_items],
+            "next_cursor": next_cursor
+        })
+    
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
 
 @app.route('/settings')
 @login_required
@@ -850,105 +1107,83 @@ def update_company_name():
             "message": "Failed to update company name"
         }), 500
 
-@app.route('/analytics')
-@login_required
-def analytics_page():
+@tenant_cached('analytics')
+def get_analytics_data(user_id):
+    """Get the analytics page aggregates for a user"""
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    
-    user_id = session['user_id']
-    
-    # Get sales data by month
-    cur.execute("""
-        SELECT 
-            to_char(created_at, 'YYYY-MM') as month,
-            SUM(total) as revenue
-        FROM orders
-        WHERE user_id = %s
-        GROUP BY month
-        ORDER BY month ASC
-    """, (user_id,))
-    monthly_sales = cur.fetchall()
-    
-    # Format monthly sales for JSON chart data
-    sales_data = []
-    for sale in monthly_sales:
-        sales_data.append({
-            'month': sale['month'],
-            'revenue': float(sale['revenue']) if sale['revenue'] else 0
-        })
-    
-    # Get top selling products
-    cur.execute("""
-        SELECT 
-            i.name,
-            SUM(oi.quantity) as total_sold
-        FROM order_items oi
-        JOIN inventory i ON oi.item_id = i.id
-        JOIN orders o ON oi.order_id = o.id
-        WHERE o.user_id = %s
-        GROUP BY i.name
-        ORDER BY total_sold DESC
-        LIMIT 5
-    """, (user_id,))
-    top_products = cur.fetchall()
-    
-    # Get inventory value by category
-    cur.execute("""
-        SELECT 
-            COALESCE(c.name, 'Uncategorized') as category,
-            SUM(i.quantity * i.price) as value
-        FROM inventory i
-        LEFT JOIN categories c ON i.category_id = c.id
-        WHERE i.user_id = %s
-        GROUP BY c.name
-        ORDER BY value DESC
-    """, (user_id,))
-    category_values = cur.fetchall()
+    cur = conn.cursor()
     
-    # Get inventory data for charts
+    # All chart data in one statement: one round trip instead of five
     cur.execute("""
-        SELECT 
-            i.name, 
-            i.quantity,
-            i.price,
-            COALESCE(c.name, 'Uncategorized') as category
-        FROM inventory i
-        LEFT JOIN categories c ON i.category_id = c.id
-        WHERE i.user_id = %s
-    """, (user_id,))
-    inventory_data = cur.fetchall()
-    
-    # Convert to list of dicts for JSON serialization
-    inventory_data_list = []
-    for item in inventory_data:
-        inventory_data_list.append({
-            'name': item['name'],
-            'quantity': item['quantity'],
-            'price': float(item['price']),
-            'category': item['category']
-        })
-    
-    # Get currency setting
-    cur.execute("""
-        SELECT setting_value FROM settings
-        WHERE user_id = %s AND setting_key = 'currency'
-    """, (user_id,))
-    currency_result = cur.fetchone()
-    currency = currency_result['setting_value'] if currency_result else '₹'
+        SELECT json_build_object(
+            -- Sales by month
+            'monthly_sales', COALESCE((
+                SELECT json_agg(m ORDER BY m.month) FROM (
+                    SELECT to_char(created_at, 'YYYY-MM') as month, SUM(total) as revenue
+                    FROM orders
+                    WHERE user_id = %(user_id)s
+                    GROUP BY month
+                ) m
+            ), '[]'::json),
+            -- Top selling products
+            'top_products', COALESCE((
+                SELECT json_agg(t ORDER BY t.total_sold DESC) FROM (
+                    SELECT i.name, SUM(oi.quantity) as total_sold
+                    FROM order_items oi
+                    JOIN inventory i ON oi.item_id = i.id
+                    WHERE oi.user_id = %(user_id)s
+                    GROUP BY i.name
+                    ORDER BY total_sold DESC
+                    LIMIT 5
+                ) t
+            ), '[]'::json),
+            -- Inventory value by category
+            'category_values', COALESCE((
+                SELECT json_agg(v ORDER BY v.value DESC NULLS LAST) FROM (
+                    SELECT COALESCE(c.name, 'Uncategorized') as category,
+                           SUM(i.quantity * i.price) as value
+                    FROM inventory i
+                    LEFT JOIN categories c ON i.category_id = c.id
+                    WHERE i.user_id = %(user_id)s
+                    GROUP BY c.name
+                ) v
+            ), '[]'::json),
+            -- Inventory data for charts
+            'inventory_data', COALESCE((
+                SELECT json_agg(json_build_object(
+                    'name', i.name,
+                    'quantity', i.quantity,
+                    'price', i.price::float8,
+                    'category', COALESCE(c.name, 'Uncategorized')
+                ))
+                FROM inventory i
+                LEFT JOIN categories c ON i.category_id = c.id
+                WHERE i.user_id = %(user_id)s
+            ), '[]'::json),
+            -- Currency setting
+            'currency', COALESCE((
+                SELECT setting_value FROM settings
+                WHERE user_id = %(user_id)s AND setting_key = 'currency'
+            ), '₹')
+        )
+    """, {'user_id': user_id})
+    analytics = cur.fetchone()[0]
     
     cur.close()
     conn.close()
     
-    return render_template(
-        'analytics.html',
-        monthly_sales=monthly_sales,
-        top_products=top_products,
-        category_values=category_values,
-        inventory_data=inventory_data_list,
-        sales_data=sales_data,
-        currency=currency
-    )
+    # Format monthly sales for JSON chart data
+    analytics['sales_data'] = [
+        {'month': sale['month'], 'revenue': float(sale['revenue']) if sale['revenue'] else 0}
+        for sale in analytics['monthly_sales']
+    ]
+    return analytics
+
+@app.route('/analytics')
+@login_required
+def analytics_page():
+    analytics = get_analytics_data(session['user_id'])
+    return render_template('analytics.html', **analytics)
 
 def get_sales_mini_data(user_id):
     """Get recent sales data for mini chart"""
@@ -1072,172 +1307,38 @@ def get_top_products(user_email):
     
     return top_products[:5]  # Return top 5 products
 
-@app.route('/generate_report')
+@app.route('/generate_report', methods=['GET', 'POST'])
 @login_required
 def generate_report():
-    user_email = session['user_email']
-    user_data = users[user_email]
-    
-    # Create a PDF buffer
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    
-    # Styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30,
-        alignment=1  # Center alignment
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Heading2'],
-        fontSize=16,
-        spaceAfter=20,
-        textColor=colors.HexColor('#666666')
-    )
-    
-    # Add company name and report title
-    elements.append(Paragraph(user_data.get('company_name', 'Company Name'), title_style))
-    elements.append(Paragraph('Report', subtitle_style))
+    """Queue a PDF sales report; poll report_status and fetch it from download_report"""
+    job_id = submit_report_job(session['user_id'])
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "status_url": url_for('report_status', job_id=job_id),
+        "download_url": url_for('download_report', job_id=job_id)
+    }), 202
+
+@app.route('/reports/<job_id>')
+@login_required
+def report_status(job_id):
+    state, _ = get_report_job(session['user_id'], job_id)
+    if state is None:
+        return jsonify({"success": False, "message": "Report not found"}), 404
+    return jsonify({"success": True, **state})
+
+@app.route('/reports/<job_id>/download')
+@login_required
+def download_report(job_id):
+    state, pdf_path = get_report_job(session['user_id'], job_id)
+    if state is None:
+        return jsonify({"success": False, "message": "Report not found"}), 404
+    if state['status'] != 'done':
+        return jsonify({"success": False, **state}), 409
     
-    # Add date range
     current_date = datetime.now().strftime("%Y-%m-%d")
-    date_text = f"Generated on: {current_date}"
-    elements.append(Paragraph(date_text, styles['Normal']))
-    elements.append(Spacer(1, 20))
-    
-    # Sales Summary Table
-    orders = user_data.get('orders', [])
-    total_revenue = sum(order.get('total', 0) for order in orders)
-    total_orders = len(orders)
-    
-    summary_data = [
-        ['Sales Summary', ''],
-        ['Total Revenue', f"₹{total_revenue:,.2f}"],
-        ['Total Orders', str(total_orders)],
-        ['Average Order Value', f"₹{(total_revenue/total_orders if total_orders > 0 else 0):,.2f}"]
-    ]
-    
-    summary_table = Table(summary_data, colWidths=[200, 200])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f8f9fa')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#666666')),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('TOPPADDING', (0, 0), (-1, 0), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dee2e6')),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 12),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-        ('TOPPADDING', (0, 1), (-1, -1), 8),
-    ]))
-    elements.append(summary_table)
-    elements.append(Spacer(1, 30))
-    
-    # Product-wise Sales Table
-    product_sales = {}
-    for order in orders:
-        for item in order.get('items', []):
-            name = item.get('name', 'Unknown')
-            quantity = item.get('quantity', 0)
-            price = item.get('price', 0)
-            revenue = price * quantity
-            
-            if name in product_sales:
-                product_sales[name]['quantity'] += quantity
-                product_sales[name]['revenue'] += revenue
-            else:
-                product_sales[name] = {'quantity': quantity, 'revenue': revenue}
-    
-    # Sort products by revenue
-    sorted_products = sorted(product_sales.items(), key=lambda x: x[1]['revenue'], reverse=True)
-    
-    # Product Sales Table
-    elements.append(Paragraph('Product-wise Sales', subtitle_style))
-    
-    product_data = [['Product Name', 'Quantity Sold', 'Revenue']]
-    for product_name, data in sorted_products:
-        product_data.append([
-            product_name,
-            str(data['quantity']),
-            f"₹{data['revenue']:,.2f}"
-        ])
-    
-    product_table = Table(product_data, colWidths=[200, 100, 100])
-    product_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f8f9fa')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#666666')),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dee2e6')),
-        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-        ('TOPPADDING', (0, 1), (-1, -1), 8),
-    ]))
-    elements.append(product_table)
-    elements.append(Spacer(1, 30))
-    
-    # Recent Orders Table
-    elements.append(Paragraph('Recent Orders', subtitle_style))
-    
-    # Sort orders by date
-    sorted_orders = sorted(orders, key=lambda x: datetime.strptime(x.get('date', ''), "%Y-%m-%d %H:%M:%S"), reverse=True)
-    recent_orders = sorted_orders[:10]  # Get last 10 orders
-    
-    # Prepare data for table
-    table_data = [['Order ID', 'Customer', 'Items', 'Total', 'Date']]
-    
-    for i, order in enumerate(recent_orders, 1):
-        # Format items vertically, one per line
-        items_str = "\n".join([f"{item['name']} (x{item['quantity']})" for item in order['items']])
-        
-        table_data.append([
-            f"#{i:04d}",
-            order['customer'],
-            items_str,
-            f"₹{order['total']:,.2f}",
-            order['date']
-        ])
-    
-    # Create table with properly imported inch unit
-    table = Table(table_data, colWidths=[0.7*inch, 1.5*inch, 2.5*inch, 1*inch, 1.3*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('ALIGN', (2, 1), (2, -1), 'LEFT'),  # Left align items column
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),  # Align all content to top
-        ('TOPPADDING', (0, 1), (-1, -1), 12),  # Add padding to cells
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 12),
-    ]))
-    elements.append(table)
-    
-    # Build PDF
-    doc.build(elements)
-    buffer.seek(0)
-    
     return send_file(
-        buffer,
+        pdf_path,
         download_name=f'sales_report_{current_date}.pdf',
         as_attachment=True,
         mimetype='application/pdf'
@@ -1379,10 +1480,18 @@ def edit_item(item_id):
             (user_id, 'Item Updated', name, f"Updated item details for {name}")
         )
         
+        publish_event(cur, user_id, 'item_updated', {
+            "item_id": item_id,
+            "name": name,
+            "quantity": quantity
+        })
+        
         conn.commit()
         cur.close()
         conn.close()
         
+        invalidate_tenant(user_id)
+        
         return jsonify({
             "success": True,
             "message": f"Item '{name}' has been updated successfully"
@@ -1435,10 +1544,17 @@ def delete_item(item_id):
             (user_id, 'Item Deleted', item_name, f"Deleted item: {item_name}")
         )
         
+        publish_event(cur, user_id, 'item_deleted', {
+            "item_id": item_id,
+            "name": item_name
+        })
+        
         conn.commit()
         cur.close()
         conn.close()
         
+        invalidate_tenant(user_id)
+        
         return jsonify({
             "success": True,
             "message": f"Item '{item_name}' has been deleted successfully"
@@ -1451,15 +1567,153 @@ def delete_item(item_id):
             "message": "An error occurred while deleting the item"
         }), 500
 
+@app.route('/replenishment')
+@login_required
+def replenishment():
+    """Reorder points and suggested order quantities for every SKU"""
+    try:
+        settings = replenishment_settings(request.args)
+        
+        conn = get_db_connection()
+        cur = conn.cursor()
+        plan = replenishment_plan(cur, session['user_id'], settings)
+        cur.close()
+        conn.close()
+        
+        # Only SKUs that need ordering unless all=1
+        if request.args.get('all') not in ('1', 'true'):
+            plan = plan[plan['needs_reorder']]
+        
+        return jsonify({
+            "success": True,
+            "settings": settings,
+            "summary": {
+                "skus": len(plan),
+                "units_to_order": int(plan['suggested_quantity'].sum()),
+                "order_cost": round(float(plan['order_cost'].sum()), 2)
+            },
+            "items": plan_records(plan)
+        })
+    
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+@app.route('/replenishment/export')
+@login_required
+def export_replenishment():
+    """Download the replenishment plan for every SKU as CSV"""
+    try:
+        settings = replenishment_settings(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    plan = replenishment_plan(cur, session['user_id'], settings)
+    cur.close()
+    conn.close()
+    
+    filename = f"replenishment_{datetime.now().strftime('%Y%m%d')}.csv"
+    return Response(
+        plan.to_csv(index=False),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@app.route('/export/<export_name>')
+@login_required
+def export_data(export_name):
+    """Stream orders, order items, history or inventory as CSV or JSON Lines.
+    
+    start and end (YYYY-MM-DD, inclusive) limit the rows by creation date.
+    The body is gzip-compressed when the client accepts it.
+    """
+    if export_name not in EXPORTS:
+        return jsonify({"success": False, "error": f"Unknown export: {export_name}"}), 404
+    try:
+        start, end = parse_date_range(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    user_id = session['user_id']
+    use_gzip = accepts_gzip(request.headers.get('Accept-Encoding'))
+    fmt = EXPORTS[export_name][0]
+    
+    def generate():
+        # The request's connection stays checked out until the last row is sent
+        conn = get_db_connection()
+        yield from export_stream(conn, export_name, user_id, start, end, use_gzip)
+    
+    base, extension = export_name.rsplit('.', 1)
+    filename = f"{base}_{datetime.now().strftime('%Y%m%d')}.{extension}"
+    response = Response(stream_with_context(generate()), mimetype=MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['X-Accel-Buffering'] = 'no'
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+@app.route('/metrics')
+@metrics_token_required
+def metrics():
+    """Expose this worker's request, SQL, pool, cache and event counters for Prometheus"""
+    pool = get_pool().stats()
+    cache = get_cache().stats()
+    events = get_broker().stats()
+    gauges = {
+        'db_pool_in_use': ('gauge', 'Pooled connections checked out', pool['in_use']),
+        'db_pool_idle': ('gauge', 'Pooled connections idle', pool['idle']),
+        'db_pool_checkouts_total': ('counter', 'Connection checkouts', pool['checkouts']),
+        'db_pool_timeouts_total': ('counter', 'Checkouts that timed out', pool['timeouts']),
+        'db_pool_wait_seconds_total': ('counter', 'Time spent waiting for a connection', pool['wait_time_total']),
+        'cache_hits_total': ('counter', 'Read cache hits', cache['hits']),
+        'cache_misses_total': ('counter', 'Read cache misses', cache['misses']),
+        'cache_errors_total': ('counter', 'Read cache backend errors', cache['errors']),
+        'cache_entries': ('gauge', 'Entries in the read cache', cache['size']),
+        'event_clients': ('gauge', 'Connected event stream clients', events['clients']),
+        'event_received_total': ('counter', 'Events received from Postgres', events['received']),
+        'event_dropped_clients_total': ('counter', 'Stream clients dropped for falling behind', events['dropped_clients'])
+    }
+    return Response(
+        prometheus_text(endpoint_metrics, gauges),
+        mimetype='text/plain; version=0.0.4'
+    )
+
+@app.route('/metrics/db_pool')
+@metrics_token_required
+def db_pool_metrics():
+    """Expose connection pool wait times and checkout counts"""
+    return jsonify(get_pool().stats())
+
+@app.route('/metrics/cache')
+@metrics_token_required
+def cache_metrics():
+    """Expose read cache hit, miss and eviction counters for this worker"""
+    return jsonify(get_cache().stats())
+
+@app.route('/metrics/events')
+@metrics_token_required
+def event_metrics():
+    """Expose event fan-out counters for this worker"""
+    return jsonify(get_broker().stats())
+
 @app.route('/stream')
 @login_required
 def stream():
-    def generate():
-        yield "data: {\"message\": \"Connected to event stream\"}\n\n"
-        # In a real application, you would have more complex event generation
+    if not long_lived_streams():
+        # 204 tells EventSource to stop reconnecting
+        return Response(status=204)
+    
+    # EventSource sends the last id it saw when it reconnects
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
     
     response = app.response_class(
-        generate(),
+        stream_events(
+            session['user_id'],
+            last_event_id=last_event_id,
+            heartbeat=float(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+        ),
         mimetype='text/event-stream'
     )
     response.headers['Cache-Control'] = 'no-cache'
@@ -1483,47 +1737,53 @@ def add_item():
         quantity = request.form.get('quantity')
         price = request.form.get('price')
         
-        # Check if we need to create a new category
-        if category and not category_id:
-            conn = get_db_connection()
-            cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-            
-            # Check if category already exists
-            cur.execute("SELECT id FROM categories WHERE name = %s AND user_id = %s", 
-                       (category, user_id))
-            existing_category = cur.fetchone()
-            
-            if existing_category:
-                category_id = existing_category['id']
-            else:
-                # Create new category
-                cur.execute(
-                    "INSERT INTO categories (name, user_id) VALUES (%s, %s) RETURNING id", 
-                    (category, user_id)
-                )
-                category_id = cur.fetchone()['id']
-                conn.commit()
-            
-            cur.close()
-            conn.close()
-        
-        # Now insert the inventory item
         conn = get_db_connection()
         cur = conn.cursor()
         
-        cur.execute(
-            """
-            INSERT INTO inventory 
-            (name, category_id, quantity, price, user_id) 
-            VALUES (%s, %s, %s, %s, %s)
-            """,
-            (name, category_id, quantity, price, user_id)
-        )
+        # The category and the item are created in one transaction, so a
+        # failed insert never leaves an orphan category behind
+        conn.autocommit = False
+        try:
+            with conn:
+                # Find or create the category in one statement
+                if category and not category_id:
+                    cur.execute("""
+                        WITH existing AS (
+                            SELECT id FROM categories WHERE name = %s AND user_id = %s
+                            ORDER BY id LIMIT 1
+                        ), created AS (
+                            INSERT INTO categories (name, user_id)
+                            SELECT %s, %s WHERE NOT EXISTS (SELECT 1 FROM existing)
+                            RETURNING id
+                        )
+                        SELECT id FROM existing UNION ALL SELECT id FROM created
+                    """, (category, user_id, category, user_id))
+                    category_id = cur.fetchone()[0]
+                
+                cur.execute(
+                    """
+                    INSERT INTO inventory 
+                    (name, category_id, quantity, price, user_id) 
+                    VALUES (%s, %s, %s, %s, %s)
+                    RETURNING id
+                    """,
+                    (name, category_id, quantity, price, user_id)
+                )
+                item_id = cur.fetchone()[0]
+                
+                publish_event(cur, user_id, 'item_added', {
+                    "item_id": item_id,
+                    "name": name,
+                    "quantity": quantity
+                })
+        finally:
+            conn.autocommit = True
         
-        conn.commit()
         cur.close()
         conn.close()
         
+        invalidate_tenant(user_id)
+        
         return jsonify({
             "success": True,
             "message": "Item added successfully"
@@ -1536,6 +1796,67 @@ def add_item():
             "error": str(e)
         })
 
+@app.route('/import_inventory', methods=['POST'])
+@login_required
+def import_inventory_csv():
+    """Bulk create or update items from an uploaded CSV catalog.
+    
+    Returns a JSON summary, or the rejected rows as a CSV file with
+    rejections=csv.
+    """
+    try:
+        user_id = session['user_id']
+        
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({
+                "success": False,
+                "error": "Upload a CSV file in the 'file' field"
+            }), 400
+        
+        rejects = io.StringIO()
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        # The whole file is imported in one transaction
+        conn.autocommit = False
+        try:
+            with conn:
+                summary = import_inventory(
+                    cur, user_id, upload.stream, upload.filename or 'upload', rejects
+                )
+        finally:
+            conn.autocommit = True
+        
+        cur.close()
+        conn.close()
+        
+        invalidate_tenant(user_id)
+        
+        if request.args.get('rejections') == 'csv':
+            filename = f"import_rejects_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            return Response(
+                rejects.getvalue(),
+                mimetype='text/csv',
+                headers={'Content-Disposition': f'attachment; filename={filename}'}
+            )
+        
+        return jsonify({
+            "success": True,
+            **summary,
+            "message": f"{summary['inserted']} items added, {summary['updated']} updated, "
+                       f"{summary['rejected']} rows rejected"
+        })
+    
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        print(f"Error importing inventory: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
 @app.route('/get_inventory_items')
 @login_required
 def get_inventory_items():
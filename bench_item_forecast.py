@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Benchmark the batched per-item forecast against one sklearn fit per item.
+
+Generates synthetic daily demand for N items, times forecast_items() on the
+whole matrix and a LinearRegression loop on a sample of items (extrapolated
+to N), and checks that both produce the same 7-day forecasts.
+
+Usage: python bench_item_forecast.py [--items 50000] [--days 90] [--loop-items 2000]
+"""
+import argparse
+import time
+import numpy as np
+from sklearn.linear_model import LinearRegression
+from prediction import forecast_items
+
+
+def synthetic_demand(n_items, n_days, seed=0):
+    """Poisson demand with a random base rate and trend per item"""
+    rng = np.random.default_rng(seed)
+    base = rng.gamma(2.0, 2.0, size=(n_items, 1))
+    trend = rng.normal(0, 0.02, size=(n_items, 1))
+    rate = np.maximum(base * (1 + trend * np.arange(n_days)), 0)
+    return rng.poisson(rate).astype(float)
+
+
+def sklearn_forecast(demand, horizon=7):
+    """Reference implementation: one LinearRegression fit per item"""
+    n_days = demand.shape[1]
+    X = np.arange(n_days).reshape(-1, 1)
+    future_X = np.arange(n_days, n_days + horizon).reshape(-1, 1)
+    forecasts = np.empty(len(demand))
+    for i, y in enumerate(demand):
+        model = LinearRegression().fit(X, y)
+        forecasts[i] = max(model.predict(future_X).sum(), 0)
+    return forecasts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched vs per-item forecasting")
+    parser.add_argument('--items', type=int, default=50000, help='number of items')
+    parser.add_argument('--days', type=int, default=90, help='days of history per item')
+    parser.add_argument('--loop-items', type=int, default=2000,
+                        help='items to fit with the sklearn loop (timing is extrapolated)')
+    args = parser.parse_args()
+
+    demand = synthetic_demand(args.items, args.days)
+
+    start = time.perf_counter()
+    result = forecast_items(demand, horizons=(7, 30))
+    batched_seconds = time.perf_counter() - start
+
+    sample = demand[:min(args.loop_items, args.items)]
+    start = time.perf_counter()
+    reference = sklearn_forecast(sample)
+    loop_seconds = (time.perf_counter() - start) * args.items / len(sample)
+
+    max_diff = np.abs(result[7]['forecast'][:len(sample)] - reference).max()
+
+    print(f"items={args.items} days={args.days}")
+    print(f"batched least squares: {batched_seconds:.3f}s")
+    print(f"sklearn loop:          {loop_seconds:.3f}s (extrapolated from {len(sample)} items)")
+    print(f"speedup:               {loop_seconds / batched_seconds:.0f}x")
+    print(f"max 7-day forecast difference vs sklearn: {max_diff:.2e}")
+    return 0 if max_diff < 1e-6 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Compare the linear and seasonal SalesPrediction models on sample histories.
+
+For each history length, generate_sample_data() orders are split into a
+training period and the last --holdout days. Each model is trained on the
+training period and scored on the holdout days with MAE and MAPE, next to
+its in-sample R² and the time it took to train and predict.
+
+Usage: python bench_seasonal_forecast.py [--holdout 28] [--repeats 3]
+"""
+import argparse
+import time
+import numpy as np
+from prediction import SalesPrediction, daily_sales, generate_sample_data
+
+HISTORY_DAYS = [60, 180, 365, 730, 1825]
+
+
+def evaluate(model_type, train_orders, test_days, test_sales):
+    """Train one model; returns (seconds, r2, mae, mape)"""
+    start = time.perf_counter()
+    model = SalesPrediction(model=model_type)
+    if not model.train(train_orders):
+        return None
+    predicted = np.maximum(model.model.predict(model.features(test_days)), 0)
+    seconds = time.perf_counter() - start
+
+    r2 = model.model.score(model.X, model.y)
+    errors = np.abs(predicted - test_sales)
+    mae = errors.mean()
+    mape = (errors / np.maximum(test_sales, 1)).mean() * 100
+    return seconds, r2, mae, mape
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark linear vs seasonal sales forecasts")
+    parser.add_argument('--holdout', type=int, default=28, help='days held out for scoring')
+    parser.add_argument('--repeats', type=int, default=3, help='sample histories per length')
+    args = parser.parse_args()
+
+    print(f"{'days':>6} {'model':<9} {'train+predict':>14} {'R2':>6} {'MAE':>10} {'MAPE':>7}")
+    for history_days in HISTORY_DAYS:
+        results = {'linear': [], 'seasonal': []}
+        for _ in range(args.repeats):
+            orders = generate_sample_data(days=history_days)
+            days, sums = daily_sales(orders)
+            cutoff = days[-1] - np.timedelta64(args.holdout - 1, 'D')
+
+            train_orders = [o for o in orders if np.datetime64(o['date'][:10], 'D') < cutoff]
+            test_days, test_sales = days[days >= cutoff], sums[days >= cutoff]
+
+            for model_type in results:
+                result = evaluate(model_type, train_orders, test_days, test_sales)
+                if result is not None:
+                    results[model_type].append(result)
+
+        for model_type, runs in results.items():
+            if not runs:
+                print(f"{history_days:>6} {model_type:<9} {'not enough training days':>40}")
+                continue
+            seconds, r2, mae, mape = np.mean(runs, axis=0)
+            print(f"{history_days:>6} {model_type:<9} {seconds * 1000:>12.2f}ms "
+                  f"{r2:>6.2f} {mae:>10.2f} {mape:>6.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""Compare sync and gevent gunicorn workers under SSE and dashboard load.
+
+For each worker class, gunicorn is started with gunicorn.conf.py on a local
+port and the same scenario is run against it:
+
+1. open --sse-clients /stream connections for a seeded tenant and keep
+   them open; count how many get a response within --connect-timeout
+2. while they are connected, send --requests GET /dashboard requests from
+   --concurrency clients and record latency, throughput and failures
+3. record the resident memory of the master and all workers
+
+With sync workers every open stream occupies a whole process, so
+dashboards queue behind them or time out once --sse-clients reaches the
+worker count. Raise the open file limit (ulimit -n) for thousands of
+clients.
+
+Usage: python bench_workers.py [--worker-classes sync,gevent] [--workers 2]
+                               [--sse-clients 1000] [--requests 500]
+                               [--concurrency 50] [--orders 10000]
+                               [--output bench_workers.json]
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import select
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from benchmark import ensure_tenant, percentiles, git_commit
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"gunicorn did not start listening on port {port}")
+
+
+def process_tree_rss_mb(pid):
+    """Resident memory of a process and its direct children, from /proc"""
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+
+    total_kb = 0
+    for process in pids:
+        try:
+            with open(f'/proc/{process}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+        except OSError:
+            pass
+    return round(total_kb / 1024, 1)
+
+
+def login_cookie(base_url, email):
+    """Log in with the seed password; returns the session Cookie header value"""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    opener.open(base_url + '/login', urllib.parse.urlencode(
+        {'email': email, 'password': 'seed'}
+    ).encode())
+    return '; '.join(f'{cookie.name}={cookie.value}' for cookie in jar)
+
+
+def open_streams(port, cookie, count, connect_timeout):
+    """Open count /stream connections; returns (sockets, number that got a 200 response)"""
+    request = (
+        f"GET /stream HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n"
+        f"Cookie: {cookie}\r\nAccept: text/event-stream\r\n\r\n"
+    ).encode()
+
+    sockets = []
+    for _ in range(count):
+        try:
+            sock = socket.create_connection(('127.0.0.1', port), timeout=connect_timeout)
+            sock.sendall(request)
+            sock.setblocking(False)
+            sockets.append(sock)
+        except OSError:
+            break
+
+    # Wait for the response headers of as many streams as answer in time;
+    # poll() rather than select(), which cannot watch fds above 1024
+    poller = select.poll()
+    by_fd = {sock.fileno(): sock for sock in sockets}
+    for fd in by_fd:
+        poller.register(fd, select.POLLIN)
+
+    connected = 0
+    pending = len(by_fd)
+    deadline = time.monotonic() + connect_timeout
+    while pending and time.monotonic() < deadline:
+        for fd, _ in poller.poll(500):
+            poller.unregister(fd)
+            pending -= 1
+            try:
+                if by_fd[fd].recv(65536).startswith(b'HTTP/1.1 200'):
+                    connected += 1
+            except OSError:
+                pass
+    return sockets, connected
+
+
+def dashboard_load(base_url, cookie, requests, concurrency, request_timeout):
+    """Concurrent GET /dashboard; returns stats including failed requests"""
+    def fetch(_):
+        request = urllib.request.Request(base_url + '/dashboard', headers={'Cookie': cookie})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=request_timeout) as response:
+                response.read()
+            return time.perf_counter() - start
+        except (urllib.error.URLError, OSError):
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(fetch, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [seconds for seconds in results if seconds is not None]
+    stats = percentiles(latencies) if latencies else {'requests': 0}
+    stats['failed'] = len(results) - len(latencies)
+    stats['throughput_rps'] = round(len(latencies) / elapsed, 1)
+    return stats
+
+
+def run_worker_class(worker_class, args, email):
+    port = args.port
+    env = dict(os.environ, WORKER_CLASS=worker_class, WEB_CONCURRENCY=str(args.workers),
+               HOST='127.0.0.1', PORT=str(port))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    sockets = []
+    try:
+        wait_for_port(port)
+        base_url = f"http://127.0.0.1:{port}"
+        cookie = login_cookie(base_url, email)
+
+        start = time.perf_counter()
+        sockets, connected = open_streams(port, cookie, args.sse_clients, args.connect_timeout)
+        connect_seconds = time.perf_counter() - start
+
+        dashboard = dashboard_load(base_url, cookie, args.requests, args.concurrency, args.request_timeout)
+        return {
+            'sse_clients_connected': connected,
+            'sse_connect_seconds': round(connect_seconds, 2),
+            'dashboard': dashboard,
+            'rss_mb': process_tree_rss_mb(server.pid)
+        }
+    finally:
+        for sock in sockets:
+            sock.close()
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sync vs gevent gunicorn workers")
+    parser.add_argument('--worker-classes', default='sync,gevent', help='comma separated')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--sse-clients', type=int, default=1000, help='/stream connections held open')
+    parser.add_argument('--requests', type=int, default=500, help='dashboard requests')
+    parser.add_argument('--concurrency', type=int, default=50, help='concurrent dashboard clients')
+    parser.add_argument('--connect-timeout', type=float, default=10, help='seconds to wait for streams')
+    parser.add_argument('--request-timeout', type=float, default=10, help='seconds before a dashboard request fails')
+    parser.add_argument('--orders', type=int, default=10000, help='orders in the seeded tenant')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', default='bench_workers.json', help='where to write results')
+    args = parser.parse_args()
+
+    _, email = ensure_tenant(args.orders)
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'settings': vars(args),
+        'worker_classes': {}
+    }
+
+    print(f"{'workers':<8} {'streams':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'rps':>8} {'failed':>7} {'RSS':>9}")
+    for worker_class in args.worker_classes.split(','):
+        result = run_worker_class(worker_class, args, email)
+        results['worker_classes'][worker_class] = result
+        dashboard = result['dashboard']
+        print(f"{worker_class:<8} {result['sse_clients_connected']:>9} "
+              f"{dashboard.get('p50_ms', '-'):>7}ms {dashboard.get('p95_ms', '-'):>7}ms "
+              f"{dashboard.get('p99_ms', '-'):>7}ms {dashboard['throughput_rps']:>8} "
+              f"{dashboard['failed']:>7} {result['rss_mb']:>6} MB")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
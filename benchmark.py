@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""Benchmark the main routes and analytics helpers at several data sizes.
+
+For every size (orders per tenant) a tenant is seeded with seed_data.py if it
+does not exist yet. Then each scenario runs two ways:
+
+- sequentially through the Flask test client, recording latency and the
+  number of SQL statements per request
+- as concurrent HTTP load against a threaded server on a local port
+
+Latency percentiles (p50/p95/p99), query counts and peak RSS are written to
+a JSON file. Passing --baseline compares p95 latencies with an earlier
+result and exits non-zero when any scenario got slower than --threshold.
+
+POST /add_order creates real orders in the seeded tenant, and
+/generate_report is timed up to the job being queued, not the PDF build.
+
+Usage: python benchmark.py [--sizes 1000,100000,1000000] [--requests 20]
+                           [--concurrency 8] [--http-requests 200]
+                           [--output results.json] [--baseline old.json]
+                           [--threshold 0.2] [--cold]
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import resource
+import subprocess
+import threading
+import time
+import urllib.parse
+import urllib.request
+from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+import psycopg2
+from dotenv import load_dotenv
+
+# Load environment variables before the app builds its pools
+load_dotenv()
+
+from werkzeug.serving import make_server
+from app import app
+from cache import invalidate_tenant
+from database import get_db_connection, request_queries
+from prediction import SalesPrediction, fetch_order_columns
+import seed_data
+
+PAGES = ['/dashboard', '/orders', '/inventory', '/analytics']
+
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(samples, 50)), 2),
+        'p95_ms': round(float(np.percentile(samples, 95)), 2),
+        'p99_ms': round(float(np.percentile(samples, 99)), 2),
+        'mean_ms': round(float(samples.mean()), 2),
+        'requests': len(samples)
+    }
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process and its finished children (Linux reports KB)"""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / 1024, 1)
+
+
+def ensure_tenant(size, reseed=False):
+    """Seed a tenant with `size` orders unless one exists; returns (user_id, email)"""
+    email = f"seed-{size}-1@example.com"
+    conn = psycopg2.connect(
+        database=os.getenv('DB_NAME', 'inv'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', '1234'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT u.id, s.orders_count FROM users u
+                LEFT JOIN tenant_stats s ON s.user_id = u.id
+                WHERE u.email = %s
+            """, (email,))
+            row = cur.fetchone()
+        conn.rollback()
+
+        if reseed or row is None or (row[1] or 0) < size:
+            print(f"Seeding tenant with {size:,} orders...")
+            seed_data.seed(conn, Namespace(
+                tenants=1, categories=20, skus=min(5000, max(100, size // 100)),
+                years=max(1, min(5, size / 100000)), orders=size, seed=size,
+                end_date=datetime.now().date()
+            ))
+            with conn.cursor() as cur:
+                cur.execute("SELECT id FROM users WHERE email = %s", (email,))
+                row = cur.fetchone()
+            conn.rollback()
+        return row[0], email
+    finally:
+        conn.close()
+
+
+def order_payload(user_id):
+    """JSON body for /add_order using the tenant's best-stocked item"""
+    with app.app_context():
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id, price FROM inventory WHERE user_id = %s
+            ORDER BY quantity DESC LIMIT 1
+        """, (user_id,))
+        item_id, price = cur.fetchone()
+        cur.close()
+    return {
+        'customer': 'Benchmark Customer',
+        'order_items': [item_id],
+        'quantities': [1],
+        'prices': [float(price)]
+    }
+
+
+def run_test_client(user_id, email, requests, cold):
+    """Time every scenario sequentially in-process; returns {name: stats}"""
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['user_email'] = email
+        sess['username'] = email
+
+    scenarios = [(f'GET {page}', 'GET', page, None) for page in PAGES]
+    scenarios.append(('POST /add_order', 'POST', '/add_order', order_payload(user_id)))
+    scenarios.append(('POST /generate_report', 'POST', '/generate_report', None))
+
+    results = {}
+    for name, method, path, payload in scenarios:
+        latencies, query_counts = [], []
+        for _ in range(requests):
+            if cold:
+                invalidate_tenant(user_id)
+            with client:
+                start = time.perf_counter()
+                response = client.open(path, method=method, json=payload)
+                latencies.append(time.perf_counter() - start)
+                query_counts.append(len(request_queries()))
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name} returned {response.status_code}")
+        results[name] = dict(percentiles(latencies), queries=int(np.median(query_counts)))
+
+    # SalesPrediction on the tenant's full order history
+    latencies = []
+    for _ in range(requests):
+        with app.app_context():
+            start = time.perf_counter()
+            conn = get_db_connection()
+            cur = conn.cursor()
+            model = SalesPrediction()
+            model.train(fetch_order_columns(cur, user_id))
+            model.predict_future_sales()
+            cur.close()
+            latencies.append(time.perf_counter() - start)
+    results['SalesPrediction'] = percentiles(latencies)
+    return results
+
+
+def run_http_load(email, requests, concurrency):
+    """Concurrent GET load over real HTTP; returns {name: stats}"""
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    def make_opener():
+        opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+        opener.open(base_url + '/login', urllib.parse.urlencode(
+            {'email': email, 'password': 'seed'}
+        ).encode())
+        return opener
+
+    local = threading.local()
+
+    def fetch(path):
+        if not hasattr(local, 'opener'):
+            local.opener = make_opener()
+        start = time.perf_counter()
+        with local.opener.open(base_url + path) as response:
+            response.read()
+        return time.perf_counter() - start
+
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for page in PAGES:
+                start = time.perf_counter()
+                latencies = list(executor.map(fetch, [page] * requests))
+                elapsed = time.perf_counter() - start
+                results[f'GET {page}'] = dict(
+                    percentiles(latencies),
+                    throughput_rps=round(requests / elapsed, 1)
+                )
+    finally:
+        server.shutdown()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """List scenarios whose p95 latency grew by more than threshold over the baseline"""
+    regressions = []
+    for size, modes in results['sizes'].items():
+        for mode, scenarios in modes.items():
+            if not isinstance(scenarios, dict):
+                continue
+            for name, stats in scenarios.items():
+                old = baseline.get('sizes', {}).get(size, {}).get(mode, {}).get(name)
+                if not old or not old.get('p95_ms'):
+                    continue
+                change = stats['p95_ms'] / old['p95_ms'] - 1
+                if change > threshold:
+                    regressions.append(
+                        f"{size} orders, {mode}, {name}: p95 {old['p95_ms']}ms -> "
+                        f"{stats['p95_ms']}ms (+{change:.0%})"
+                    )
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark routes and analytics helpers")
+    parser.add_argument('--sizes', default='1000,100000,1000000', help='orders per tenant, comma separated')
+    parser.add_argument('--requests', type=int, default=20, help='sequential requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent HTTP clients')
+    parser.add_argument('--http-requests', type=int, default=200, help='HTTP requests per page')
+    parser.add_argument('--output', default='benchmark_results.json', help='where to write results')
+    parser.add_argument('--baseline', help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed p95 slowdown, 0.2 = 20%%')
+    parser.add_argument('--cold', action='store_true', help='invalidate the read cache before each request')
+    parser.add_argument('--reseed', action='store_true', help='reseed tenants even if they exist')
+    args = parser.parse_args()
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'cold_cache': args.cold,
+        'sizes': {}
+    }
+
+    for size in [int(value) for value in args.sizes.split(',')]:
+        user_id, email = ensure_tenant(size, args.reseed)
+        print(f"Benchmarking {size:,} orders (user {user_id})")
+
+        size_results = {
+            'test_client': run_test_client(user_id, email, args.requests, args.cold),
+            'http': run_http_load(email, args.http_requests, args.concurrency)
+        }
+        size_results['peak_rss_mb'] = peak_rss_mb()
+        results['sizes'][str(size)] = size_results
+
+        for mode in ('test_client', 'http'):
+            for name, stats in size_results[mode].items():
+                queries = f" {stats['queries']} queries" if 'queries' in stats else ''
+                print(f"  {mode:<11} {name:<22} p50 {stats['p50_ms']:>8}ms  "
+                      f"p95 {stats['p95_ms']:>8}ms  p99 {stats['p99_ms']:>8}ms{queries}")
+        print(f"  peak RSS {size_results['peak_rss_mb']} MB")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No p95 regressions above {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import pickle
+import threading
+import logging
+from collections import OrderedDict
+from functools import wraps
+from flask import session
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCacheBackend:
+    """In-process LRU cache with per-entry TTL"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_version(self, user_id):
+        return self._versions.get(user_id, 0)
+
+    def bump_version(self, user_id):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """Cache shared by all workers in any Redis-protocol server"""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package")
+        self._client = redis.Redis.from_url(url)
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        raw = self._client.get(key)
+        if raw is None:
+            return False, None
+        return True, pickle.loads(raw)
+
+    def set(self, key, value, ttl):
+        self._client.set(key, pickle.dumps(value), ex=max(1, int(ttl)))
+
+    def get_version(self, user_id):
+        version = self._client.get(f'tenant_version:{user_id}')
+        return int(version) if version else 0
+
+    def bump_version(self, user_id):
+        self._client.incr(f'tenant_version:{user_id}')
+
+    def size(self):
+        return self._client.dbsize()
+
+
+class TenantCache:
+    """Read cache keyed by (user_id, query_name, params).
+
+    Every key embeds the tenant's version number, so invalidating a tenant is
+    a single version bump: old entries become unreachable and age out.
+    """
+
+    def __init__(self, backend, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def make_key(self, user_id, query_name, params):
+        version = self.backend.get_version(user_id)
+        params_key = json.dumps(params, sort_keys=True, default=str)
+        return f'{user_id}:{version}:{query_name}:{params_key}'
+
+    def get_or_compute(self, user_id, query_name, compute, params=None, ttl=None):
+        try:
+            # The key is built before computing, so a result computed while a
+            # write bumps the version is stored under the old, dead key
+            key = self.make_key(user_id, query_name, params)
+            hit, value = self.backend.get(key)
+        except Exception as e:
+            # A cache outage should slow requests down, not fail them
+            logger.warning(f"Cache read failed: {e}")
+            self._count('errors')
+            return compute()
+
+        if hit:
+            self._count('hits')
+            return value
+
+        self._count('misses')
+        value = compute()
+        try:
+            self.backend.set(key, value, ttl or self.ttl)
+        except Exception as e:
+            logger.warning(f"Cache write failed: {e}")
+            self._count('errors')
+        return value
+
+    def invalidate(self, user_id):
+        try:
+            self.backend.bump_version(user_id)
+            self._count('invalidations')
+        except Exception as e:
+            logger.warning(f"Cache invalidation failed: {e}")
+            self._count('errors')
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        stats['evictions'] = self.backend.evictions
+        stats['expirations'] = self.backend.expirations
+        stats['backend'] = type(self.backend).__name__
+        try:
+            stats['size'] = self.backend.size()
+        except Exception:
+            stats['size'] = None
+        return stats
+
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Get this worker's tenant cache, configured from CACHE_* settings"""
+    global _cache, _cache_pid
+
+    if _cache is None or _cache_pid != os.getpid():
+        with _cache_lock:
+            if _cache is None or _cache_pid != os.getpid():
+                ttl = float(os.getenv('CACHE_TTL_SECONDS', 60))
+                if os.getenv('CACHE_BACKEND', 'local') == 'redis':
+                    backend = RedisCacheBackend(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+                else:
+                    backend = LocalCacheBackend(maxsize=int(os.getenv('CACHE_MAX_ENTRIES', 1024)))
+                _cache = TenantCache(backend, ttl=ttl)
+                _cache_pid = os.getpid()
+
+                if isinstance(backend, LocalCacheBackend):
+                    # Local versions only see this worker's writes; follow
+                    # other workers' writes through the event listener
+                    from events import get_broker
+                    get_broker().add_listener(lambda event: _cache.invalidate(event['user_id']))
+    return _cache
+
+
+def tenant_cached(query_name, ttl=None):
+    """Cache a helper's return value for the logged-in tenant and the call arguments"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            return get_cache().get_or_compute(
+                session['user_id'],
+                query_name,
+                lambda: f(*args, **kwargs),
+                params=[args, kwargs],
+                ttl=ttl
+            )
+        return wrapper
+    return decorator
+
+
+def invalidate_tenant(user_id):
+    """Drop all cached reads of a tenant after a write"""
+    get_cache().invalidate(user_id)
@@ -0,0 +1,268 @@
+import os
+import threading
+import time
+import logging
+import psycopg2
+import psycopg2.extensions
+from psycopg2 import pool as pg_pool
+from flask import g, has_app_context
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    """Thread-safe PostgreSQL connection pool with bounded waits and health checks"""
+
+    def __init__(self, minconn, maxconn, timeout, ping_interval, **conn_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self._pool = pg_pool.ThreadedConnectionPool(minconn, maxconn, **conn_kwargs)
+        # The psycopg2 pool raises as soon as it is exhausted; the semaphore
+        # makes callers wait (up to `timeout`) for a connection to come back
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self._stats = {
+            'checkouts': 0,
+            'returns': 0,
+            'timeouts': 0,
+            'discarded': 0,
+            'in_use': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0
+        }
+
+    def getconn(self):
+        """Borrow a healthy connection, waiting for a free slot if necessary"""
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise pg_pool.PoolError(
+                f"Timed out after {self.timeout}s waiting for a database connection"
+            )
+        waited = time.perf_counter() - start
+
+        try:
+            conn = self._checkout_healthy()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+            self._stats['wait_time_total'] += waited
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+        return conn
+
+    def putconn(self, conn):
+        """Return a borrowed connection to the pool"""
+        try:
+            self._pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            with self._lock:
+                if conn.closed:
+                    self._last_used.pop(conn, None)
+                else:
+                    self._last_used[conn] = time.monotonic()
+                self._stats['returns'] += 1
+                self._stats['in_use'] -= 1
+            self._slots.release()
+
+    def _checkout_healthy(self):
+        # A dead connection is discarded and the pool opens a fresh one in its place
+        for _ in range(self.maxconn + 1):
+            conn = self._pool.getconn()
+            try:
+                healthy = self._prepare(conn)
+            except Exception:
+                healthy = False
+            if healthy:
+                return conn
+            logger.warning("Discarding broken pooled database connection")
+            with self._lock:
+                self._last_used.pop(conn, None)
+                self._stats['discarded'] += 1
+            self._pool.putconn(conn, close=True)
+        raise pg_pool.PoolError("Could not obtain a healthy database connection")
+
+    def _prepare(self, conn):
+        """Switch a pooled connection to autocommit and check it still works"""
+        if conn.closed:
+            return False
+        status = conn.info.transaction_status
+        if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        # autocommit cannot be changed inside a transaction
+        if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+        conn.autocommit = True
+
+        # Only ping connections that have been sitting idle for a while,
+        # so a busy worker does not pay an extra round trip per request.
+        # New connections have no entry and are always pinged.
+        last_used = self._last_used.get(conn)
+        if last_used is not None and time.monotonic() - last_used < self.ping_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def stats(self):
+        """Snapshot of pool counters for the metrics endpoint"""
+        with self._lock:
+            stats = dict(self._stats)
+        checkouts = stats['checkouts']
+        stats['wait_time_avg'] = stats['wait_time_total'] / checkouts if checkouts else 0.0
+        stats['idle'] = len(self._pool._pool)
+        stats['min_size'] = self.minconn
+        stats['max_size'] = self.maxconn
+        stats['pid'] = os.getpid()
+        return stats
+
+
+class InstrumentedCursorMixin:
+    """Records the text and duration of every statement a cursor executes"""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(query, time.perf_counter() - start, self.query)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(query, time.perf_counter() - start)
+
+
+_instrumented_factories = {}
+
+
+def instrumented_cursor_factory(factory):
+    """Subclass of a cursor class (DictCursor, ...) that records its queries"""
+    instrumented = _instrumented_factories.get(factory)
+    if instrumented is None:
+        instrumented = type(f'Instrumented{factory.__name__}', (InstrumentedCursorMixin, factory), {})
+        _instrumented_factories[factory] = instrumented
+    return instrumented
+
+
+def record_query(query, seconds, bound=None):
+    """Add a statement to the current request's query log.
+
+    The log keeps the statement text without parameters. Only when
+    g.capture_statements is set (see explain_check.py) is the statement
+    with its parameters bound kept as well, in g.db_statements.
+    """
+    if has_app_context():
+        if isinstance(query, bytes):
+            query = query.decode('utf-8', 'replace')
+        g.setdefault('db_queries', []).append((str(query), seconds))
+        if bound is not None and g.get('capture_statements'):
+            if isinstance(bound, bytes):
+                bound = bound.decode('utf-8', 'replace')
+            g.setdefault('db_statements', []).append(bound)
+
+
+def request_queries():
+    """(query, seconds) pairs executed so far in the current request"""
+    return g.get('db_queries', []) if has_app_context() else []
+
+
+class PooledConnection:
+    """Connection handle whose close() hands the connection back instead of closing it"""
+
+    def __init__(self, conn, release=None):
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_release', release)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._conn.__exit__(exc_type, exc_value, traceback)
+
+    @property
+    def closed(self):
+        return self._conn.closed
+
+    def cursor(self, *args, cursor_factory=None, **kwargs):
+        # Every cursor handed out through the pool reports its queries
+        factory = cursor_factory or self._conn.cursor_factory or psycopg2.extensions.cursor
+        return self._conn.cursor(*args, cursor_factory=instrumented_cursor_factory(factory), **kwargs)
+
+    def close(self):
+        # Request-scoped connections are released by the teardown hook
+        release = self._release
+        if release is not None:
+            object.__setattr__(self, '_release', None)
+            release(self._conn)
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Get the connection pool for this worker process, creating it on first use"""
+    global _pool, _pool_pid
+
+    # gunicorn forks workers after import, so each pid gets its own pool
+    # rather than sharing sockets inherited from the parent
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ConnectionPool(
+                    minconn=int(os.getenv('DB_POOL_MIN', 2)),
+                    maxconn=int(os.getenv('DB_POOL_MAX', 10)),
+                    timeout=float(os.getenv('DB_POOL_TIMEOUT', 10)),
+                    ping_interval=float(os.getenv('DB_POOL_PING_INTERVAL', 30)),
+                    host=os.getenv('DB_HOST'),
+                    database=os.getenv('DB_NAME'),
+                    user=os.getenv('DB_USER'),
+                    password=os.getenv('DB_PASSWORD'),
+                    port=os.getenv('DB_PORT')
+                )
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def get_db_connection():
+    """Borrow a pooled connection.
+
+    Inside a request the same connection is shared by every caller and
+    returned to the pool by release_db_connection() on teardown. Outside a
+    request, close() on the returned handle gives the connection back.
+    """
+    if has_app_context():
+        if 'db_conn' not in g:
+            g.db_conn = get_pool().getconn()
+        return PooledConnection(g.db_conn)
+
+    pool = get_pool()
+    return PooledConnection(pool.getconn(), release=pool.putconn)
+
+
+def release_db_connection(exception=None):
+    """Teardown hook that returns the request's connection to the pool"""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        get_pool().putconn(conn)
@@ -0,0 +1,258 @@
+import os
+import json
+import queue
+import select
+import threading
+import time
+import logging
+from collections import deque
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+# Postgres NOTIFY channel shared by all workers
+CHANNEL = 'inventory_events'
+
+# Whether this process may hold /stream responses open indefinitely. A
+# sync gunicorn worker serves one request at a time, so a stream would
+# take the whole worker for as long as the page stays open;
+# gunicorn.conf.py turns streams off there.
+_long_lived_streams = True
+
+
+def set_long_lived_streams(enabled):
+    global _long_lived_streams
+    _long_lived_streams = enabled
+
+
+def long_lived_streams():
+    """Whether /stream connections can be kept open in this process"""
+    return _long_lived_streams
+
+
+def publish_event(cur, user_id, event_type, data=None):
+    """Publish a tenant event through NOTIFY.
+
+    Postgres delivers the notification when the surrounding transaction
+    commits, so listeners never see events for rolled-back changes. The
+    tenant's current stats row rides along so dashboards can update their
+    KPIs without querying.
+    """
+    cur.execute("""
+        SELECT pg_notify(%s, json_build_object(
+            'id', nextval('inventory_event_seq'),
+            'user_id', %s,
+            'type', %s,
+            'data', %s::json,
+            'stats', (
+                SELECT json_build_object(
+                    'inventory_count', s.inventory_count,
+                    'categories_count', s.categories_count,
+                    'orders_count', s.orders_count,
+                    'stock_value', s.stock_value,
+                    'total_sales', s.total_sales
+                )
+                FROM tenant_stats s WHERE s.user_id = %s
+            )
+        )::text)
+    """, (CHANNEL, user_id, event_type, json.dumps(data or {}, default=str), user_id))
+
+
+class Subscriber:
+    """One connected SSE client"""
+
+    def __init__(self, user_id, queue_size):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = False
+
+
+class EventBroker:
+    """Single LISTEN connection per worker that fans tenant events out to SSE clients"""
+
+    def __init__(self, buffer_size, queue_size, conn_kwargs, reconnect_delay=5):
+        self.queue_size = queue_size
+        self.reconnect_delay = reconnect_delay
+        self._conn_kwargs = conn_kwargs
+        # Recent events of all tenants, used to resume after a reconnect
+        self._buffer = deque(maxlen=buffer_size)
+        self._subscribers = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stats = {
+            'received': 0,
+            'delivered': 0,
+            'dropped_clients': 0,
+            'listener_reconnects': 0
+        }
+        self._thread = threading.Thread(target=self._listen, name='event-broker', daemon=True)
+        self._thread.start()
+
+    def subscribe(self, user_id, last_event_id=None):
+        """Register a client; returns it with the buffered events it missed.
+
+        Event ids are drawn from a sequence before commit, so they do not
+        follow commit order. NOTIFYs do arrive in commit order, so the
+        events missed are the ones buffered after last_event_id, not the
+        ones with a higher id. missed is None when last_event_id is no
+        longer (or not yet) in this worker's buffer and the client has to
+        reload instead.
+        """
+        subscriber = Subscriber(user_id, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+            if last_event_id is None:
+                return subscriber, []
+            events = list(self._buffer)
+
+        for position in range(len(events) - 1, -1, -1):
+            if events[position]['id'] == last_event_id:
+                missed = [event for event in events[position + 1:] if event['user_id'] == user_id]
+                return subscriber, missed
+        return subscriber, None
+
+    def add_listener(self, callback):
+        """Call callback(event) for every event of every tenant, on the listener thread"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.user_id]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['clients'] = sum(len(subscribers) for subscribers in self._subscribers.values())
+            stats['buffered_events'] = len(self._buffer)
+        stats['listener_alive'] = self._thread.is_alive()
+        return stats
+
+    def _dispatch(self, event):
+        with self._lock:
+            self._buffer.append(event)
+            self._stats['received'] += 1
+            subscribers = list(self._subscribers.get(event['user_id'], ()))
+            listeners = list(self._listeners)
+
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception:
+                logger.exception("Event listener failed")
+
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(event)
+                delivered = True
+            except queue.Full:
+                delivered = False
+
+            if delivered:
+                with self._lock:
+                    self._stats['delivered'] += 1
+            else:
+                # Back-pressure: a client that cannot keep up is disconnected
+                # and resumes from the ring buffer via Last-Event-ID
+                subscriber.dropped = True
+                self.unsubscribe(subscriber)
+                with self._lock:
+                    self._stats['dropped_clients'] += 1
+
+    def _listen(self):
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(**self._conn_kwargs)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CHANNEL}")
+
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            event = json.loads(notify.payload)
+                        except ValueError:
+                            logger.warning("Ignoring malformed event payload")
+                            continue
+                        self._dispatch(event)
+            except (psycopg2.Error, OSError) as e:
+                logger.warning(f"Event listener disconnected: {e}")
+                with self._lock:
+                    self._stats['listener_reconnects'] += 1
+                time.sleep(self.reconnect_delay)
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
+
+
+_broker = None
+_broker_pid = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Get this worker's event broker, starting its listener thread on first use"""
+    global _broker, _broker_pid
+
+    if _broker is None or _broker_pid != os.getpid():
+        with _broker_lock:
+            if _broker is None or _broker_pid != os.getpid():
+                _broker = EventBroker(
+                    buffer_size=int(os.getenv('EVENT_BUFFER_SIZE', 1000)),
+                    queue_size=int(os.getenv('EVENT_QUEUE_SIZE', 100)),
+                    conn_kwargs={
+                        'host': os.getenv('DB_HOST'),
+                        'database': os.getenv('DB_NAME'),
+                        'user': os.getenv('DB_USER'),
+                        'password': os.getenv('DB_PASSWORD'),
+                        'port': os.getenv('DB_PORT')
+                    }
+                )
+                _broker_pid = os.getpid()
+    return _broker
+
+
+def format_sse(event):
+    """Format an event as an SSE message the browser can resume from"""
+    message = {
+        'event': 'update',
+        'type': event['type'],
+        'data': event.get('data'),
+        'stats': event.get('stats')
+    }
+    return f"id: {event['id']}\ndata: {json.dumps(message)}\n\n"
+
+
+def stream_events(user_id, last_event_id=None, heartbeat=15):
+    """Generator of SSE messages for one client until it disconnects or falls behind"""
+    broker = get_broker()
+    subscriber, missed = broker.subscribe(user_id, last_event_id)
+    try:
+        # Tell the browser how quickly to reconnect if we drop it
+        yield "retry: 3000\n\n"
+        if missed is None:
+            # Events may have been lost while disconnected
+            yield f"data: {json.dumps({'event': 'resync'})}\n\n"
+        for event in missed or []:
+            yield format_sse(event)
+
+        while not subscriber.dropped:
+            try:
+                event = subscriber.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                # Comment lines keep proxies from closing an idle stream
+                yield ": heartbeat\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        broker.unsubscribe(subscriber)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Check that the read paths of the app are served by indexes.
+
+Every route below is requested for one tenant through the Flask test
+client, with its read cache cleared, and every SELECT it runs is captured
+with its parameters bound. Each captured statement is then planned with
+EXPLAIN using the normal planner settings. A Seq Scan on a table (or
+partition) with at least --min-rows rows is reported as a failure; scans
+of smaller tables are left alone, since reading those whole is the
+planner's correct choice.
+
+Run it against a database with realistic data, e.g. one filled by
+seed_data.py, after ANALYZE.
+
+Usage: python explain_check.py [--user-id N] [--min-rows 10000]
+"""
+import argparse
+import json
+from dotenv import load_dotenv
+
+# Load environment variables before the app builds its pools
+load_dotenv()
+
+from flask import g
+from app import app
+from cache import invalidate_tenant
+from database import get_db_connection
+
+# Read-only routes whose queries are checked; {sku} is one of the tenant's SKUs
+ROUTES = [
+    '/dashboard',
+    '/orders',
+    '/inventory',
+    '/history',
+    '/analytics',
+    '/api/orders',
+    '/api/inventory',
+    '/api/history',
+    '/api/history?q=stock',
+    '/search_items?q=product',
+    '/search_items?q={sku}',
+    '/replenishment',
+    '/get_inventory_items',
+]
+
+
+@app.before_request
+def capture_statements():
+    g.capture_statements = True
+
+
+def seq_scans(plan):
+    """Yield the relation names of all Seq Scan nodes in a JSON plan tree"""
+    if plan.get('Node Type') == 'Seq Scan':
+        yield plan.get('Relation Name')
+    for child in plan.get('Plans', []):
+        yield from seq_scans(child)
+
+
+def large_seq_scans(cursor, statement, min_rows):
+    """Relations of at least min_rows rows that the statement's plan reads with a Seq Scan"""
+    cursor.execute("EXPLAIN (FORMAT JSON) " + statement)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    tables = []
+    for relation in sorted(set(seq_scans(plan[0]['Plan']))):
+        cursor.execute("SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)", (relation,))
+        row = cursor.fetchone()
+        if row and row[0] >= min_rows:
+            tables.append(f"{relation} (~{int(row[0]):,} rows)")
+    return tables
+
+
+def tenant_session(user_id):
+    """(email, username, an item SKU) of the tenant"""
+    with app.app_context():
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT email, username FROM users WHERE id = %s", (user_id,))
+        user = cur.fetchone()
+        if user is None:
+            raise SystemExit(f"No user with id {user_id}")
+        cur.execute("""
+            SELECT sku FROM inventory WHERE user_id = %s AND sku IS NOT NULL LIMIT 1
+        """, (user_id,))
+        sku = cur.fetchone()
+        cur.close()
+    return user[0], user[1], sku[0] if sku else 'UNKNOWN-SKU'
+
+
+def check_routes(user_id, min_rows):
+    """Request every route and plan its SELECTs; returns [(route, statement, tables)]"""
+    email, username, sku = tenant_session(user_id)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['user_email'] = email
+        sess['username'] = username
+
+    results = []
+    for route in ROUTES:
+        path = route.format(sku=sku)
+        invalidate_tenant(user_id)
+        with client:
+            response = client.get(path)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{path} returned {response.status_code}")
+            statements = [
+                statement for statement in g.get('db_statements', [])
+                if statement.lstrip().upper().startswith(('SELECT', 'WITH'))
+            ]
+            conn = get_db_connection()
+            cur = conn.cursor()
+            for statement in statements:
+                results.append((path, statement, large_seq_scans(cur, statement, min_rows)))
+            cur.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the app's queries use indexes")
+    parser.add_argument('--user-id', type=int, default=1, help='tenant to request the routes as')
+    parser.add_argument('--min-rows', type=int, default=10000,
+                        help='smallest table on which a sequential scan counts as a failure')
+    args = parser.parse_args()
+
+    results = check_routes(args.user_id, args.min_rows)
+    failures = 0
+    for path, statement, tables in results:
+        summary = ' '.join(statement.split())[:120]
+        if tables:
+            failures += 1
+            print(f"FAIL  {path}: sequential scan on {', '.join(tables)}\n      {summary}")
+        else:
+            print(f"PASS  {path}: {summary}")
+    print(f"{len(results)} statements from {len(ROUTES)} routes, {failures} with sequential scans")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
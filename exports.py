@@ -0,0 +1,155 @@
+"""Streaming CSV and JSON Lines exports of a tenant's data.
+
+Rows are read through a server-side (named) cursor in batches of
+EXPORT_BATCH_SIZE and each batch is encoded and yielded as soon as it
+arrives, so memory stays flat however many rows an export has. Every
+export is ordered by an indexed key, which lets Postgres stream the rows
+instead of sorting them first.
+
+The inventory export uses the column layout of inventory_import.py, so the
+file can be edited and imported again.
+"""
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime, timedelta
+from werkzeug.http import parse_accept_header
+from listings import serialize_row
+from inventory_import import COLUMNS as IMPORT_COLUMNS
+
+# export name -> (format, columns, query). Queries take user_id, start and
+# end; start and end bound created_at and may be NULL for an open range.
+EXPORTS = {
+    'orders.csv': ('csv', [
+        'id', 'order_number', 'customer', 'customer_email', 'customer_phone',
+        'status', 'total', 'notes', 'created_at', 'updated_at'
+    ], """
+        SELECT id, order_number, customer, customer_email, customer_phone,
+               status, total, notes, created_at, updated_at
+        FROM orders
+        WHERE user_id = %(user_id)s
+          AND (%(start)s::timestamp IS NULL OR created_at >= %(start)s)
+          AND (%(end)s::timestamp IS NULL OR created_at < %(end)s)
+        ORDER BY created_at, id
+    """),
+    'order_items.csv': ('csv', [
+        'id', 'order_id', 'item_id', 'item_name', 'quantity', 'price', 'created_at'
+    ], """
+        SELECT id, order_id, item_id, item_name, quantity, price, created_at
+        FROM order_items
+        WHERE user_id = %(user_id)s
+          AND (%(start)s::timestamp IS NULL OR created_at >= %(start)s)
+          AND (%(end)s::timestamp IS NULL OR created_at < %(end)s)
+        ORDER BY created_at
+    """),
+    'history.jsonl': ('jsonl', [
+        'id', 'action', 'item', 'details', 'category', 'quantity', 'order_id', 'created_at'
+    ], """
+        SELECT id, action, item, details, category, quantity, order_id, created_at
+        FROM history
+        WHERE user_id = %(user_id)s
+          AND (%(start)s::timestamp IS NULL OR created_at >= %(start)s)
+          AND (%(end)s::timestamp IS NULL OR created_at < %(end)s)
+        ORDER BY created_at, id
+    """),
+    'inventory.csv': ('csv', IMPORT_COLUMNS, """
+        SELECT i.name, i.description, c.name AS category, i.quantity, i.price, i.cost,
+               i.sku, i.barcode, i.min_stock, i.max_stock
+        FROM inventory i
+        LEFT JOIN categories c ON c.id = i.category_id
+        WHERE i.user_id = %(user_id)s
+          AND (%(start)s::timestamp IS NULL OR i.created_at >= %(start)s)
+          AND (%(end)s::timestamp IS NULL OR i.created_at < %(end)s)
+        ORDER BY i.name, i.id
+    """),
+}
+
+MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+def export_batch_size():
+    return int(os.getenv('EXPORT_BATCH_SIZE', 2000))
+
+
+def parse_date_range(args):
+    """start/end query args (YYYY-MM-DD, both inclusive) as a half-open timestamp range"""
+    def parse(name):
+        value = args.get(name)
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+
+    start, end = parse('start'), parse('end')
+    if end is not None:
+        end += timedelta(days=1)
+    if start is not None and end is not None and start >= end:
+        raise ValueError("start must not be after end")
+    return start, end
+
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header allows gzip; q=0 refuses it, also via *"""
+    return parse_accept_header(accept_encoding or '')['gzip'] > 0
+
+
+def fetch_batches(conn, query, params, batch_size):
+    """Yield lists of rows from a named cursor; the connection must not be shared meanwhile"""
+    # Named cursors only live inside a transaction
+    conn.autocommit = False
+    try:
+        cur = conn.cursor(name='export')
+        cur.itersize = batch_size
+        try:
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(cur.itersize)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cur.close()
+    finally:
+        conn.rollback()
+        conn.autocommit = True
+
+
+def encode_batches(fmt, columns, batches):
+    """Encode row batches as CSV (with a header) or JSON Lines, one string per batch"""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue()
+
+    for rows in batches:
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            yield buffer.getvalue()
+        else:
+            yield ''.join(
+                json.dumps(serialize_row(zip(columns, row))) + '\n' for row in rows
+            )
+
+
+def gzip_chunks(chunks):
+    """gzip-compress a stream of text chunks, flushing after each one"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(conn, name, user_id, start=None, end=None, gzip=False):
+    """Chunks of an export for a tenant; bytes when gzip is set, text otherwise"""
+    fmt, columns, query = EXPORTS[name]
+    params = {'user_id': user_id, 'start': start, 'end': end}
+    chunks = encode_batches(fmt, columns, fetch_batches(conn, query, params, export_batch_size()))
+    return gzip_chunks(chunks) if gzip else chunks
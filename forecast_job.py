@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""Nightly forecast precomputation.
+
+Shards tenants across a process pool. Each worker refreshes the tenant's
+stored forecast models from the days completed since the last run (see
+forecast_store), fits the revenue SalesPrediction and the per-item models,
+and upserts the results into the forecasts table that the analytics page
+reads.
+
+Every finished tenant is recorded in forecast_job_runs in the same
+transaction as its forecasts, so a crashed or interrupted run picks up where
+it stopped when started again for the same date.
+
+Usage: python -m forecast_job [--workers N] [--date YYYY-MM-DD] [--restart]
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import psycopg2
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from database import get_db_connection
+from forecast_store import refresh_item_models, item_forecasts, load_sales_prediction
+
+HORIZONS = (7, 30)
+
+
+def _forecast_rows(cur, user_id, run_date):
+    """Refresh a tenant's models and return its forecast rows"""
+    rows = []
+
+    prediction = load_sales_prediction(cur, user_id, today=run_date)
+    if prediction.is_trained:
+        # The model has seen the days before run_date, like the item models below
+        _, predictions, confidence = prediction.predict_future_sales(
+            days_to_predict=max(HORIZONS), start_date=run_date
+        )
+        for h in HORIZONS:
+            rows.append(('revenue', '', h, sum(predictions[:h]), None, None, confidence))
+
+    models = refresh_item_models(cur, user_id, today=run_date)
+    if len(models):
+        forecasts = item_forecasts(models, today=run_date, horizons=HORIZONS)
+        series = models['series'].tolist()
+        for h in HORIZONS:
+            rows.extend(zip(
+                ['item'] * len(series), series, [h] * len(series),
+                forecasts[h]['forecast'].tolist(),
+                forecasts[h]['lower'].tolist(),
+                forecasts[h]['upper'].tolist(),
+                [None] * len(series)
+            ))
+    return rows
+
+
+def run_tenant(user_id, run_date):
+    """Compute and store one tenant's forecasts; returns (user_id, rows, seconds, error)"""
+    start = time.perf_counter()
+    conn = get_db_connection()
+    conn.autocommit = False
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                rows = _forecast_rows(cur, user_id, run_date)
+
+                # Replace the tenant's previous forecasts wholesale
+                cur.execute("DELETE FROM forecasts WHERE user_id = %s", (user_id,))
+                execute_values(cur, """
+                    INSERT INTO forecasts
+                    (user_id, kind, series, horizon_days, forecast, lower_bound, upper_bound,
+                     confidence, computed_for)
+                    VALUES %s
+                """, [(user_id,) + row + (run_date,) for row in rows], page_size=1000)
+
+                seconds = time.perf_counter() - start
+                cur.execute("""
+                    INSERT INTO forecast_job_runs (run_date, user_id, status, forecasts, seconds)
+                    VALUES (%s, %s, 'done', %s, %s)
+                    ON CONFLICT (run_date, user_id) DO UPDATE SET
+                        status = 'done', forecasts = EXCLUDED.forecasts,
+                        seconds = EXCLUDED.seconds, error = NULL,
+                        finished_at = CURRENT_TIMESTAMP
+                """, (run_date, user_id, len(rows), seconds))
+        return user_id, len(rows), seconds, None
+    except Exception as e:
+        seconds = time.perf_counter() - start
+        # Failed tenants are retried by the next run for the same date
+        try:
+            with conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        INSERT INTO forecast_job_runs (run_date, user_id, status, seconds, error)
+                        VALUES (%s, %s, 'failed', %s, %s)
+                        ON CONFLICT (run_date, user_id) DO UPDATE SET
+                            status = 'failed', seconds = EXCLUDED.seconds,
+                            error = EXCLUDED.error, finished_at = CURRENT_TIMESTAMP
+                    """, (run_date, user_id, seconds, str(e)))
+        except psycopg2.Error as log_error:
+            print(f"Error recording failed tenant {user_id}: {str(log_error)}")
+        return user_id, 0, seconds, str(e)
+    finally:
+        conn.autocommit = True
+        conn.close()
+
+
+def pending_tenants(conn, run_date, restart=False):
+    """Tenants without a finished run for run_date (all tenants with restart)"""
+    with conn.cursor() as cur:
+        if restart:
+            cur.execute("SELECT id FROM users ORDER BY id")
+        else:
+            cur.execute("""
+                SELECT u.id FROM users u
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM forecast_job_runs r
+                    WHERE r.run_date = %s AND r.user_id = u.id AND r.status = 'done'
+                )
+                ORDER BY u.id
+            """, (run_date,))
+        return [row[0] for row in cur.fetchall()]
+
+
+def main():
+    # Load environment variables; spawned workers inherit them
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Precompute forecasts for every tenant")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('FORECAST_WORKERS', os.cpu_count() or 1)),
+                        help='worker processes')
+    parser.add_argument('--date', type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+                        default=datetime.now().date(), help='run date; days before it are folded in')
+    parser.add_argument('--restart', action='store_true', help='recompute tenants already done for this date')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(
+        database=os.getenv('DB_NAME', 'inv'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', '1234'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+    try:
+        tenants = pending_tenants(conn, args.date, args.restart)
+    finally:
+        conn.close()
+
+    if not tenants:
+        print(f"All tenants are done for {args.date}")
+        return 0
+
+    print(f"Forecasting {len(tenants)} tenant(s) for {args.date} with {args.workers} worker(s)")
+    start = time.perf_counter()
+    failed = 0
+
+    with ProcessPoolExecutor(max_workers=args.workers,
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(run_tenant, user_id, args.date) for user_id in tenants]
+        for done, future in enumerate(as_completed(futures), 1):
+            user_id, rows, seconds, error = future.result()
+            if error:
+                failed += 1
+                print(f"[{done}/{len(tenants)}] tenant {user_id}: FAILED after {seconds:.2f}s: {error}")
+            else:
+                print(f"[{done}/{len(tenants)}] tenant {user_id}: {rows} forecasts in {seconds:.2f}s")
+
+    print(f"Finished in {time.perf_counter() - start:.1f}s, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
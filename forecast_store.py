@@ -0,0 +1,209 @@
+"""Persisted forecast models kept current from running sums.
+
+Each model is a least-squares line over day index, stored in forecast_models
+as the sufficient statistics n, Σx, Σy, Σxy, Σx² and Σy² together with its
+origin day and the last day folded in. Refreshing a model only reads the
+days after last_day, so forecasts cost O(new days) rather than O(history).
+
+Two kinds of model are kept per tenant:
+
+- 'revenue': daily order totals, one point per day with sales, matching
+  SalesPrediction.train().
+- 'item': daily units per item name, one point per calendar day since the
+  item's first sale (days without sales count as zero), matching
+  forecast_items().
+
+Days are folded once they are complete, so today's orders are not part of a
+model until tomorrow. Orders back-dated into folded days are only picked up
+by reset_models().
+"""
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from psycopg2.extras import execute_values
+from prediction import SalesPrediction, fit_from_stats, forecast_from_stats
+
+STAT_COLUMNS = ['n', 'sum_x', 'sum_y', 'sum_xy', 'sum_xx', 'sum_yy']
+
+
+def _lock_models(cur, user_id):
+    """Serialize refreshes of one tenant so no day is folded twice"""
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext('forecast_models'), %s)", (user_id,))
+
+
+def _load(cur, user_id, kind):
+    cur.execute(f"""
+        SELECT series, origin, last_day, {', '.join(STAT_COLUMNS)}
+        FROM forecast_models
+        WHERE user_id = %s AND kind = %s
+    """, (user_id, kind))
+    return pd.DataFrame.from_records(
+        cur.fetchall(), columns=['series', 'origin', 'last_day'] + STAT_COLUMNS
+    )
+
+
+def _save(cur, user_id, kind, frame):
+    columns = ['series', 'origin', 'last_day'] + STAT_COLUMNS
+    execute_values(cur, f"""
+        INSERT INTO forecast_models (user_id, kind, {', '.join(columns)})
+        VALUES %s
+        ON CONFLICT (user_id, kind, series) DO UPDATE SET
+            {', '.join(f'{c} = EXCLUDED.{c}' for c in columns[1:])},
+            updated_at = CURRENT_TIMESTAMP
+    """, [
+        (user_id, kind) + row
+        for row in frame[columns].itertuples(index=False, name=None)
+    ], page_size=1000)
+
+
+def _range_sums(lo, hi):
+    """Count, Σx and Σx² over the integer ranges lo..hi (empty where hi < lo)"""
+    def sum_squares(k):
+        return k * (k + 1) * (2 * k + 1) / 6
+
+    count = np.maximum(hi - lo + 1, 0)
+    sum_x = np.where(count > 0, (lo + hi) * count / 2, 0.0)
+    sum_xx = np.where(count > 0, sum_squares(hi) - sum_squares(lo - 1), 0.0)
+    return count, sum_x, sum_xx
+
+
+def refresh_revenue_model(cur, user_id, today=None):
+    """Fold complete days since the last refresh into the tenant's revenue model.
+
+    Must run inside a transaction. Returns (origin, stats) or None when the
+    tenant has no completed sales days yet.
+    """
+    today = today or datetime.now().date()
+    _lock_models(cur, user_id)
+    model = _load(cur, user_id, 'revenue')
+
+    since = model['last_day'].iloc[0] + timedelta(days=1) if len(model) else None
+    if since is not None and since >= today:
+        row = model.iloc[0]
+        return row['origin'], {c: float(row[c]) for c in STAT_COLUMNS}
+
+    cur.execute("""
+        SELECT DATE(created_at) AS day, SUM(total) AS total
+        FROM orders
+        WHERE user_id = %s AND created_at >= %s AND created_at < %s
+        GROUP BY DATE(created_at)
+    """, (user_id, since or datetime.min, today))
+    new_days = pd.DataFrame.from_records(cur.fetchall(), columns=['day', 'total'])
+
+    if len(model):
+        origin = model['origin'].iloc[0]
+        stats = {c: float(model[c].iloc[0]) for c in STAT_COLUMNS}
+    elif len(new_days):
+        origin = min(new_days['day'])
+        stats = dict.fromkeys(STAT_COLUMNS, 0.0)
+    else:
+        return None
+
+    x = (pd.to_datetime(new_days['day']).to_numpy().astype('datetime64[D]')
+         - np.datetime64(origin, 'D')).astype(float)
+    y = new_days['total'].to_numpy(dtype=float)
+    stats['n'] += len(x)
+    stats['sum_x'] += x.sum()
+    stats['sum_y'] += y.sum()
+    stats['sum_xy'] += x @ y
+    stats['sum_xx'] += x @ x
+    stats['sum_yy'] += y @ y
+
+    _save(cur, user_id, 'revenue', pd.DataFrame([dict(
+        stats, series='', origin=origin, last_day=today - timedelta(days=1)
+    )]))
+    return origin, stats
+
+
+def refresh_item_models(cur, user_id, today=None, save=True):
+    """Fold complete days since the last refresh into every item model of a tenant.
+
+    Must run inside a transaction unless save is False, in which case the
+    refreshed models are only returned, not stored. Returns a frame with
+    one row per item: series (the item name), origin, last_day and the
+    running sums.
+    """
+    today = today or datetime.now().date()
+    yesterday = today - timedelta(days=1)
+    if save:
+        _lock_models(cur, user_id)
+    models = _load(cur, user_id, 'item')
+
+    since = min(models['last_day']) + timedelta(days=1) if len(models) else None
+    if since is not None and since >= today:
+        return models
+
+    cur.execute("""
+        SELECT item_name, DATE(created_at) AS day, SUM(quantity) AS quantity
+        FROM order_items
+        WHERE user_id = %s AND created_at >= %s AND created_at < %s
+        GROUP BY item_name, DATE(created_at)
+    """, (user_id, since or datetime.min, today))
+    sales = pd.DataFrame.from_records(cur.fetchall(), columns=['series', 'day', 'quantity'])
+    sales['series'] = sales['series'].fillna('').astype(str)
+    sale_days = pd.to_datetime(sales['day']).to_numpy().astype('datetime64[D]')
+
+    # Items selling for the first time start at their first sale
+    first_sales = sales.groupby('series', as_index=False)['day'].min()
+    new_models = first_sales[~first_sales['series'].isin(models['series'])]
+    new_models = new_models.rename(columns={'day': 'origin'})
+    for column in STAT_COLUMNS:
+        new_models[column] = 0.0
+    new_models['last_day'] = None
+
+    models = pd.concat([models, new_models], ignore_index=True)
+    origin = pd.to_datetime(models['origin']).to_numpy().astype('datetime64[D]')
+    first_new_day = np.where(
+        models['last_day'].isna().to_numpy(),
+        origin,
+        np.datetime64(since or yesterday, 'D')
+    )
+
+    # Every calendar day from first_new_day to yesterday is a data point
+    lo = (first_new_day - origin).astype(float)
+    hi = (np.datetime64(yesterday, 'D') - origin).astype(float)
+    count, sum_x, sum_xx = _range_sums(lo, hi)
+
+    # Sales add to Σy, Σxy and Σy²; each (item, day) appears once
+    index = pd.Index(models['series']).get_indexer(sales['series'])
+    x = (sale_days - origin[index]).astype(float)
+    y = sales['quantity'].to_numpy(dtype=float)
+    size = len(models)
+
+    models['n'] = models['n'].astype(float) + count
+    models['sum_x'] = models['sum_x'].astype(float) + sum_x
+    models['sum_xx'] = models['sum_xx'].astype(float) + sum_xx
+    models['sum_y'] = models['sum_y'].astype(float) + np.bincount(index, weights=y, minlength=size)
+    models['sum_xy'] = models['sum_xy'].astype(float) + np.bincount(index, weights=x * y, minlength=size)
+    models['sum_yy'] = models['sum_yy'].astype(float) + np.bincount(index, weights=y * y, minlength=size)
+    models['origin'] = origin.astype(object)
+    models['last_day'] = yesterday
+
+    if save and size:
+        _save(cur, user_id, 'item', models)
+    return models
+
+
+def item_forecasts(models, today=None, horizons=(7, 30), z=1.96):
+    """Forecast every item model in a refresh_item_models() frame"""
+    today = today or datetime.now().date()
+    fit = fit_from_stats(**{c: models[c].to_numpy(dtype=float) for c in STAT_COLUMNS})
+    origin = pd.to_datetime(models['origin']).to_numpy().astype('datetime64[D]')
+    next_x = (np.datetime64(today, 'D') - origin).astype(float)
+    return forecast_from_stats(fit, next_x, horizons, z)
+
+
+def load_sales_prediction(cur, user_id, today=None):
+    """SalesPrediction for a tenant trained from its stored revenue model"""
+    model = SalesPrediction()
+    state = refresh_revenue_model(cur, user_id, today)
+    if state is not None:
+        origin, stats = state
+        model.train_from_stats(origin, stats)
+    return model
+
+
+def reset_models(cur, user_id):
+    """Drop a tenant's stored models so the next refresh rebuilds them from all history"""
+    _lock_models(cur, user_id)
+    cur.execute("DELETE FROM forecast_models WHERE user_id = %s", (user_id,))
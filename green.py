@@ -0,0 +1,39 @@
+"""Cooperative psycopg2 for gevent workers.
+
+psycopg2 blocks the whole process while it waits for the server. With a
+wait callback installed, every query instead polls the connection and
+yields to the gevent hub until its socket is ready (the same approach as
+psycogreen), so one worker can serve thousands of concurrent requests and
+/stream clients while some of them wait on Postgres.
+
+While a wait callback is installed, psycopg2 rejects COPY, so callers that
+use copy_expert check green_mode() and fall back to plain statements.
+"""
+import psycopg2
+from psycopg2 import extensions
+
+
+def gevent_wait_callback(conn, timeout=None):
+    """Wait for a psycopg2 connection without blocking other greenlets"""
+    from gevent.socket import wait_read, wait_write
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
+
+
+def patch_psycopg():
+    """Make psycopg2 cooperative; call once per gevent worker process"""
+    extensions.set_wait_callback(gevent_wait_callback)
+
+
+def green_mode():
+    """Whether psycopg2 is running with a wait callback installed"""
+    return extensions.get_wait_callback() is not None
@@ -0,0 +1,46 @@
+"""gunicorn settings: gunicorn -c gunicorn.conf.py app:app
+
+WORKER_CLASS=gevent (the default) serves up to WORKER_CONNECTIONS
+concurrent requests per process: the standard library is monkey-patched by
+gunicorn's gevent worker and psycopg2 is made cooperative with
+green.patch_psycopg(), so requests waiting on Postgres or on /stream events
+yield to each other.
+
+WORKER_CLASS=sync blocks one process per request, so an open /stream
+connection would pin a worker for as long as the browser stays on the
+page; sync workers answer /stream with 204 and pages do not open it, so
+there are no live updates. A warning is logged at startup.
+
+In gevent mode every worker still holds at most DB_POOL_MAX connections;
+requests beyond that wait for one without blocking the process.
+"""
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', 5000)}"
+worker_class = os.getenv('WORKER_CLASS', 'gevent')
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+worker_connections = int(os.getenv('WORKER_CONNECTIONS', 1000))
+timeout = int(os.getenv('WORKER_TIMEOUT', 30))
+keepalive = int(os.getenv('WORKER_KEEPALIVE', 5))
+
+
+def on_starting(server):
+    if 'sync' in server.cfg.worker_class_str:
+        server.log.warning(
+            "Running sync workers: /stream is disabled and pages get no live "
+            "updates; set WORKER_CLASS=gevent to serve them"
+        )
+
+
+def post_fork(server, worker):
+    if 'gevent' in server.cfg.worker_class_str:
+        from green import patch_psycopg
+        patch_psycopg()
+    elif 'sync' in server.cfg.worker_class_str:
+        # Pages do not open /stream; live updates need gevent workers
+        from events import set_long_lived_streams
+        set_long_lived_streams(False)
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""Bulk inventory import from CSV.
+
+The file is streamed into a temporary staging table with COPY FROM STDIN and
+everything after that is set-based SQL, so a 100k line catalog costs a
+handful of statements rather than one round trip per line:
+
+1. validate every staged row in one pass, marking rejected rows with a reason
+2. create the categories the file names that the tenant does not have yet
+3. merge into inventory with INSERT ... ON CONFLICT (name, user_id) DO UPDATE
+4. write one summary history row for the whole import
+
+In gevent workers psycopg2 cannot COPY, so rows are staged with batched
+INSERTs there instead.
+
+The first line must be a header naming the columns, in any order; only name
+is required. Empty cells keep the current value of an existing item, and
+price is required for new items. Rows are numbered from 1 for the first line
+after the header. When the same name appears more than once, the last row
+wins and the earlier ones are rejected.
+
+Usage: python inventory_import.py FILE --user-id N [--rejects rejects.csv]
+"""
+import argparse
+import codecs
+import csv
+import os
+import psycopg2
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from events import publish_event
+from green import green_mode
+
+COLUMNS = [
+    'name', 'description', 'category', 'quantity', 'price', 'cost',
+    'sku', 'barcode', 'min_stock', 'max_stock'
+]
+INTEGER_COLUMNS = ['quantity', 'min_stock', 'max_stock']
+# Both are NUMERIC(10, 2)
+MONEY_COLUMNS = ['price', 'cost']
+LENGTH_LIMITS = {'name': 255, 'category': 100, 'sku': 100, 'barcode': 100}
+
+# Accepted cell values, as Postgres regular expressions; at most 9 digits
+# fit an INTEGER, and 8 digits and 2 decimals a NUMERIC(10, 2)
+INTEGER_PATTERN = r'^\d{1,9}$'
+MONEY_PATTERN = r'^\d{1,8}(\.\d{1,2})?$'
+
+# Rows per INSERT when COPY is not available
+STAGE_BATCH_SIZE = 5000
+
+# Rejected rows included in the returned summary; the rejects file has all
+MAX_REJECTIONS_SHOWN = 100
+
+
+def read_header(stream):
+    """Read the header line of a binary CSV stream; returns the staged column names"""
+    line = stream.readline()
+    if isinstance(line, bytes):
+        line = line.decode('utf-8-sig')
+    header = next(csv.reader([line]), [])
+    columns = [column.strip().lower().replace(' ', '_') for column in header]
+
+    if not columns:
+        raise ValueError("The file is empty")
+    unknown = [column for column in columns if column not in COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}; expected {', '.join(COLUMNS)}")
+    if len(set(columns)) != len(columns):
+        raise ValueError("Duplicate columns in header")
+    if 'name' not in columns:
+        raise ValueError("The header must include a name column")
+    return columns
+
+
+def _stage_batches(cur, stream, columns):
+    """Stage rows with batched INSERTs, for gevent workers where COPY is unavailable"""
+    insert = f"INSERT INTO inventory_import_rows ({', '.join(columns)}) VALUES %s"
+    batch = []
+    for row_number, row in enumerate(csv.reader(codecs.iterdecode(stream, 'utf-8')), 1):
+        if not row:
+            continue
+        if len(row) != len(columns):
+            raise ValueError(f"Malformed CSV: row {row_number} has {len(row)} fields, expected {len(columns)}")
+        batch.append(row)
+        if len(batch) == STAGE_BATCH_SIZE:
+            execute_values(cur, insert, batch, page_size=STAGE_BATCH_SIZE)
+            batch = []
+    if batch:
+        execute_values(cur, insert, batch, page_size=STAGE_BATCH_SIZE)
+
+
+def _stage(cur, stream, columns):
+    cur.execute(f"""
+        CREATE TEMP TABLE inventory_import_rows (
+            row_number INTEGER GENERATED ALWAYS AS IDENTITY,
+            {', '.join(f'{column} TEXT' for column in COLUMNS)},
+            category_id INTEGER,
+            error TEXT
+        ) ON COMMIT DROP
+    """)
+    if green_mode():
+        _stage_batches(cur, stream, columns)
+    else:
+        try:
+            cur.copy_expert(
+                f"COPY inventory_import_rows ({', '.join(columns)}) "
+                f"FROM STDIN WITH (FORMAT csv, ENCODING 'UTF8')",
+                stream
+            )
+        except psycopg2.DataError as e:
+            raise ValueError(f"Malformed CSV: {e.diag.message_primary}")
+
+    cur.execute("SELECT COUNT(*) FROM inventory_import_rows")
+    return cur.fetchone()[0]
+
+
+def _validate(cur, user_id):
+    """Mark every row that cannot be imported with the first reason it fails"""
+    # Blank cells count as missing
+    cur.execute(f"""
+        UPDATE inventory_import_rows SET
+            {', '.join(f"{column} = NULLIF(btrim({column}), '')" for column in COLUMNS)}
+    """)
+
+    checks = ["WHEN name IS NULL THEN 'name is required'"]
+    checks += [
+        f"WHEN length({column}) > {limit} THEN '{column} is longer than {limit} characters'"
+        for column, limit in LENGTH_LIMITS.items()
+    ]
+    checks += [
+        f"WHEN {column} !~ '{INTEGER_PATTERN}' THEN '{column} must be a whole number'"
+        for column in INTEGER_COLUMNS
+    ]
+    checks += [
+        f"WHEN {column} !~ '{MONEY_PATTERN}' THEN '{column} must be an amount with at most 2 decimals'"
+        for column in MONEY_COLUMNS
+    ]
+    cur.execute(f"UPDATE inventory_import_rows SET error = CASE {' '.join(checks)} END")
+
+    # ON CONFLICT cannot update the same item twice in one statement
+    cur.execute("""
+        UPDATE inventory_import_rows r
+        SET error = 'duplicate name, row ' || d.last_row || ' is used instead'
+        FROM (
+            SELECT name, MAX(row_number) AS last_row
+            FROM inventory_import_rows
+            WHERE error IS NULL
+            GROUP BY name
+            HAVING COUNT(*) > 1
+        ) d
+        WHERE r.error IS NULL AND r.name = d.name AND r.row_number < d.last_row
+    """)
+
+    cur.execute("""
+        UPDATE inventory_import_rows r
+        SET error = 'price is required for new items'
+        WHERE r.error IS NULL AND r.price IS NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM inventory i WHERE i.user_id = %s AND i.name = r.name
+          )
+    """, (user_id,))
+
+
+def _resolve_categories(cur, user_id):
+    """Create missing categories and fill in category_id; returns how many were created"""
+    cur.execute("""
+        INSERT INTO categories (name, user_id)
+        SELECT DISTINCT r.category, %s
+        FROM inventory_import_rows r
+        WHERE r.error IS NULL AND r.category IS NOT NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM categories c WHERE c.user_id = %s AND c.name = r.category
+          )
+    """, (user_id, user_id))
+    created = cur.rowcount
+
+    # Top-level categories win over sub-categories of the same name
+    cur.execute("""
+        UPDATE inventory_import_rows r
+        SET category_id = c.id
+        FROM (
+            SELECT DISTINCT ON (name) name, id
+            FROM categories
+            WHERE user_id = %s
+            ORDER BY name, parent_id IS NOT NULL, id
+        ) c
+        WHERE r.error IS NULL AND r.category = c.name
+    """, (user_id,))
+    return created
+
+
+def _merge(cur, user_id):
+    """Upsert the valid rows into inventory; returns (inserted, updated)"""
+    updated_columns = [column for column in COLUMNS if column not in ('name', 'category')]
+    cur.execute(f"""
+        WITH merged AS (
+            INSERT INTO inventory
+                (name, description, category_id, quantity, price, cost,
+                 sku, barcode, min_stock, max_stock, user_id)
+            SELECT r.name,
+                   COALESCE(r.description, i.description),
+                   COALESCE(r.category_id, i.category_id),
+                   COALESCE(r.quantity::integer, i.quantity, 0),
+                   COALESCE(r.price::numeric, i.price),
+                   COALESCE(r.cost::numeric, i.cost),
+                   COALESCE(r.sku, i.sku),
+                   COALESCE(r.barcode, i.barcode),
+                   COALESCE(r.min_stock::integer, i.min_stock, 0),
+                   COALESCE(r.max_stock::integer, i.max_stock),
+                   %s
+            FROM inventory_import_rows r
+            LEFT JOIN inventory i ON i.user_id = %s AND i.name = r.name
+            WHERE r.error IS NULL
+            ON CONFLICT (name, user_id) DO UPDATE SET
+                {', '.join(f'{column} = EXCLUDED.{column}' for column in ['category_id'] + updated_columns)},
+                updated_at = CURRENT_TIMESTAMP
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted)
+        FROM merged
+    """, (user_id, user_id))
+    return cur.fetchone()
+
+
+def write_rejects(cur, out):
+    """Write the rejected rows, with their row number and reason, to a text file as CSV"""
+    query = f"""
+        SELECT row_number AS row, {', '.join(COLUMNS)}, error
+        FROM inventory_import_rows
+        WHERE error IS NOT NULL
+        ORDER BY row_number
+    """
+    if not green_mode():
+        cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", out)
+        return
+
+    cur.execute(query)
+    writer = csv.writer(out)
+    writer.writerow(['row'] + COLUMNS + ['error'])
+    writer.writerows(cur.fetchall())
+
+
+def import_inventory(cur, user_id, stream, source='upload', rejects=None):
+    """Import a CSV stream into a tenant's inventory; returns a summary dict.
+
+    Must run inside a transaction, which the caller commits. stream is a
+    binary file object; when rejects is given, the rejected rows are
+    written to it as CSV.
+    """
+    columns = read_header(stream)
+
+    # One import per tenant at a time, so two files cannot create the same category
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext('inventory_import'), %s)", (user_id,))
+
+    rows = _stage(cur, stream, columns)
+    _validate(cur, user_id)
+    categories_created = _resolve_categories(cur, user_id)
+    inserted, updated = _merge(cur, user_id)
+    rejected = rows - inserted - updated
+
+    cur.execute("""
+        SELECT row_number, name, error
+        FROM inventory_import_rows
+        WHERE error IS NOT NULL
+        ORDER BY row_number
+        LIMIT %s
+    """, (MAX_REJECTIONS_SHOWN,))
+    rejections = [
+        {"row": row_number, "name": name, "error": error}
+        for row_number, name, error in cur.fetchall()
+    ]
+    if rejects is not None and rejected:
+        write_rejects(cur, rejects)
+
+    cur.execute(
+        "INSERT INTO history (user_id, action, item, details, quantity) VALUES (%s, %s, %s, %s, %s)",
+        (user_id, 'Inventory Imported', source[:255],
+         f"Imported {source}: {inserted} added, {updated} updated, {rejected} rejected, "
+         f"{categories_created} new categories", inserted + updated)
+    )
+
+    summary = {
+        "rows": rows,
+        "inserted": inserted,
+        "updated": updated,
+        "rejected": rejected,
+        "categories_created": categories_created
+    }
+    publish_event(cur, user_id, 'inventory_imported', summary)
+    return dict(summary, rejections=rejections)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a CSV catalog into a tenant's inventory")
+    parser.add_argument('file', help='CSV file with a header line')
+    parser.add_argument('--user-id', type=int, required=True, help='tenant to import into')
+    parser.add_argument('--rejects', help='where to write rejected rows (default FILE.rejects.csv)')
+    args = parser.parse_args()
+    rejects_path = args.rejects or os.path.splitext(args.file)[0] + '.rejects.csv'
+
+    # Load environment variables
+    load_dotenv()
+
+    conn = psycopg2.connect(
+        database=os.getenv('DB_NAME', 'inv'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', '1234'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+    try:
+        with open(args.file, 'rb') as stream, open(rejects_path, 'w', newline='') as rejects:
+            with conn:
+                with conn.cursor() as cur:
+                    summary = import_inventory(
+                        cur, args.user_id, stream, os.path.basename(args.file), rejects
+                    )
+    except ValueError as e:
+        print(f"Error importing {args.file}: {str(e)}")
+        os.remove(rejects_path)
+        return 1
+    finally:
+        conn.close()
+
+    print(f"{summary['rows']} rows: {summary['inserted']} added, {summary['updated']} updated, "
+          f"{summary['rejected']} rejected, {summary['categories_created']} new categories")
+    if summary['rejected']:
+        print(f"Rejected rows written to {rejects_path}")
+    else:
+        os.remove(rejects_path)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,243 @@
+import base64
+import json
+from datetime import datetime, date
+from decimal import Decimal
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+DEFAULT_SEARCH_RESULTS = 10
+MAX_SEARCH_RESULTS = 50
+
+
+def encode_cursor(*values):
+    """Encode the sort key of the last row on a page as an opaque cursor"""
+    key = [value.isoformat() if isinstance(value, (datetime, date)) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor, timestamp=False):
+    """Decode a cursor produced by encode_cursor, or None for the first page.
+
+    Cursors hold a (sort value, id) pair; with timestamp the sort value
+    must be an ISO timestamp. Anything else raises ValueError, so a
+    tampered cursor is a bad request rather than a database error.
+    """
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    if (not isinstance(key, list) or len(key) != 2 or not isinstance(key[0], str)
+            or not isinstance(key[1], int) or isinstance(key[1], bool)):
+        raise ValueError("Invalid cursor")
+    if timestamp:
+        try:
+            datetime.fromisoformat(key[0])
+        except ValueError:
+            raise ValueError("Invalid cursor")
+    return key
+
+
+def parse_page_size(value):
+    """Clamp a requested page size to 1..MAX_PAGE_SIZE"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def like_pattern(text):
+    """Build an ILIKE substring pattern with wildcards in the text escaped"""
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def serialize_row(row):
+    """Convert a row dict into JSON-friendly values"""
+    result = {}
+    for key, value in dict(row).items():
+        if isinstance(value, Decimal):
+            value = float(value)
+        elif isinstance(value, (datetime, date)):
+            value = value.isoformat()
+        elif isinstance(value, list):
+            value = [serialize_row(item) for item in value]
+        result[key] = value
+    return result
+
+
+def _page(rows, limit, key):
+    # One extra row is fetched to know whether another page exists
+    rows = [dict(row) for row in rows]
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
+
+
+def attach_order_items(cur, orders):
+    """Load the items of all given orders in one query and nest them under order['items']"""
+    orders_by_id = {}
+    for order in orders:
+        order['items'] = []
+        orders_by_id[order['id']] = order
+
+    if not orders_by_id:
+        return orders
+
+    # LEFT JOIN keeps items whose inventory row was deleted (item_id = NULL)
+    # under their stored name
+    cur.execute("""
+        SELECT oi.id, oi.order_id, oi.item_id, oi.quantity, oi.price, oi.created_at,
+               COALESCE(i.name, oi.item_name) as item_name,
+               i.category_id, c.name as category_name
+        FROM order_items oi
+        LEFT JOIN inventory i ON oi.item_id = i.id
+        LEFT JOIN categories c ON i.category_id = c.id
+        WHERE oi.order_id = ANY(%s)
+        ORDER BY oi.order_id, oi.id
+    """, (list(orders_by_id),))
+
+    for item in cur.fetchall():
+        orders_by_id[item['order_id']]['items'].append(dict(item))
+
+    return orders
+
+
+def fetch_orders(cur, user_id, cursor=None, limit=DEFAULT_PAGE_SIZE,
+                 status=None, category_id=None, q=None):
+    """Fetch one page of orders, newest first, keyed on (created_at, id)"""
+    conditions = ["o.user_id = %s"]
+    params = [user_id]
+
+    if status:
+        conditions.append("o.status = %s")
+        params.append(status)
+    if category_id:
+        conditions.append("""EXISTS (
+            SELECT 1 FROM order_items oi
+            JOIN inventory i ON oi.item_id = i.id
+            WHERE oi.order_id = o.id AND i.category_id = %s
+        )""")
+        params.append(category_id)
+    if q:
+        conditions.append("(o.customer ILIKE %s OR o.order_number ILIKE %s)")
+        params.extend([like_pattern(q)] * 2)
+
+    key = decode_cursor(cursor, timestamp=True)
+    if key:
+        conditions.append("(o.created_at, o.id) < (%s::timestamp, %s)")
+        params.extend(key)
+
+    cur.execute(f"""
+        SELECT o.*, to_char(o.created_at, 'YYYY-MM-DD HH24:MI:SS') as formatted_date
+        FROM orders o
+        WHERE {' AND '.join(conditions)}
+        ORDER BY o.created_at DESC, o.id DESC
+        LIMIT %s
+    """, params + [limit + 1])
+
+    orders, next_cursor = _page(cur.fetchall(), limit, lambda o: (o['created_at'], o['id']))
+    attach_order_items(cur, orders)
+    return orders, next_cursor
+
+
+def fetch_inventory(cur, user_id, cursor=None, limit=DEFAULT_PAGE_SIZE,
+                    category_id=None, low_stock=False, q=None):
+    """Fetch one page of inventory items in name order, keyed on (name, id)"""
+    conditions = ["i.user_id = %s"]
+    params = [user_id]
+
+    if category_id:
+        conditions.append("i.category_id = %s")
+        params.append(category_id)
+    if low_stock:
+        conditions.append("i.quantity <= i.min_stock")
+    if q:
+        conditions.append("(i.name ILIKE %s OR i.sku ILIKE %s OR i.barcode ILIKE %s)")
+        params.extend([like_pattern(q)] * 3)
+
+    key = decode_cursor(cursor)
+    if key:
+        conditions.append("(i.name, i.id) > (%s, %s)")
+        params.extend(key)
+
+    cur.execute(f"""
+        SELECT i.*, c.name as category_name,
+               to_char(i.created_at, 'YYYY-MM-DD') as formatted_date
+        FROM inventory i
+        LEFT JOIN categories c ON i.category_id = c.id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY i.name ASC, i.id ASC
+        LIMIT %s
+    """, params + [limit + 1])
+
+    return _page(cur.fetchall(), limit, lambda i: (i['name'], i['id']))
+
+
+def fetch_history(cur, user_id, cursor=None, limit=DEFAULT_PAGE_SIZE,
+                  action=None, q=None):
+    """Fetch one page of history entries, newest first, keyed on (created_at, id)"""
+    conditions = ["user_id = %s"]
+    params = [user_id]
+
+    if action:
+        conditions.append("action = %s")
+        params.append(action)
+    if q:
+        conditions.append("(action ILIKE %s OR item ILIKE %s OR details ILIKE %s)")
+        params.extend([like_pattern(q)] * 3)
+
+    key = decode_cursor(cursor, timestamp=True)
+    if key:
+        # The plain bound lets later pages skip the newer history partitions
+        conditions.append("created_at <= %s::timestamp AND (created_at, id) < (%s::timestamp, %s)")
+        params.extend([key[0]] + key)
+
+    cur.execute(f"""
+        SELECT *, to_char(created_at, 'YYYY-MM-DD HH24:MI:SS') as formatted_date
+        FROM history
+        WHERE {' AND '.join(conditions)}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    """, params + [limit + 1])
+
+    return _page(cur.fetchall(), limit, lambda h: (h['created_at'], h['id']))
+
+
+def search_inventory(cur, user_id, q, limit=DEFAULT_SEARCH_RESULTS):
+    """Find items by exact SKU/barcode, else by fuzzy name match, best match first.
+
+    Scanner input is an exact code, answered from the (user_id, sku) and
+    (user_id, barcode) indexes without touching the trigram index. Typed
+    text falls through to the pg_trgm name index: substring matches rank
+    first, then by trigram similarity.
+    """
+    columns = """
+        i.id, i.name, i.sku, i.barcode, i.quantity, i.price, i.category_id,
+        c.name as category_name
+    """
+    cur.execute(f"""
+        SELECT {columns}, 1.0 as score, 'exact' as match
+        FROM inventory i
+        LEFT JOIN categories c ON i.category_id = c.id
+        WHERE i.user_id = %(user_id)s AND (i.sku = %(q)s OR i.barcode = %(q)s)
+        ORDER BY i.name, i.id
+        LIMIT %(limit)s
+    """, {'user_id': user_id, 'q': q, 'limit': limit})
+    rows = cur.fetchall()
+    if rows:
+        return [dict(row) for row in rows]
+
+    cur.execute(f"""
+        SELECT {columns}, similarity(i.name, %(q)s) as score, 'name' as match
+        FROM inventory i
+        LEFT JOIN categories c ON i.category_id = c.id
+        WHERE i.user_id = %(user_id)s
+          AND (i.name %% %(q)s OR i.name ILIKE %(pattern)s)
+        ORDER BY i.name ILIKE %(pattern)s DESC, score DESC, i.name, i.id
+        LIMIT %(limit)s
+    """, {'user_id': user_id, 'q': q, 'pattern': like_pattern(q), 'limit': limit})
+    return [dict(row) for row in cur.fetchall()]
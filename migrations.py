@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""Versioned schema migrations.
+
+setup_database.py creates the baseline tables; every later schema change is a
+numbered revision below. Applied revisions are recorded in schema_migrations,
+so running the migrations again only applies what is new.
+
+Usage: python migrations.py [--status]
+"""
+import argparse
+import os
+import re
+import psycopg2
+from dotenv import load_dotenv
+
+
+class Migration:
+    """One schema revision.
+
+    Non-transactional migrations run statement by statement in autocommit
+    mode, which CREATE INDEX CONCURRENTLY requires; their statements must be
+    idempotent so a half-applied revision can simply be re-run. A failed
+    concurrent build leaves an INVALID index behind that IF NOT EXISTS would
+    skip, so apply_migrations() drops such an index before building it again
+    and fails if the rebuilt index is still not valid.
+    """
+
+    def __init__(self, version, description, statements, transactional=True):
+        self.version = version
+        self.description = description
+        self.statements = statements
+        self.transactional = transactional
+
+
+MIGRATIONS = [
+    Migration(1, "Baseline single-column indexes", [
+        "CREATE INDEX IF NOT EXISTS idx_inventory_user_id ON inventory(user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_inventory_category_id ON inventory(category_id)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders(user_id)",
+        # Order number allocation seeds from today's numbers with LIKE 'ORD-YYYYMMDD-%'
+        "CREATE INDEX IF NOT EXISTS idx_orders_user_order_number ON orders(user_id, order_number varchar_pattern_ops)",
+        "CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id)",
+        "CREATE INDEX IF NOT EXISTS idx_history_user_id ON history(user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_categories_parent_id ON categories(parent_id)",
+    ]),
+    Migration(2, "Add order_items.user_id for tenant-scoped sales queries", [
+        "ALTER TABLE order_items ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id) ON DELETE CASCADE",
+        """
+        UPDATE order_items oi
+        SET user_id = o.user_id
+        FROM orders o
+        WHERE oi.order_id = o.id AND oi.user_id IS NULL
+        """,
+    ]),
+    Migration(3, "Composite, partial and BRIN indexes for hot queries", [
+        # Order listing, recent orders and monthly revenue: (user_id, created_at)
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_user_created ON orders(user_id, created_at DESC, id DESC)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_history_user_created ON history(user_id, created_at DESC, id DESC)",
+        # Sales and forecasting aggregates filter order_items by tenant and date
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_order_items_user_created ON order_items(user_id, created_at)",
+        # Inventory listing in name order
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_user_name ON inventory(user_id, name, id)",
+        # Low stock alerts only ever look at the few rows under their minimum
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_low_stock ON inventory(user_id, quantity) WHERE quantity <= min_stock",
+        # Append-only tables: tiny BRIN indexes for date-range scans across tenants
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_created_brin ON orders USING brin(created_at)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_order_items_created_brin ON order_items USING brin(created_at)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_history_created_brin ON history USING brin(created_at)",
+        # Superseded by the composite indexes above
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_orders_user_id",
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_history_user_id",
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_inventory_user_id",
+    ], transactional=False),
+    Migration(4, "Persisted forecast models as running sums", [
+        """
+        CREATE TABLE IF NOT EXISTS forecast_models (
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            kind VARCHAR(20) NOT NULL,
+            series TEXT NOT NULL,
+            origin DATE NOT NULL,
+            last_day DATE NOT NULL,
+            n DOUBLE PRECISION NOT NULL DEFAULT 0,
+            sum_x DOUBLE PRECISION NOT NULL DEFAULT 0,
+            sum_y DOUBLE PRECISION NOT NULL DEFAULT 0,
+            sum_xy DOUBLE PRECISION NOT NULL DEFAULT 0,
+            sum_xx DOUBLE PRECISION NOT NULL DEFAULT 0,
+            sum_yy DOUBLE PRECISION NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, kind, series)
+        )
+        """,
+    ]),
+    Migration(5, "Precomputed forecasts and forecast job progress", [
+        """
+        CREATE TABLE IF NOT EXISTS forecasts (
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            kind VARCHAR(20) NOT NULL,
+            series TEXT NOT NULL,
+            horizon_days INTEGER NOT NULL,
+            forecast DOUBLE PRECISION NOT NULL,
+            lower_bound DOUBLE PRECISION,
+            upper_bound DOUBLE PRECISION,
+            confidence DOUBLE PRECISION,
+            computed_for DATE NOT NULL,
+            computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, kind, series, horizon_days)
+        )
+        """,
+        # Top-N reads for the analytics page
+        "CREATE INDEX IF NOT EXISTS idx_forecasts_top ON forecasts(user_id, kind, horizon_days, forecast DESC)",
+        """
+        CREATE TABLE IF NOT EXISTS forecast_job_runs (
+            run_date DATE NOT NULL,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            status VARCHAR(20) NOT NULL,
+            forecasts INTEGER DEFAULT 0,
+            seconds DOUBLE PRECISION,
+            error TEXT,
+            finished_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (run_date, user_id)
+        )
+        """,
+    ]),
+    Migration(6, "Trigram name search and SKU/barcode lookup indexes", [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_name_trgm ON inventory USING gin (name gin_trgm_ops)",
+        # Scanner lookups are exact matches within a tenant
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_user_sku ON inventory(user_id, sku)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_user_barcode ON inventory(user_id, barcode)",
+    ], transactional=False),
+    Migration(7, "Monthly range partitions for history", [
+        # Creates one month's partition, named <parent>_YYYY_MM; used by partitions.py too
+        """
+        CREATE OR REPLACE FUNCTION create_monthly_partition(parent TEXT, month DATE) RETURNS TEXT AS $$
+        DECLARE
+            first_day DATE := date_trunc('month', month);
+            partition_name TEXT := parent || '_' || to_char(first_day, 'YYYY_MM');
+        BEGIN
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, parent, first_day, (first_day + INTERVAL '1 month')::date
+            );
+            RETURN partition_name;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "ALTER TABLE history RENAME TO history_legacy",
+        # Keep the id sequence when the old table is dropped
+        "ALTER SEQUENCE history_id_seq OWNED BY NONE",
+        """
+        CREATE TABLE history (
+            id INTEGER NOT NULL DEFAULT nextval('history_id_seq'),
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            action VARCHAR(100) NOT NULL,
+            item VARCHAR(255),
+            details TEXT,
+            category VARCHAR(100),
+            quantity INTEGER,
+            order_id INTEGER,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """,
+        # Catches rows outside the pre-created months so inserts never fail
+        "CREATE TABLE history_default PARTITION OF history DEFAULT",
+        """
+        DO $$
+        DECLARE
+            month DATE;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', COALESCE(MIN(created_at), LOCALTIMESTAMP)),
+                    date_trunc('month', LOCALTIMESTAMP) + INTERVAL '3 months',
+                    INTERVAL '1 month'
+                )::date
+                FROM history_legacy
+            LOOP
+                PERFORM create_monthly_partition('history', month);
+            END LOOP;
+        END;
+        $$
+        """,
+        """
+        INSERT INTO history (id, user_id, action, item, details, category, quantity, order_id, created_at)
+        SELECT id, user_id, action, item, details, category, quantity, order_id,
+               COALESCE(created_at, CURRENT_TIMESTAMP)
+        FROM history_legacy
+        """,
+        "ALTER SEQUENCE history_id_seq OWNED BY history.id",
+        "DROP TABLE history_legacy",
+        # Recreated on the partitioned table; the old ones went with history_legacy
+        "CREATE INDEX idx_history_user_created ON history(user_id, created_at DESC, id DESC)",
+        "CREATE INDEX idx_history_created_brin ON history USING brin(created_at)",
+        "ANALYZE history",
+    ]),
+    Migration(8, "Move default-partition rows into newly created monthly partitions", [
+        # Rows of the new month already sitting in the default partition would
+        # violate its narrowed constraint, so they are moved aside and back
+        """
+        CREATE OR REPLACE FUNCTION create_monthly_partition(parent TEXT, month DATE) RETURNS TEXT AS $$
+        DECLARE
+            first_day DATE := date_trunc('month', month);
+            next_month DATE := (first_day + INTERVAL '1 month')::date;
+            partition_name TEXT := parent || '_' || to_char(first_day, 'YYYY_MM');
+            stash_name TEXT := partition_name || '_stash';
+        BEGIN
+            IF to_regclass(partition_name) IS NOT NULL THEN
+                RETURN partition_name;
+            END IF;
+
+            EXECUTE format('CREATE TEMP TABLE %I (LIKE %I) ON COMMIT DROP', stash_name, parent);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM %I WHERE created_at >= %L AND created_at < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved',
+                parent || '_default', first_day, next_month, stash_name
+            );
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, parent, first_day, next_month
+            );
+            EXECUTE format('INSERT INTO %I SELECT * FROM %I', parent, stash_name);
+            EXECUTE format('DROP TABLE %I', stash_name);
+            RETURN partition_name;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+    ]),
+]
+
+
+CONCURRENT_INDEX = re.compile(
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)', re.IGNORECASE
+)
+
+
+def index_is_valid(cursor, name):
+    """True/False for an existing index, None when there is no such index"""
+    cursor.execute("""
+        SELECT i.indisvalid FROM pg_index i
+        WHERE i.indexrelid = to_regclass(%s)
+    """, (name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def build_concurrent_index(cursor, name, statement):
+    """Run a CREATE INDEX CONCURRENTLY, replacing an invalid leftover of an earlier attempt"""
+    if index_is_valid(cursor, name) is False:
+        print(f"Dropping invalid index {name} left by an interrupted build")
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    cursor.execute(statement)
+    if not index_is_valid(cursor, name):
+        raise RuntimeError(f"Index {name} was not built or is invalid")
+
+
+def ensure_migrations_table(conn):
+    with conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+
+
+def applied_versions(conn):
+    with conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT version FROM schema_migrations")
+            return {row[0] for row in cursor.fetchall()}
+
+
+def apply_migrations(conn):
+    """Apply every pending migration in order; returns the versions applied"""
+    ensure_migrations_table(conn)
+    done = applied_versions(conn)
+    applied = []
+
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in done:
+            continue
+
+        print(f"Applying migration {migration.version}: {migration.description}")
+        if migration.transactional:
+            with conn:
+                with conn.cursor() as cursor:
+                    for statement in migration.statements:
+                        cursor.execute(statement)
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                        (migration.version, migration.description)
+                    )
+        else:
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cursor:
+                    for statement in migration.statements:
+                        index = CONCURRENT_INDEX.search(statement)
+                        if index:
+                            build_concurrent_index(cursor, index.group(1), statement)
+                        else:
+                            cursor.execute(statement)
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                        (migration.version, migration.description)
+                    )
+            finally:
+                conn.autocommit = False
+        applied.append(migration.version)
+
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument('--status', action='store_true', help='list migrations without applying them')
+    args = parser.parse_args()
+
+    # Load environment variables
+    load_dotenv()
+
+    conn = psycopg2.connect(
+        database=os.getenv('DB_NAME', 'inv'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', '1234'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+    try:
+        if args.status:
+            ensure_migrations_table(conn)
+            done = applied_versions(conn)
+            for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+                state = 'applied' if migration.version in done else 'pending'
+                print(f"{migration.version:>4}  {state:<8} {migration.description}")
+        else:
+            applied = apply_migrations(conn)
+            print(f"Applied {len(applied)} migration(s)" if applied else "Schema is up to date")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
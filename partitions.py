@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""Maintain the monthly partitions of history.
+
+Meant to run daily (cron or a scheduled job). Each run:
+
+1. creates the partitions for the current month and the next
+   PARTITION_MONTHS_AHEAD months, so new rows never land in the default
+   partition, and for any earlier month that still has rows in the
+   default partition; such rows are moved into the new partitions
+2. detaches every monthly partition that ended before the retention window
+   (HISTORY_RETENTION_MONTHS full months before the current one), writes
+   its rows to <archive dir>/<partition>.csv.gz and drops it
+
+Detaching locks the parent table, so it is done in a short transaction of
+its own, giving up after DETACH_LOCK_TIMEOUT rather than queueing behind
+long readers. (DETACH PARTITION CONCURRENTLY is not an option: Postgres
+refuses it on a table with a default partition.) The slow part, writing
+the archive, then runs on the standalone table without holding any lock
+on the parent. A table is only dropped after its archive file has been
+written, and tables left detached by an interrupted run are archived by
+the next one, so a failed run can simply be repeated.
+
+Usage: python partitions.py [--months-ahead 3] [--retention-months 24]
+                            [--archive-dir archive] [--dry-run]
+"""
+import argparse
+import gzip
+import os
+from datetime import date
+import psycopg2
+import psycopg2.errors
+from dotenv import load_dotenv
+
+# Tables partitioned by month on created_at (see migration 7)
+PARTITIONED_TABLES = ['history']
+
+# How long a DETACH may wait for its lock on the parent table
+DETACH_LOCK_TIMEOUT = '5s'
+
+
+def add_months(day, months):
+    """First day of the month `months` months after day's month"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _with_first_days(names):
+    partitions = []
+    for name in names:
+        year, month = name[-7:].split('_')
+        partitions.append((name, date(int(year), int(month), 1)))
+    return partitions
+
+
+def monthly_partitions(cur, table):
+    """Attached monthly partitions of table as (name, first day) pairs, oldest first"""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass AND c.relname ~ ('^' || %s || '_\\d{4}_\\d{2}$')
+        ORDER BY c.relname
+    """, (table, table))
+    return _with_first_days(name for (name,) in cur.fetchall())
+
+
+def detached_partitions(cur, table):
+    """Monthly tables of table that are no longer attached, as (name, first day) pairs.
+
+    These are partitions an earlier run detached but did not get to
+    archive and drop.
+    """
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_class c
+        WHERE c.relkind = 'r'
+          AND c.relname ~ ('^' || %s || '_\\d{4}_\\d{2}$')
+          AND pg_table_is_visible(c.oid)
+          AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid)
+        ORDER BY c.relname
+    """, (table,))
+    return _with_first_days(name for (name,) in cur.fetchall())
+
+
+def partition_months(cur, table, today, months_ahead):
+    """First days of every month that needs a partition.
+
+    That is this month through months_ahead, plus every earlier month back
+    to the oldest row in the default partition, so stray old rows end up
+    in a monthly partition the retention window can archive.
+    """
+    cur.execute(f'SELECT MIN(created_at) FROM "{table}_default"')
+    oldest = cur.fetchone()[0]
+    months_back = 0
+    if oldest is not None and oldest.date() < today:
+        months_back = (today.year - oldest.year) * 12 + today.month - oldest.month
+    return [add_months(today, offset) for offset in range(-months_back, months_ahead + 1)]
+
+
+def ensure_partitions(cur, table, months):
+    """Create the partitions for the given months that do not exist yet; returns their names.
+
+    Rows of those months already in the default partition are moved into
+    the new partitions by create_monthly_partition().
+    """
+    existing = {name for name, _ in monthly_partitions(cur, table)}
+    created = []
+    for month in months:
+        cur.execute("SELECT create_monthly_partition(%s, %s)", (table, month))
+        name = cur.fetchone()[0]
+        if name not in existing:
+            created.append(name)
+    return created
+
+
+def expired_partitions(cur, table, today, retention_months):
+    """Partitions whose whole month lies before the retention window.
+
+    Includes expired tables that are already detached, so an interrupted
+    run is finished by the next one.
+    """
+    cutoff = add_months(today, -retention_months)
+    partitions = monthly_partitions(cur, table) + detached_partitions(cur, table)
+    return sorted(name for name, first_day in partitions if first_day < cutoff)
+
+
+def detach_partition(cur, table, partition):
+    """Detach a partition if it is still attached; commit right after to release the parent"""
+    cur.execute("SET LOCAL lock_timeout = %s", (DETACH_LOCK_TIMEOUT,))
+    cur.execute("""
+        SELECT 1 FROM pg_inherits
+        WHERE inhparent = %s::regclass AND inhrelid = %s::regclass
+    """, (table, partition))
+    if cur.fetchone():
+        cur.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{partition}"')
+
+
+def archive_partition(cur, partition, archive_dir):
+    """Write a detached partition to a gzipped CSV and drop it; returns the archive path"""
+    path = os.path.join(archive_dir, f"{partition}.csv.gz")
+    temporary = path + '.tmp'
+    with gzip.open(temporary, 'wt', newline='') as f:
+        cur.copy_expert(f'COPY "{partition}" TO STDOUT WITH (FORMAT csv, HEADER)', f)
+    os.replace(temporary, path)
+
+    cur.execute(f'DROP TABLE "{partition}"')
+    return path
+
+
+def default_partition_rows(cur, table):
+    cur.execute(f'SELECT COUNT(*) FROM "{table}_default"')
+    return cur.fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create, detach and archive monthly partitions")
+    parser.add_argument('--months-ahead', type=int, help='months of partitions to keep ready')
+    parser.add_argument('--retention-months', type=int, help='full months kept before the current one')
+    parser.add_argument('--archive-dir', help='where detached partitions are written')
+    parser.add_argument('--dry-run', action='store_true', help='only report what would be done')
+    args = parser.parse_args()
+
+    # Load environment variables
+    load_dotenv()
+
+    months_ahead = args.months_ahead if args.months_ahead is not None else int(os.getenv('PARTITION_MONTHS_AHEAD', 3))
+    retention_months = args.retention_months if args.retention_months is not None else int(os.getenv('HISTORY_RETENTION_MONTHS', 24))
+    archive_dir = args.archive_dir or os.getenv('PARTITION_ARCHIVE_DIR', 'archive')
+    if months_ahead < 0 or retention_months < 0:
+        parser.error("months must not be negative")
+    today = date.today()
+
+    conn = psycopg2.connect(
+        database=os.getenv('DB_NAME', 'inv'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', '1234'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+    try:
+        for table in PARTITIONED_TABLES:
+            if args.dry_run:
+                with conn:
+                    with conn.cursor() as cur:
+                        existing = {name for name, _ in monthly_partitions(cur, table)}
+                        missing = [
+                            f"{table}_{month:%Y_%m}"
+                            for month in partition_months(cur, table, today, months_ahead)
+                            if f"{table}_{month:%Y_%m}" not in existing
+                        ]
+                        expired = expired_partitions(cur, table, today, retention_months)
+                print(f"{table}: would create {', '.join(missing) or 'nothing'} and archive "
+                      f"{', '.join(expired) or 'nothing'}")
+                continue
+
+            # A failure here must not stop retention below
+            try:
+                with conn:
+                    with conn.cursor() as cur:
+                        months = partition_months(cur, table, today, months_ahead)
+                        for name in ensure_partitions(cur, table, months):
+                            print(f"Created partition {name}")
+            except psycopg2.Error as e:
+                print(f"Error creating partitions of {table}: {str(e)}")
+
+            with conn:
+                with conn.cursor() as cur:
+                    expired = expired_partitions(cur, table, today, retention_months)
+
+            os.makedirs(archive_dir, exist_ok=True)
+            for name in expired:
+                # Two transactions: only the short first one locks the parent
+                try:
+                    with conn:
+                        with conn.cursor() as cur:
+                            detach_partition(cur, table, name)
+                except psycopg2.errors.LockNotAvailable:
+                    print(f"Could not lock {table} within {DETACH_LOCK_TIMEOUT} to detach {name}; "
+                          f"leaving it for the next run")
+                    continue
+                with conn:
+                    with conn.cursor() as cur:
+                        path = archive_partition(cur, name, archive_dir)
+                print(f"Archived partition {name} to {path}")
+
+            with conn:
+                with conn.cursor() as cur:
+                    stray = default_partition_rows(cur, table)
+            if stray:
+                print(f"Warning: {stray} rows of {table} are in {table}_default, "
+                      f"beyond the pre-created months")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
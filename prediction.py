@@ -5,33 +5,101 @@ import pandas as pd
 from datetime import datetime, timedelta
 import random
 
+
+def order_columns(orders):
+    """Turn orders into (created_at, total) arrays.
+
+    Accepts a pandas frame with created_at (or date) and total columns, a
+    (created_at, totals) pair of arrays, or the legacy list of order dicts
+    with 'date' strings.
+    """
+    if isinstance(orders, pd.DataFrame):
+        date_column = 'created_at' if 'created_at' in orders.columns else 'date'
+        created_at = pd.to_datetime(orders[date_column]).to_numpy()
+        totals = orders['total'].to_numpy()
+    elif isinstance(orders, tuple):
+        created_at, totals = orders
+    else:
+        created_at = [order['date'] for order in orders]
+        totals = [order.get('total', 0) for order in orders]
+
+    created_at = np.asarray(created_at, dtype='datetime64[s]')
+    totals = np.asarray(totals, dtype=float)
+    return created_at, totals
+
+
+def fetch_order_columns(cur, user_id):
+    """Load a tenant's (created_at, total) columns straight from the cursor"""
+    cur.execute("SELECT created_at, total FROM orders WHERE user_id = %s", (user_id,))
+    frame = pd.DataFrame.from_records(cur.fetchall(), columns=['created_at', 'total'])
+    return order_columns(frame)
+
+
+def daily_sales(orders):
+    """Bucket orders by calendar day; returns sorted datetime64[D] days and their totals"""
+    created_at, totals = order_columns(orders)
+    days, day_index = np.unique(created_at.astype('datetime64[D]'), return_inverse=True)
+    sums = np.bincount(day_index, weights=totals, minlength=len(days))
+    return days, sums
+
+
+def seasonal_features(days, origin):
+    """Design matrix of trend, weekday one-hot and day-of-month cycle for datetime64[D] days.
+
+    The trend column counts days since origin. Monday is the baseline
+    weekday, so the six weekday columns are uplifts relative to it. Day of month enters as the sine and cosine of its phase
+    within the month, which captures a mid-month peak with two columns.
+    """
+    days = np.asarray(days, dtype='datetime64[D]')
+    day_numbers = days.astype(np.int64)
+    
+    # 1970-01-01 was a Thursday
+    weekday = (day_numbers + 3) % 7
+    weekdays = (weekday[:, None] == np.arange(1, 7)).astype(float)
+    
+    month_start = days.astype('datetime64[M]')
+    day_of_month = (days - month_start).astype(float)
+    month_length = ((month_start + 1).astype('datetime64[D]') - month_start).astype(float)
+    phase = 2 * np.pi * day_of_month / month_length
+    
+    trend = (days - np.datetime64(origin, 'D')).astype(float)
+    return np.column_stack([trend, weekdays, np.sin(phase), np.cos(phase)])
+
+
 class SalesPrediction:
-    def __init__(self):
+    # Minimum days with sales each model needs before it is trusted
+    MIN_DAYS = {'linear': 5, 'seasonal': 14}
+    
+    def __init__(self, model='linear'):
+        if model not in self.MIN_DAYS:
+            raise ValueError(f"Unknown model '{model}'")
+        self.model_type = model
         self.model = LinearRegression()
         self.is_trained = False
         self.first_date = None
+        self.X = None
+        self.y = None
+        self.confidence = 0
+    
+    def features(self, days):
+        """Model inputs for datetime64[D] days"""
+        if self.model_type == 'seasonal':
+            return seasonal_features(days, self.first_date)
+        # Day offsets from the first sale
+        offsets = np.asarray(days, dtype='datetime64[D]') - np.datetime64(self.first_date, 'D')
+        return offsets.astype(int).reshape(-1, 1)
     
     def prepare_data(self, orders):
         """Prepare historical sales data from orders"""
-        daily_sales = {}
-        
-        for order in orders:
-            date = datetime.strptime(order['date'], "%Y-%m-%d %H:%M:%S").date()
-            if date not in daily_sales:
-                daily_sales[date] = 0
-            daily_sales[date] += float(order.get('total', 0))
-        
-        # Sort by date
-        sorted_dates = sorted(daily_sales.keys())
+        days, sums = daily_sales(orders)
         
-        if len(sorted_dates) < 5:  # Need minimum data points
+        if len(days) < self.MIN_DAYS[self.model_type]:  # Need minimum data points
             return None, None
         
-        self.first_date = sorted_dates[0]
+        self.first_date = days[0].astype(object)
         
-        # Convert to arrays
-        X = np.array([(date - self.first_date).days for date in sorted_dates]).reshape(-1, 1)
-        y = np.array([daily_sales[date] for date in sorted_dates])
+        X = self.features(days)
+        y = sums
         
         return X, y
     
@@ -44,43 +112,67 @@ class SalesPrediction:
             return False
         
         self.model.fit(X, y)
+        # Kept so scoring doesn't prepare the same history again
+        self.X, self.y = X, y
+        self.is_trained = True
+        return True
+    
+    def train_from_stats(self, first_date, stats):
+        """Load a line fitted from running sums (see fit_from_stats) instead of raw orders"""
+        if self.model_type != 'linear':
+            raise ValueError("Only the linear model can be trained from running sums")
+        fit = fit_from_stats(**stats)
+        if fit['n'] < 5:  # Need minimum data points
+            self.is_trained = False
+            return False
+        
+        self.model.coef_ = np.array([float(fit['slope'])])
+        self.model.intercept_ = float(fit['intercept'])
+        self.model.n_features_in_ = 1
+        self.first_date = first_date
+        self.X, self.y = None, None
+        self.confidence = float(fit['r2'])
         self.is_trained = True
         return True
     
-    def predict_future_sales(self, orders, days_to_predict=30):
-        """Predict sales for the next specified number of days"""
+    def predict_future_sales(self, orders=None, days_to_predict=30, start_date=None):
+        """Predict sales for days_to_predict days from start_date (tomorrow by default)"""
         if not self.is_trained or self.first_date is None:
             return None, None, None
         
         # Generate future dates
-        last_date = datetime.now().date()
-        future_dates = [last_date + timedelta(days=x+1) for x in range(days_to_predict)]
+        start_date = start_date or datetime.now().date() + timedelta(days=1)
+        future_dates = [start_date + timedelta(days=x) for x in range(days_to_predict)]
         
         # Prepare prediction input
-        future_X = np.array([(date - self.first_date).days for date in future_dates]).reshape(-1, 1)
+        future_X = self.features(np.datetime64(start_date, 'D') + np.arange(days_to_predict))
         
         # Make predictions
-        predictions = self.model.predict(future_X)
-        predictions = [max(0, p) for p in predictions]  # Ensure no negative predictions
+        predictions = np.maximum(self.model.predict(future_X), 0)  # Ensure no negative predictions
         
-        # Calculate confidence (R² score)
-        confidence = self.model.score(*self.prepare_data(orders))
+        # Calculate confidence (R² score) on the data the model was trained on
+        if self.X is not None:
+            confidence = self.model.score(self.X, self.y)
+        else:
+            confidence = self.confidence
         
-        return future_dates, predictions, confidence
+        return future_dates, predictions.tolist(), confidence
     
-    def get_prediction_data(self, orders):
-        """Get formatted prediction data for the frontend"""
+    def get_prediction_data(self, orders=None):
+        """Get formatted prediction data for the frontend; orders=None uses the model as trained"""
         # Train model
-        if not self.train(orders):
+        if orders is not None:
+            self.train(orders)
+        if not self.is_trained:
             return {
                 'labels': [],
                 'data': [],
                 'confidence': 0,
-                'error': 'Insufficient data (minimum 5 days required)'
+                'error': f'Insufficient data (minimum {self.MIN_DAYS[self.model_type]} days required)'
             }
         
         # Make predictions
-        future_dates, predictions, confidence = self.predict_future_sales(orders)
+        future_dates, predictions, confidence = self.predict_future_sales()
         
         if not future_dates:
             return {
@@ -105,42 +197,29 @@ class SalesPrediction:
 
 def get_sales_insights(orders):
     """Get additional sales insights"""
-    if not orders:
-        return {
-            'trend': 'neutral',
-            'avg_daily_sales': 0,
-            'peak_day': None,
-            'peak_amount': 0
-        }
+    empty = {
+        'trend': 'neutral',
+        'avg_daily_sales': 0,
+        'peak_day': None,
+        'peak_amount': 0
+    }
+    if orders is None or len(orders) == 0:
+        return empty
     
-    daily_sales = {}
-    for order in orders:
-        date = datetime.strptime(order['date'], "%Y-%m-%d %H:%M:%S").date()
-        if date not in daily_sales:
-            daily_sales[date] = 0
-        daily_sales[date] += float(order.get('total', 0))
+    days, sums = daily_sales(orders)
     
-    if not daily_sales:
-        return {
-            'trend': 'neutral',
-            'avg_daily_sales': 0,
-            'peak_day': None,
-            'peak_amount': 0
-        }
+    if len(days) == 0:
+        return empty
     
     # Calculate insights
-    peak_day = max(daily_sales.items(), key=lambda x: x[1])
-    avg_daily_sales = sum(daily_sales.values()) / len(daily_sales)
-    
-    # Determine trend
-    dates = sorted(daily_sales.keys())
-    if len(dates) >= 2:
-        recent_avg = daily_sales[dates[-1]]
-        if len(dates) >= 7:
-            recent_avg = sum(daily_sales[date] for date in dates[-7:]) / 7
-        old_avg = daily_sales[dates[0]]
-        if len(dates) >= 7:
-            old_avg = sum(daily_sales[date] for date in dates[:7]) / 7
+    peak = int(np.argmax(sums))
+    avg_daily_sales = float(sums.mean())
+    
+    # Determine trend from the first and last week (or day, for short histories)
+    if len(days) >= 2:
+        window = 7 if len(days) >= 7 else 1
+        recent_avg = sums[-window:].mean()
+        old_avg = sums[:window].mean()
         
         trend = 'up' if recent_avg > old_avg else 'down' if recent_avg < old_avg else 'neutral'
     else:
@@ -149,14 +228,117 @@ def get_sales_insights(orders):
     return {
         'trend': trend,
         'avg_daily_sales': round(avg_daily_sales, 2),
-        'peak_day': peak_day[0].strftime("%Y-%m-%d"),
-        'peak_amount': round(peak_day[1], 2)
+        'peak_day': str(days[peak]),
+        'peak_amount': round(float(sums[peak]), 2)
+    }
+
+def item_demand_matrix(item_keys, days, quantities, start_date, n_days):
+    """Scatter (item, day, quantity) rows into a dense (n_items, n_days) demand matrix.
+
+    Days without sales are zero. Returns the sorted item keys and the matrix.
+    """
+    items, item_index = np.unique(np.asarray(item_keys), return_inverse=True)
+    day_index = (np.asarray(days, dtype='datetime64[D]') - np.datetime64(start_date, 'D')).astype(int)
+    
+    in_window = (day_index >= 0) & (day_index < n_days)
+    flat_index = item_index[in_window] * n_days + day_index[in_window]
+    demand = np.bincount(
+        flat_index,
+        weights=np.asarray(quantities, dtype=float)[in_window],
+        minlength=len(items) * n_days
+    ).reshape(len(items), n_days)
+    return items, demand
+
+
+def fit_from_stats(n, sum_x, sum_y, sum_xy, sum_xx, sum_yy):
+    """Least-squares line y = a + b*x from running sums; works elementwise on arrays.
+
+    Series with fewer than 3 points or no spread in x get a flat line and
+    zero residual variance rather than NaNs.
+    """
+    n, sum_x, sum_y, sum_xy, sum_xx, sum_yy = (
+        np.asarray(v, dtype=float) for v in (n, sum_x, sum_y, sum_xy, sum_xx, sum_yy)
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = np.where(n > 0, sum_x / n, 0.0)
+        sxx = np.maximum(sum_xx - sum_x * x_mean, 0)
+        sxy = sum_xy - x_mean * sum_y
+        syy = np.maximum(sum_yy - np.where(n > 0, sum_y ** 2 / n, 0.0), 0)
+        
+        slope = np.where(sxx > 0, sxy / sxx, 0.0)
+        intercept = np.where(n > 0, (sum_y - slope * sum_x) / n, 0.0)
+        sse = np.maximum(syy - slope * sxy, 0)
+        sigma2 = np.where(n > 2, sse / (n - 2), 0.0)
+        r2 = np.where(syy > 0, 1 - sse / syy, 0.0)
+    
+    return {
+        'n': n,
+        'slope': slope,
+        'intercept': intercept,
+        'sigma2': sigma2,
+        'r2': r2,
+        'x_mean': x_mean,
+        'sxx': sxx
     }
 
-def generate_sample_data():
+
+def forecast_from_stats(fit, next_x, horizons=(7, 30), z=1.96):
+    """Forecast the sum of the next h values after next_x - 1 for each horizon h.
+
+    fit comes from fit_from_stats. For each horizon the result holds the
+    forecast and a prediction interval at the given z-score, clipped at zero:
+
+        {'slope': ..., 7: {'forecast': ..., 'lower': ..., 'upper': ...}, ...}
+    """
+    next_x = np.asarray(next_x, dtype=float)
+    n, sxx = fit['n'], fit['sxx']
+    
+    result = {'slope': fit['slope']}
+    for h in horizons:
+        x_sum = h * next_x + h * (h - 1) / 2  # sum of the next h x values
+        forecast = h * fit['intercept'] + fit['slope'] * x_sum
+        # Variance of the sum of h new observations: h noise terms plus the
+        # uncertainty of the fitted line summed over the horizon
+        with np.errstate(divide='ignore', invalid='ignore'):
+            line_variance = np.where(n > 0, h ** 2 / n, 0.0) + np.where(
+                sxx > 0, (x_sum - h * fit['x_mean']) ** 2 / sxx, 0.0
+            )
+        margin = z * np.sqrt(fit['sigma2'] * (h + line_variance))
+        result[h] = {
+            'forecast': np.maximum(forecast, 0),
+            'lower': np.maximum(forecast - margin, 0),
+            'upper': np.maximum(forecast + margin, 0)
+        }
+    return result
+
+
+def forecast_items(demand, horizons=(7, 30), z=1.96):
+    """Forecast total demand over each horizon for every row of a demand matrix.
+
+    Fits y = a + b*t per item as one batched closed-form least squares, so
+    the cost is a few matrix-vector products regardless of the item count.
+    See forecast_from_stats for the result layout.
+    """
+    demand = np.asarray(demand, dtype=float)
+    n_items, n_days = demand.shape
+    if n_days < 3:
+        raise ValueError("At least 3 days of history are required")
+    
+    t = np.arange(n_days, dtype=float)
+    fit = fit_from_stats(
+        n=np.full(n_items, n_days),
+        sum_x=np.full(n_items, t.sum()),
+        sum_y=demand.sum(axis=1),
+        sum_xy=demand @ t,
+        sum_xx=np.full(n_items, t @ t),
+        sum_yy=np.einsum('ij,ij->i', demand, demand)
+    )
+    return forecast_from_stats(fit, np.full(n_items, n_days), horizons, z)
+
+def generate_sample_data(days=60):
     """Generate sample sales data for testing the ML model"""
-    # Start date will be 60 days ago
-    start_date = datetime.now() - timedelta(days=60)
+    # Start date will be the given number of days ago
+    start_date = datetime.now() - timedelta(days=days)
     
     # Generate sample orders
     sample_orders = []
@@ -171,7 +353,7 @@ def generate_sample_data():
     ]
     
     # Generate orders with a realistic pattern
-    for day in range(60):
+    for day in range(days):
         current_date = start_date + timedelta(days=day)
         
         # Generate more orders for weekends
@@ -0,0 +1,113 @@
+"""Reorder points and suggested order quantities for a tenant's catalog.
+
+Demand rates come from the tenant's recent order_items, stock levels and
+limits from inventory. Every SKU is computed in one vectorized pass:
+
+- daily demand     = units sold in the window / window length
+- days of cover    = quantity / daily demand (empty when nothing sells)
+- reorder point    = min_stock + daily demand * lead time, rounded up
+- suggested order  = enough to cover lead time + review period above
+                     min_stock, only for SKUs at or below their reorder
+                     point, and never beyond max_stock
+"""
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+COLUMNS = [
+    'id', 'name', 'sku', 'quantity', 'min_stock', 'max_stock', 'cost',
+    'units_sold', 'daily_demand', 'days_of_cover', 'reorder_point',
+    'suggested_quantity', 'order_cost', 'needs_reorder'
+]
+
+
+# Longest window or period accepted for any setting, in days
+MAX_SETTING_DAYS = 3650
+
+
+def replenishment_settings(args=None):
+    """Planning parameters from query args, falling back to REPLENISHMENT_* settings"""
+    args = args or {}
+
+    def setting(name, env, default):
+        try:
+            value = int(args.get(name) or os.getenv(env, default))
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a whole number of days")
+        if value < 0:
+            raise ValueError(f"{name} must not be negative")
+        if value > MAX_SETTING_DAYS:
+            raise ValueError(f"{name} must be at most {MAX_SETTING_DAYS}")
+        return value
+
+    settings = {
+        'history_days': setting('history_days', 'REPLENISHMENT_HISTORY_DAYS', 30),
+        'lead_time_days': setting('lead_time_days', 'REPLENISHMENT_LEAD_TIME_DAYS', 7),
+        'review_days': setting('review_days', 'REPLENISHMENT_REVIEW_DAYS', 7)
+    }
+    if settings['history_days'] == 0:
+        raise ValueError("history_days must be positive")
+    return settings
+
+
+def fetch_replenishment_inputs(cur, user_id, history_days=30):
+    """Load every SKU with its stock limits and units sold in the last history_days days"""
+    cur.execute("""
+        SELECT i.id, i.name, i.sku, i.quantity, i.min_stock, i.max_stock, i.cost,
+               COALESCE(s.units_sold, 0) AS units_sold
+        FROM inventory i
+        LEFT JOIN (
+            SELECT item_id, SUM(quantity) AS units_sold
+            FROM order_items
+            WHERE user_id = %s AND created_at >= %s
+            GROUP BY item_id
+        ) s ON s.item_id = i.id
+        WHERE i.user_id = %s
+        ORDER BY i.name, i.id
+    """, (user_id, datetime.now() - timedelta(days=history_days), user_id))
+    return pd.DataFrame.from_records(
+        cur.fetchall(),
+        columns=['id', 'name', 'sku', 'quantity', 'min_stock', 'max_stock', 'cost', 'units_sold']
+    )
+
+
+def compute_replenishment(items, history_days=30, lead_time_days=7, review_days=7):
+    """Add demand, cover, reorder point and suggested order columns to an inputs frame"""
+    plan = items.copy()
+    quantity = plan['quantity'].to_numpy(dtype=float)
+    min_stock = plan['min_stock'].fillna(0).to_numpy(dtype=float)
+    max_stock = plan['max_stock'].to_numpy(dtype=float)  # NaN = no limit
+    cost = np.nan_to_num(plan['cost'].to_numpy(dtype=float))
+    units_sold = plan['units_sold'].to_numpy(dtype=float)
+
+    daily_demand = units_sold / history_days
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(daily_demand > 0, quantity / daily_demand, np.nan)
+
+    reorder_point = np.ceil(min_stock + daily_demand * lead_time_days)
+    target = np.ceil(min_stock + daily_demand * (lead_time_days + review_days))
+    target = np.where(np.isnan(max_stock), target, np.minimum(target, max_stock))
+
+    needs_reorder = quantity <= reorder_point
+    suggested = np.where(needs_reorder, np.maximum(target - quantity, 0), 0)
+
+    plan['daily_demand'] = np.round(daily_demand, 3)
+    plan['days_of_cover'] = np.round(days_of_cover, 1)
+    plan['reorder_point'] = reorder_point.astype(int)
+    plan['suggested_quantity'] = suggested.astype(int)
+    plan['order_cost'] = np.round(suggested * cost, 2)
+    plan['needs_reorder'] = needs_reorder & (suggested > 0)
+    return plan[COLUMNS]
+
+
+def replenishment_plan(cur, user_id, settings):
+    """Fetch and compute the plan for a tenant"""
+    items = fetch_replenishment_inputs(cur, user_id, settings['history_days'])
+    return compute_replenishment(items, **settings)
+
+
+def plan_records(plan):
+    """Plan rows as JSON-ready dicts, with empty values for missing numbers"""
+    plan = plan.astype(object).where(plan.notna(), None)
+    return plan.to_dict('records')
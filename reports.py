@@ -0,0 +1,316 @@
+import os
+import json
+import uuid
+import time
+import tempfile
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import psycopg2.extras
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# Orders fetched from the server-side cursor per batch, and rows per table flowable
+REPORT_BATCH_SIZE = 500
+
+SUMMARY_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f8f9fa')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#666666')),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 14),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('TOPPADDING', (0, 0), (-1, 0), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dee2e6')),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 12),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+    ('TOPPADDING', (0, 1), (-1, -1), 8),
+])
+
+PRODUCT_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f8f9fa')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#666666')),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dee2e6')),
+    ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+    ('TOPPADDING', (0, 1), (-1, -1), 8),
+])
+
+ORDER_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('ALIGN', (2, 1), (2, -1), 'LEFT'),  # Left align items column
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),  # Align all content to top
+    ('TOPPADDING', (0, 1), (-1, -1), 12),  # Add padding to cells
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 12),
+])
+
+
+class IncrementalFlowables(list):
+    """Flowable list that pulls more flowables from a generator as the document consumes it.
+
+    SimpleDocTemplate.build() pops flowables from the front of the list while
+    checking len(); refilling on demand keeps only a few table chunks alive
+    at a time instead of the whole order history.
+    """
+
+    def __init__(self, source):
+        super().__init__()
+        self._source = iter(source)
+
+    def __len__(self):
+        # Keep one flowable of lookahead for keepWithNext handling
+        while list.__len__(self) < 2 and self._source is not None:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+        return list.__len__(self)
+
+
+def _order_history_tables(conn, user_id, limit):
+    """Yield the recent orders as one table flowable per batch of rows"""
+    # Named cursor: rows stream from the server in REPORT_BATCH_SIZE batches
+    cur = conn.cursor(name='report_orders', cursor_factory=psycopg2.extras.DictCursor)
+    cur.itersize = REPORT_BATCH_SIZE
+    cur.execute("""
+        SELECT o.order_number, o.customer, o.total,
+               to_char(o.created_at, 'YYYY-MM-DD HH24:MI:SS') as formatted_date,
+               COALESCE((
+                   SELECT string_agg(oi.item_name || ' (x' || oi.quantity || ')', E'\\n' ORDER BY oi.id)
+                   FROM order_items oi WHERE oi.order_id = o.id
+               ), '') as items
+        FROM orders o
+        WHERE o.user_id = %s
+        ORDER BY o.created_at DESC
+        LIMIT %s
+    """, (user_id, limit))
+
+    header = ['Order', 'Customer', 'Items', 'Total', 'Date']
+    while True:
+        rows = cur.fetchmany(REPORT_BATCH_SIZE)
+        if not rows:
+            break
+        table_data = [header] + [
+            [
+                order['order_number'],
+                order['customer'],
+                order['items'],
+                f"₹{order['total']:,.2f}",
+                order['formatted_date']
+            ]
+            for order in rows
+        ]
+        table = Table(table_data, colWidths=[1.4*inch, 1.3*inch, 2.2*inch, 0.9*inch, 1.3*inch], repeatRows=1)
+        table.setStyle(ORDER_TABLE_STYLE)
+        yield table
+    cur.close()
+
+
+def build_sales_report(user_id, output, max_orders=1000):
+    """Render the sales report PDF for a tenant into a path or file object"""
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+
+    # A named cursor needs a transaction; use a read-only one for a consistent snapshot
+    conn.autocommit = False
+    conn.set_session(readonly=True)
+    try:
+        cur.execute("SELECT company_name FROM users WHERE id = %s", (user_id,))
+        user = cur.fetchone()
+        company_name = (user['company_name'] if user else None) or 'Company Name'
+
+        cur.execute(
+            "SELECT COUNT(*) as total_orders, COALESCE(SUM(total), 0) as total_revenue FROM orders WHERE user_id = %s",
+            (user_id,)
+        )
+        summary = cur.fetchone()
+
+        # Product-wise sales aggregated in SQL
+        cur.execute("""
+            SELECT oi.item_name, SUM(oi.quantity) as quantity, SUM(oi.quantity * oi.price) as revenue
+            FROM order_items oi
+            JOIN orders o ON oi.order_id = o.id
+            WHERE o.user_id = %s
+            GROUP BY oi.item_name
+            ORDER BY revenue DESC
+        """, (user_id,))
+        product_sales = cur.fetchall()
+
+        # Styles
+        styles = getSampleStyleSheet()
+        title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            spaceAfter=30,
+            alignment=1  # Center alignment
+        )
+        subtitle_style = ParagraphStyle(
+            'CustomSubtitle',
+            parent=styles['Heading2'],
+            fontSize=16,
+            spaceAfter=20,
+            textColor=colors.HexColor('#666666')
+        )
+
+        def flowables():
+            # Add company name and report title
+            yield Paragraph(company_name, title_style)
+            yield Paragraph('Report', subtitle_style)
+            yield Paragraph(f"Generated on: {datetime.now().strftime('%Y-%m-%d')}", styles['Normal'])
+            yield Spacer(1, 20)
+
+            # Sales Summary Table
+            total_orders = summary['total_orders']
+            total_revenue = summary['total_revenue']
+            average = total_revenue / total_orders if total_orders > 0 else 0
+            summary_table = Table([
+                ['Sales Summary', ''],
+                ['Total Revenue', f"₹{total_revenue:,.2f}"],
+                ['Total Orders', str(total_orders)],
+                ['Average Order Value', f"₹{average:,.2f}"]
+            ], colWidths=[200, 200])
+            summary_table.setStyle(SUMMARY_TABLE_STYLE)
+            yield summary_table
+            yield Spacer(1, 30)
+
+            # Product Sales Table
+            yield Paragraph('Product-wise Sales', subtitle_style)
+            product_data = [['Product Name', 'Quantity Sold', 'Revenue']]
+            for product in product_sales:
+                product_data.append([
+                    product['item_name'],
+                    str(product['quantity']),
+                    f"₹{product['revenue']:,.2f}"
+                ])
+            product_table = Table(product_data, colWidths=[200, 100, 100], repeatRows=1)
+            product_table.setStyle(PRODUCT_TABLE_STYLE)
+            yield product_table
+            yield Spacer(1, 30)
+
+            # Recent Orders, one table per fetched batch
+            yield Paragraph('Recent Orders', subtitle_style)
+            yield from _order_history_tables(conn, user_id, max_orders)
+
+        doc = SimpleDocTemplate(output, pagesize=letter)
+        doc.build(IncrementalFlowables(flowables()))
+    finally:
+        conn.rollback()
+        conn.set_session(readonly=False)
+        conn.autocommit = True
+        cur.close()
+        conn.close()
+
+
+def _user_report_dir(user_id):
+    report_dir = os.getenv('REPORT_DIR') or os.path.join(tempfile.gettempdir(), 'inventory_reports')
+    return os.path.join(report_dir, str(user_id))
+
+
+def _job_paths(user_id, job_id):
+    base = os.path.join(_user_report_dir(user_id), job_id)
+    return base + '.pdf', base + '.json'
+
+
+def _run_report_job(user_id, job_id, max_orders):
+    """Executed in a report worker process"""
+    pdf_path, state_path = _job_paths(user_id, job_id)
+    started = time.time()
+    try:
+        # Write to a temp name so a half-written file is never served
+        build_sales_report(user_id, pdf_path + '.part', max_orders=max_orders)
+        os.replace(pdf_path + '.part', pdf_path)
+        state = {'status': 'done', 'seconds': round(time.time() - started, 2)}
+    except Exception as e:
+        logger.exception("Report job %s failed", job_id)
+        state = {'status': 'failed', 'error': str(e)}
+    with open(state_path, 'w') as f:
+        json.dump(state, f)
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _executor_pid
+
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                # spawn, not fork: web workers run background threads
+                _executor = ProcessPoolExecutor(
+                    max_workers=int(os.getenv('REPORT_WORKERS', 2)),
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def _remove_expired_reports(user_dir, ttl):
+    now = time.time()
+    for name in os.listdir(user_dir):
+        path = os.path.join(user_dir, name)
+        try:
+            if now - os.path.getmtime(path) > ttl:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def submit_report_job(user_id, max_orders=None):
+    """Queue a report for background generation and return its job id"""
+    user_dir = _user_report_dir(user_id)
+    os.makedirs(user_dir, exist_ok=True)
+    _remove_expired_reports(user_dir, float(os.getenv('REPORT_TTL_SECONDS', 3600)))
+
+    job_id = uuid.uuid4().hex
+    # Job state lives on disk so any web worker can answer status and download requests
+    _, state_path = _job_paths(user_id, job_id)
+    with open(state_path, 'w') as f:
+        json.dump({'status': 'pending'}, f)
+
+    if max_orders is None:
+        max_orders = int(os.getenv('REPORT_MAX_ORDERS', 1000))
+    _get_executor().submit(_run_report_job, user_id, job_id, max_orders)
+    return job_id
+
+
+def get_report_job(user_id, job_id):
+    """Return (state, pdf_path) for a job, or (None, None) if it does not exist"""
+    # Job ids are hex uuids; reject anything else before touching the filesystem
+    if len(job_id) != 32 or any(c not in '0123456789abcdef' for c in job_id):
+        return None, None
+    pdf_path, state_path = _job_paths(user_id, job_id)
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+    return state, pdf_path
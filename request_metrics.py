@@ -0,0 +1,117 @@
+import threading
+from collections import defaultdict
+
+# Upper bounds (seconds) of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestMetrics:
+    """Per-endpoint request and SQL counters for this worker"""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._requests = defaultdict(int)
+        self._endpoints = defaultdict(lambda: {
+            'count': 0,
+            'seconds': 0.0,
+            'buckets': [0] * len(self.buckets),
+            'db_queries': 0,
+            'db_seconds': 0.0,
+            'slow': 0
+        })
+
+    def record(self, endpoint, method, status, seconds, queries, slow=False):
+        """Add one finished request; queries is a list of (sql, seconds)"""
+        with self._lock:
+            self._requests[(endpoint, method, status)] += 1
+            stats = self._endpoints[endpoint]
+            stats['count'] += 1
+            stats['seconds'] += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    stats['buckets'][i] += 1
+            stats['db_queries'] += len(queries)
+            stats['db_seconds'] += sum(duration for _, duration in queries)
+            if slow:
+                stats['slow'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            requests = dict(self._requests)
+            endpoints = {
+                endpoint: dict(stats, buckets=list(stats['buckets']))
+                for endpoint, stats in self._endpoints.items()
+            }
+        return requests, endpoints
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def prometheus_text(metrics, gauges=None):
+    """Render request metrics plus extra gauges in the Prometheus text format.
+
+    gauges maps a metric name to (type, help, value) where type is 'gauge'
+    or 'counter'.
+    """
+    requests, endpoints = metrics.snapshot()
+    lines = []
+
+    def family(name, metric_type, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+
+    family('http_requests_total', 'counter', 'Requests handled by this worker')
+    for (endpoint, method, status), count in sorted(requests.items(), key=str):
+        lines.append(f'http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+    family('http_request_duration_seconds', 'histogram', 'Request latency')
+    for endpoint, stats in sorted(endpoints.items()):
+        for bound, count in zip(metrics.buckets, stats['buckets']):
+            lines.append(f'http_request_duration_seconds_bucket{_labels(endpoint=endpoint, le=bound)} {count}')
+        lines.append(f'http_request_duration_seconds_bucket{_labels(endpoint=endpoint, le="+Inf")} {stats["count"]}')
+        lines.append(f'http_request_duration_seconds_sum{_labels(endpoint=endpoint)} {_number(stats["seconds"])}')
+        lines.append(f'http_request_duration_seconds_count{_labels(endpoint=endpoint)} {stats["count"]}')
+
+    family('db_queries_total', 'counter', 'SQL statements executed while handling requests')
+    for endpoint, stats in sorted(endpoints.items()):
+        lines.append(f'db_queries_total{_labels(endpoint=endpoint)} {stats["db_queries"]}')
+
+    family('db_query_duration_seconds_total', 'counter', 'Time spent executing SQL while handling requests')
+    for endpoint, stats in sorted(endpoints.items()):
+        lines.append(f'db_query_duration_seconds_total{_labels(endpoint=endpoint)} {_number(stats["db_seconds"])}')
+
+    family('http_slow_requests_total', 'counter', 'Requests slower than SLOW_REQUEST_MS')
+    for endpoint, stats in sorted(endpoints.items()):
+        lines.append(f'http_slow_requests_total{_labels(endpoint=endpoint)} {stats["slow"]}')
+
+    for name, (metric_type, help_text, value) in (gauges or {}).items():
+        if value is None:
+            continue
+        family(name, metric_type, help_text)
+        lines.append(f'{name} {_number(value)}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def server_timing(total_seconds, queries):
+    """Server-Timing header value with total, DB and slowest-statement durations"""
+    db_seconds = sum(duration for _, duration in queries)
+    parts = [
+        f'app;dur={total_seconds * 1000:.1f}',
+        f'db;dur={db_seconds * 1000:.1f};desc="{len(queries)} queries"'
+    ]
+    if queries:
+        slowest = max(duration for _, duration in queries)
+        parts.append(f'db-slowest;dur={slowest * 1000:.1f}')
+    return ', '.join(parts)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Seed the database with a reproducible synthetic dataset for benchmarks.
+
+Generates N tenants, each with K categories, M SKUs and Y years of orders,
+order lines and history, and loads them with COPY FROM STDIN. The same seed
+always produces the same data. Order volume follows weekday, mid-month and
+yearly seasonality plus growth over time; product popularity is Zipfian, so
+a few SKUs account for most sales, like in a real catalog.
+
+Tenants are created as seed-<seed>-<n>@example.com with password "seed";
+rerunning with the same seed replaces them. Pass --end-date as well to get
+byte-identical data on a later day.
+
+Usage: python seed_data.py [--tenants 1] [--skus 1000] [--categories 20]
+                           [--years 1] [--orders 10000] [--seed 42]
+                           [--end-date YYYY-MM-DD]
+"""
+import argparse
+import io
+import os
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import psycopg2
+from psycopg2.extras import execute_values
+from werkzeug.security import generate_password_hash
+from dotenv import load_dotenv
+
+STATUSES = np.array(['completed', 'pending', 'processing', 'cancelled'])
+STATUS_WEIGHTS = [0.7, 0.15, 0.1, 0.05]
+# Relative order volume Monday..Sunday
+WEEKDAY_WEIGHTS = np.array([0.9, 0.9, 0.95, 1.0, 1.1, 1.5, 1.3])
+HISTORY_ACTIONS = np.array(['Stock Increased', 'Stock Decreased', 'Item Updated'])
+
+
+def copy_frame(cur, table, frame):
+    """Load a frame into table with COPY, columns matched by name"""
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY {table} ({', '.join(frame.columns)}) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+
+
+def reserve_ids(cur, table, count):
+    """Reserve a block of count ids from a table's serial sequence; returns them as an array.
+
+    Not safe against concurrent inserts into the same table, which a
+    seeding run does not expect.
+    """
+    if count == 0:
+        return np.empty(0, dtype=np.int64)
+    cur.execute(f"SELECT pg_get_serial_sequence('{table}', 'id')")
+    sequence = cur.fetchone()[0]
+    cur.execute("SELECT nextval(%s)", (sequence,))
+    first = cur.fetchone()[0]
+    cur.execute("SELECT setval(%s, %s)", (sequence, first + count - 1))
+    return np.arange(first, first + count, dtype=np.int64)
+
+
+def day_weights(days):
+    """Relative order volume for datetime64[D] days"""
+    day_numbers = days.astype(np.int64)
+    weekday = WEEKDAY_WEIGHTS[(day_numbers + 3) % 7]  # 1970-01-01 was a Thursday
+
+    day_of_month = (days - days.astype('datetime64[M]')).astype(int) + 1
+    mid_month = np.where((day_of_month >= 10) & (day_of_month <= 20), 1.3, 1.0)
+
+    day_of_year = (days - days.astype('datetime64[Y]')).astype(int)
+    yearly = 1 + 0.3 * np.cos(2 * np.pi * (day_of_year - 340) / 365.25)  # December peak
+
+    growth = np.linspace(1.0, 1.5, len(days))
+    weights = weekday * mid_month * yearly * growth
+    return weights / weights.sum()
+
+
+def zipf_weights(count, exponent=1.1):
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+
+def generate_tenant(rng, user_id, category_ids, item_ids, order_ids, start, end):
+    """Build the category, inventory, order, order line and history frames of one tenant"""
+    n_skus, n_orders = len(item_ids), len(order_ids)
+    numbers = pd.Series(np.arange(1, n_skus + 1)).astype(str).str.zfill(6)
+    product_names = ('Product ' + numbers).to_numpy()
+
+    categories = pd.DataFrame({
+        'id': category_ids,
+        'name': [f"Category {k + 1}" for k in range(len(category_ids))],
+        'user_id': user_id
+    })
+
+    price = np.round(rng.lognormal(3.5, 1.0, n_skus).clip(1, 99999), 2)
+    max_stock = rng.integers(50, 1000, n_skus)
+    inventory = pd.DataFrame({
+        'id': item_ids,
+        'name': product_names,
+        'description': 'Synthetic product',
+        'category_id': rng.choice(category_ids, n_skus),
+        'quantity': rng.integers(0, max_stock + 1),
+        'price': price,
+        'cost': np.round(price * rng.uniform(0.4, 0.8, n_skus), 2),
+        'sku': (f'SKU-{user_id}-' + numbers).to_numpy(),
+        'barcode': rng.integers(10 ** 11, 10 ** 12, n_skus).astype(str),
+        'min_stock': rng.integers(0, 50, n_skus),
+        'max_stock': max_stock,
+        'user_id': user_id,
+        'created_at': start
+    })
+
+    # Orders: sample days by seasonal weight, then a time within opening hours
+    days = np.arange(start, end, dtype='datetime64[D]')
+    created_at = np.sort(
+        rng.choice(days, n_orders, p=day_weights(days))
+        + rng.integers(9 * 3600, 21 * 3600, n_orders).astype('timedelta64[s]')
+    )
+
+    # Order numbers restart at 0001 per day, in creation order
+    order_days = created_at.astype('datetime64[D]')
+    first_of_day = np.searchsorted(order_days, order_days, side='left')
+    sequence = np.arange(n_orders) - first_of_day + 1
+    order_numbers = (
+        'ORD-' + pd.Series(order_days).dt.strftime('%Y%m%d')
+        + '-' + pd.Series(sequence).astype(str).str.zfill(4)
+    ).to_numpy()
+
+    # Order lines: Zipfian product choice over a tenant-specific popularity order
+    lines_per_order = np.minimum(1 + rng.poisson(1.5, n_orders), 10)
+    n_lines = int(lines_per_order.sum())
+    line_order = np.repeat(np.arange(n_orders), lines_per_order)
+    popularity = rng.permutation(n_skus)
+    line_item = popularity[rng.choice(n_skus, n_lines, p=zipf_weights(n_skus))]
+    line_quantity = rng.geometric(0.6, n_lines)
+    line_price = price[line_item]
+    totals = np.round(np.bincount(line_order, weights=line_quantity * line_price, minlength=n_orders), 2)
+
+    orders = pd.DataFrame({
+        'id': order_ids,
+        'order_number': order_numbers,
+        'customer': ('Customer ' + pd.Series(rng.zipf(1.5, n_orders) % 5000).astype(str)).to_numpy(),
+        'status': rng.choice(STATUSES, n_orders, p=STATUS_WEIGHTS),
+        'total': totals,
+        'user_id': user_id,
+        'created_at': created_at,
+        'updated_at': created_at
+    })
+
+    order_items = pd.DataFrame({
+        'order_id': order_ids[line_order],
+        'item_id': item_ids[line_item],
+        'item_name': product_names[line_item],
+        'quantity': line_quantity,
+        'price': line_price,
+        'user_id': user_id,
+        'created_at': created_at[line_order]
+    })
+
+    # Roughly one stock movement or edit for every two orders
+    n_history = max(n_orders // 2, 1)
+    history_item = rng.integers(0, n_skus, n_history)
+    history_action = rng.choice(HISTORY_ACTIONS, n_history)
+    history_quantity = pd.Series(rng.integers(1, 50, n_history), dtype='Int64')
+    item_names = pd.Series(product_names[history_item])
+    history = pd.DataFrame({
+        'user_id': user_id,
+        'action': history_action,
+        'item': item_names,
+        'details': pd.Series(history_action) + ' for ' + item_names,
+        # Edits carry no quantity
+        'quantity': history_quantity.mask(history_action == 'Item Updated'),
+        'created_at': np.sort(
+            rng.choice(days, n_history) + rng.integers(0, 86400, n_history).astype('timedelta64[s]')
+        )
+    })
+
+    return categories, inventory, orders, order_items, history
+
+
+def seed(conn, args):
+    rng = np.random.default_rng(args.seed)
+    end = np.datetime64(args.end_date, 'D')
+    start = end - np.timedelta64(int(round(args.years * 365)), 'D')
+    password = generate_password_hash('seed')
+    counts = {'orders': 0, 'order_items': 0, 'history': 0}
+
+    for n in range(args.tenants):
+        tenant_start = time.perf_counter()
+        email = f"seed-{args.seed}-{n + 1}@example.com"
+
+        with conn:
+            with conn.cursor() as cur:
+                # Replace the tenant from an earlier run with the same seed
+                cur.execute("SELECT id FROM users WHERE email = %s", (email,))
+                existing = cur.fetchone()
+                if existing:
+                    cur.execute("DELETE FROM order_items WHERE order_id IN (SELECT id FROM orders WHERE user_id = %s)", existing)
+                    cur.execute("DELETE FROM users WHERE id = %s", existing)
+
+                execute_values(cur, """
+                    INSERT INTO users (email, username, password, company_name) VALUES %s RETURNING id
+                """, [(email, f"seed{n + 1}", password, f"Seed Company {n + 1}")])
+                user_id = cur.fetchone()[0]
+
+                category_ids = reserve_ids(cur, 'categories', args.categories)
+                item_ids = reserve_ids(cur, 'inventory', args.skus)
+                order_ids = reserve_ids(cur, 'orders', args.orders)
+
+                frames = generate_tenant(rng, user_id, category_ids, item_ids, order_ids, start, end)
+                categories, inventory, orders, order_items, history = frames
+
+                copy_frame(cur, 'categories', categories)
+                copy_frame(cur, 'inventory', inventory)
+                copy_frame(cur, 'orders', orders)
+                copy_frame(cur, 'order_items', order_items)
+                copy_frame(cur, 'history', history)
+
+        counts['orders'] += len(orders)
+        counts['order_items'] += len(order_items)
+        counts['history'] += len(history)
+        seconds = time.perf_counter() - tenant_start
+        rows = len(categories) + len(inventory) + len(orders) + len(order_items) + len(history)
+        print(f"[{n + 1}/{args.tenants}] {email} (user {user_id}): "
+              f"{rows} rows in {seconds:.1f}s ({rows / seconds * 60:,.0f} rows/min)")
+
+    # Planner statistics for the freshly loaded tables
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE categories, inventory, orders, order_items, history")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a reproducible synthetic dataset")
+    parser.add_argument('--tenants', type=int, default=1, help='number of tenants')
+    parser.add_argument('--skus', type=int, default=1000, help='SKUs per tenant')
+    parser.add_argument('--categories', type=int, default=20, help='categories per tenant')
+    parser.add_argument('--years', type=float, default=1, help='years of order history')
+    parser.add_argument('--orders', type=int, default=10000, help='orders per tenant')
+    parser.add_argument('--seed', type=int, default=42, help='random seed')
+    parser.add_argument('--end-date', type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+                        default=datetime.now().date(),
+                        help='day after the last order (default today); fix it for identical reruns')
+    args = parser.parse_args()
+    if min(args.tenants, args.skus, args.categories, args.orders) < 1 or args.years <= 0:
+        parser.error("all sizes must be positive")
+
+    # Load environment variables
+    load_dotenv()
+
+    conn = psycopg2.connect(
+        database=os.getenv('DB_NAME', 'inv'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', '1234'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+    start = time.perf_counter()
+    try:
+        counts = seed(conn, args)
+    finally:
+        conn.close()
+
+    seconds = time.perf_counter() - start
+    print(f"Seeded {counts['orders']:,} orders, {counts['order_items']:,} order lines and "
+          f"{counts['history']:,} history rows in {seconds:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 import os
 from dotenv import load_dotenv
+from tenant_stats import reconcile_tenant_stats
+from migrations import apply_migrations
 
 # Load environment variables
 load_dotenv()
@@ -135,6 +137,16 @@ def create_tables():
         )
         """)
         
+        # Create order number counters table (one row per tenant per day)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS order_number_counters (
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            day DATE NOT NULL,
+            last_value INTEGER NOT NULL,
+            PRIMARY KEY (user_id, day)
+        )
+        """)
+        
         # Create history table
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS history (
@@ -163,13 +175,26 @@ def create_tables():
         )
         """)
         
-        # Create indexes for performance
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_user_id ON inventory(user_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_category_id ON inventory(category_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders(user_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_user_id ON history(user_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_categories_parent_id ON categories(parent_id)")
+        # Create sequence for real-time event ids (shared by all workers)
+        cursor.execute("CREATE SEQUENCE IF NOT EXISTS inventory_event_seq")
+        
+        # Create tenant stats table (dashboard KPIs maintained by triggers)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tenant_stats (
+            user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+            inventory_count INTEGER NOT NULL DEFAULT 0,
+            categories_count INTEGER NOT NULL DEFAULT 0,
+            orders_count INTEGER NOT NULL DEFAULT 0,
+            stock_value NUMERIC(14, 2) NOT NULL DEFAULT 0,
+            total_sales NUMERIC(14, 2) NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        
+        create_tenant_stats_triggers(cursor)
+        
+        # Bring tenant stats in line with any existing data
+        reconcile_tenant_stats(cursor)
         
         # Commit changes
         conn.commit()
@@ -184,13 +209,156 @@ def create_tables():
         print(f"Error creating tables: {str(e)}")
         return False
 
+def create_tenant_stats_triggers(cursor):
+    """Keep tenant_stats up to date from inventory, categories and orders changes.
+    
+    Statement-level triggers with transition tables apply one aggregated
+    delta per tenant per statement, so multi-row inserts and updates touch
+    each stats row once. Stats rows are only ever updated, never inserted,
+    by these triggers; the users trigger creates them.
+    """
+    cursor.execute("""
+    CREATE OR REPLACE FUNCTION tenant_stats_create_row() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO tenant_stats (user_id) VALUES (NEW.id) ON CONFLICT DO NOTHING;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """)
+    
+    cursor.execute("""
+    CREATE OR REPLACE FUNCTION tenant_stats_inventory() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'DELETE' THEN
+            UPDATE tenant_stats s
+            SET inventory_count = s.inventory_count + d.item_count,
+                stock_value = s.stock_value + d.stock_value,
+                updated_at = CURRENT_TIMESTAMP
+            FROM (
+                SELECT user_id,
+                       CASE WHEN TG_OP = 'INSERT' THEN COUNT(*) ELSE 0 END AS item_count,
+                       COALESCE(SUM(quantity * price), 0) AS stock_value
+                FROM new_rows GROUP BY user_id
+            ) d
+            WHERE s.user_id = d.user_id;
+        END IF;
+        IF TG_OP <> 'INSERT' THEN
+            UPDATE tenant_stats s
+            SET inventory_count = s.inventory_count - d.item_count,
+                stock_value = s.stock_value - d.stock_value,
+                updated_at = CURRENT_TIMESTAMP
+            FROM (
+                SELECT user_id,
+                       CASE WHEN TG_OP = 'DELETE' THEN COUNT(*) ELSE 0 END AS item_count,
+                       COALESCE(SUM(quantity * price), 0) AS stock_value
+                FROM old_rows GROUP BY user_id
+            ) d
+            WHERE s.user_id = d.user_id;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """)
+    
+    cursor.execute("""
+    CREATE OR REPLACE FUNCTION tenant_stats_categories() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            UPDATE tenant_stats s
+            SET categories_count = s.categories_count + d.category_count,
+                updated_at = CURRENT_TIMESTAMP
+            FROM (SELECT user_id, COUNT(*) AS category_count FROM new_rows GROUP BY user_id) d
+            WHERE s.user_id = d.user_id;
+        ELSE
+            UPDATE tenant_stats s
+            SET categories_count = s.categories_count - d.category_count,
+                updated_at = CURRENT_TIMESTAMP
+            FROM (SELECT user_id, COUNT(*) AS category_count FROM old_rows GROUP BY user_id) d
+            WHERE s.user_id = d.user_id;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """)
+    
+    cursor.execute("""
+    CREATE OR REPLACE FUNCTION tenant_stats_orders() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'DELETE' THEN
+            UPDATE tenant_stats s
+            SET orders_count = s.orders_count + d.order_count,
+                total_sales = s.total_sales + d.total_sales,
+                updated_at = CURRENT_TIMESTAMP
+            FROM (
+                SELECT user_id,
+                       CASE WHEN TG_OP = 'INSERT' THEN COUNT(*) ELSE 0 END AS order_count,
+                       COALESCE(SUM(total), 0) AS total_sales
+                FROM new_rows GROUP BY user_id
+            ) d
+            WHERE s.user_id = d.user_id;
+        END IF;
+        IF TG_OP <> 'INSERT' THEN
+            UPDATE tenant_stats s
+            SET orders_count = s.orders_count - d.order_count,
+                total_sales = s.total_sales - d.total_sales,
+                updated_at = CURRENT_TIMESTAMP
+            FROM (
+                SELECT user_id,
+                       CASE WHEN TG_OP = 'DELETE' THEN COUNT(*) ELSE 0 END AS order_count,
+                       COALESCE(SUM(total), 0) AS total_sales
+                FROM old_rows GROUP BY user_id
+            ) d
+            WHERE s.user_id = d.user_id;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """)
+    
+    # Transition tables allow only one event per trigger, hence one trigger per event
+    triggers = [
+        ('users', 'INSERT', 'tenant_stats_create_row', 'FOR EACH ROW'),
+        ('inventory', 'INSERT', 'tenant_stats_inventory', 'REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT'),
+        ('inventory', 'UPDATE', 'tenant_stats_inventory', 'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT'),
+        ('inventory', 'DELETE', 'tenant_stats_inventory', 'REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT'),
+        ('categories', 'INSERT', 'tenant_stats_categories', 'REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT'),
+        ('categories', 'DELETE', 'tenant_stats_categories', 'REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT'),
+        ('orders', 'INSERT', 'tenant_stats_orders', 'REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT'),
+        ('orders', 'UPDATE', 'tenant_stats_orders', 'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT'),
+        ('orders', 'DELETE', 'tenant_stats_orders', 'REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT'),
+    ]
+    for table, event, function, options in triggers:
+        name = f"trg_{function}_{table}_{event.lower()}"
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        cursor.execute(f"CREATE TRIGGER {name} AFTER {event} ON {table} {options} EXECUTE FUNCTION {function}()")
+
+def run_migrations():
+    """Apply pending schema migrations on top of the baseline tables"""
+    try:
+        conn = psycopg2.connect(
+            database=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            host=DB_HOST,
+            port=DB_PORT
+        )
+        apply_migrations(conn)
+        conn.close()
+        return True
+    except Exception as e:
+        print(f"Error applying migrations: {str(e)}")
+        return False
+
 def main():
     """Main function to run the database setup"""
     print("Setting up database...")
     
     if create_database():
         if create_tables():
-            print("Database setup completed successfully")
+            if run_migrations():
+                print("Database setup completed successfully")
+            else:
+                print("Database setup failed during migrations")
         else:
             print("Database setup failed during table creation")
     else:
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Rebuild the tenant_stats summary table from the base tables and report drift.
+
+Usage: python tenant_stats.py [--dry-run]
+"""
+import argparse
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+STAT_COLUMNS = ['inventory_count', 'categories_count', 'orders_count', 'stock_value', 'total_sales']
+
+# Stats recomputed from scratch for every tenant
+ACTUAL_STATS_QUERY = """
+    SELECT u.id AS user_id,
+           COALESCE(i.inventory_count, 0) AS inventory_count,
+           COALESCE(c.categories_count, 0) AS categories_count,
+           COALESCE(o.orders_count, 0) AS orders_count,
+           COALESCE(i.stock_value, 0) AS stock_value,
+           COALESCE(o.total_sales, 0) AS total_sales
+    FROM users u
+    LEFT JOIN (
+        SELECT user_id, COUNT(*) AS inventory_count, SUM(quantity * price) AS stock_value
+        FROM inventory GROUP BY user_id
+    ) i ON i.user_id = u.id
+    LEFT JOIN (
+        SELECT user_id, COUNT(*) AS categories_count
+        FROM categories GROUP BY user_id
+    ) c ON c.user_id = u.id
+    LEFT JOIN (
+        SELECT user_id, COUNT(*) AS orders_count, SUM(total) AS total_sales
+        FROM orders GROUP BY user_id
+    ) o ON o.user_id = u.id
+"""
+
+
+def reconcile_tenant_stats(cursor, dry_run=False):
+    """Compare tenant_stats with the base tables and rewrite rows that drifted.
+
+    Returns a list of (user_id, column, stored, actual) tuples, where stored is
+    None for tenants that had no stats row. Must run inside a transaction.
+    """
+    # Block trigger updates while recomputing so no delta is lost in between
+    cursor.execute("LOCK TABLE tenant_stats IN SHARE ROW EXCLUSIVE MODE")
+
+    columns = ', '.join(STAT_COLUMNS)
+    cursor.execute(f"""
+        WITH actual AS ({ACTUAL_STATS_QUERY})
+        SELECT a.user_id, s.user_id IS NOT NULL AS has_row,
+               {', '.join(f's.{c}' for c in STAT_COLUMNS)},
+               {', '.join(f'a.{c}' for c in STAT_COLUMNS)}
+        FROM actual a
+        LEFT JOIN tenant_stats s ON s.user_id = a.user_id
+        WHERE s.user_id IS NULL
+           OR ({', '.join(f's.{c}' for c in STAT_COLUMNS)})
+              IS DISTINCT FROM ({', '.join(f'a.{c}' for c in STAT_COLUMNS)})
+    """)
+
+    drift = []
+    count = len(STAT_COLUMNS)
+    for row in cursor.fetchall():
+        user_id, has_row = row[0], row[1]
+        stored, actual = row[2:2 + count], row[2 + count:]
+        for column, stored_value, actual_value in zip(STAT_COLUMNS, stored, actual):
+            if not has_row or stored_value != actual_value:
+                drift.append((user_id, column, stored_value if has_row else None, actual_value))
+
+    if drift and not dry_run:
+        cursor.execute(f"""
+            INSERT INTO tenant_stats (user_id, {columns})
+            SELECT user_id, {columns} FROM ({ACTUAL_STATS_QUERY}) actual
+            WHERE user_id = ANY(%s)
+            ON CONFLICT (user_id) DO UPDATE SET
+                {', '.join(f'{c} = EXCLUDED.{c}' for c in STAT_COLUMNS)},
+                updated_at = CURRENT_TIMESTAMP
+        """, (sorted({user_id for user_id, _, _, _ in drift}),))
+
+    return drift
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dry-run', action='store_true', help='report drift without fixing it')
+    args = parser.parse_args()
+
+    # Load environment variables
+    load_dotenv()
+
+    conn = psycopg2.connect(
+        database=os.getenv('DB_NAME', 'inv'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', '1234'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+    with conn:
+        with conn.cursor() as cursor:
+            drift = reconcile_tenant_stats(cursor, dry_run=args.dry_run)
+    conn.close()
+
+    for user_id, column, stored, actual in drift:
+        print(f"user {user_id}: {column} stored={stored} actual={actual}")
+
+    tenants = len({user_id for user_id, _, _, _ in drift})
+    if not drift:
+        print("tenant_stats is in sync")
+    elif args.dry_run:
+        print(f"Found drift for {tenants} tenant(s); run without --dry-run to fix")
+    else:
+        print(f"Rebuilt stats for {tenants} tenant(s)")
+    return 1 if drift and args.dry_run else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,153 @@
+import psycopg2
+import psycopg2.extensions
+import pytest
+from psycopg2 import pool as pg_pool
+import database
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, vars=None):
+        if self.conn.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        # Like psycopg2, a statement outside autocommit opens a transaction
+        if not self.conn.autocommit:
+            self.conn.in_transaction = True
+
+
+class FakeInfo:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @property
+    def transaction_status(self):
+        if self.conn.in_transaction:
+            return psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        return psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakeConnection:
+    """Enough of a psycopg2 connection for the pool: new connections are not autocommit"""
+
+    def __init__(self, broken=False):
+        self.closed = 0
+        self.broken = broken
+        self.in_transaction = False
+        self._autocommit = False
+        self.info = FakeInfo(self)
+
+    @property
+    def autocommit(self):
+        return self._autocommit
+
+    @autocommit.setter
+    def autocommit(self, value):
+        if self.in_transaction:
+            raise psycopg2.ProgrammingError("set_session cannot be used inside a transaction")
+        self._autocommit = value
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = 1
+
+
+class FakeThreadedPool:
+    """Mirrors ThreadedConnectionPool: opens connections lazily up to maxconn"""
+
+    broken_next = 0
+
+    def __init__(self, minconn, maxconn, **kwargs):
+        self.maxconn = maxconn
+        self._pool = []
+        self._used = set()
+
+    def getconn(self):
+        if self._pool:
+            conn = self._pool.pop()
+        elif len(self._used) < self.maxconn:
+            conn = FakeConnection(broken=FakeThreadedPool.broken_next > 0)
+            FakeThreadedPool.broken_next -= 1
+        else:
+            raise pg_pool.PoolError("connection pool exhausted")
+        self._used.add(conn)
+        return conn
+
+    def putconn(self, conn, close=False):
+        self._used.discard(conn)
+        if close or conn.closed:
+            conn.close()
+        else:
+            conn.rollback()
+            self._pool.append(conn)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    FakeThreadedPool.broken_next = 0
+    monkeypatch.setattr(database.pg_pool, 'ThreadedConnectionPool', FakeThreadedPool)
+    return database.ConnectionPool(minconn=1, maxconn=3, timeout=0.1, ping_interval=30)
+
+
+def test_more_checkouts_than_maxconn(pool):
+    for _ in range(pool.maxconn * 3):
+        conn = pool.getconn()
+        assert conn.autocommit
+        assert not conn.in_transaction
+        pool.putconn(conn)
+
+    stats = pool.stats()
+    assert stats['checkouts'] == pool.maxconn * 3
+    assert stats['in_use'] == 0
+    assert stats['discarded'] == 0
+
+
+def test_all_slots_checked_out_at_once(pool):
+    conns = [pool.getconn() for _ in range(pool.maxconn)]
+    with pytest.raises(pg_pool.PoolError):
+        pool.getconn()
+    for conn in conns:
+        pool.putconn(conn)
+    pool.putconn(pool.getconn())
+
+
+def test_broken_connections_are_discarded_without_leaking_slots(pool):
+    FakeThreadedPool.broken_next = 2
+    for _ in range(pool.maxconn * 2):
+        conn = pool.getconn()
+        assert not conn.broken
+        pool.putconn(conn)
+
+    stats = pool.stats()
+    assert stats['discarded'] == 2
+    assert stats['in_use'] == 0
+
+
+def test_connection_left_in_transaction_is_reset(pool):
+    conn = pool.getconn()
+    conn.autocommit = False
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1")
+    # Bypass the fake pool's rollback to simulate a connection returned mid-transaction
+    pool._pool._used.discard(conn)
+    pool._pool._pool.append(conn)
+    pool._slots.release()
+    with pool._lock:
+        pool._stats['in_use'] -= 1
+
+    again = pool.getconn()
+    assert again is conn
+    assert again.autocommit
+    pool.putconn(again)
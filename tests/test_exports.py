@@ -0,0 +1,21 @@
+import pytest
+from exports import accepts_gzip
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip', True),
+    ('gzip, deflate, br', True),
+    ('br, gzip;q=0.5', True),
+    ('*', True),
+    ('GZIP', True),
+    (None, False),
+    ('', False),
+    ('identity', False),
+    ('x-gzip', False),
+    ('gzip;q=0', False),
+    ('deflate, gzip;q=0.0', False),
+    ('*;q=0', False),
+    ('gzip;q=0, *', False),
+])
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(header) is expected
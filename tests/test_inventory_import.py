@@ -0,0 +1,76 @@
+import io
+import re
+import pytest
+import inventory_import
+from inventory_import import read_header, INTEGER_PATTERN, MONEY_PATTERN
+
+
+@pytest.mark.parametrize('line, columns', [
+    (b'name,price\n', ['name', 'price']),
+    (b'\xef\xbb\xbfName, Price ,Min Stock\r\n', ['name', 'price', 'min_stock']),
+    (b'"name","sku","barcode"\n', ['name', 'sku', 'barcode']),
+])
+def test_header_columns_are_normalized(line, columns):
+    assert read_header(io.BytesIO(line + b'Widget,1.50\n')) == columns
+
+
+def test_header_leaves_the_rows_in_the_stream():
+    stream = io.BytesIO(b'name,price\nWidget,1.50\n')
+    read_header(stream)
+    assert stream.read() == b'Widget,1.50\n'
+
+
+@pytest.mark.parametrize('data, message', [
+    (b'', 'The file is empty'),
+    (b'name,colour\n', 'Unknown columns: colour'),
+    (b'name,price,Price\n', 'Duplicate columns'),
+    (b'sku,price\n', 'must include a name column'),
+])
+def test_invalid_headers(data, message):
+    with pytest.raises(ValueError, match=message):
+        read_header(io.BytesIO(data))
+
+
+@pytest.fixture
+def staged(monkeypatch):
+    """Batches _stage_batches hands to execute_values"""
+    batches = []
+    monkeypatch.setattr(inventory_import, 'execute_values',
+                        lambda cur, sql, rows, page_size: batches.append((sql, list(rows))))
+    monkeypatch.setattr(inventory_import, 'STAGE_BATCH_SIZE', 2)
+    return batches
+
+
+def test_rows_are_staged_in_batches(staged):
+    stream = io.BytesIO('Widget,1.50\nGadget,2\n\nGizmo "XL",3\nCafé,4\n'.encode())
+    inventory_import._stage_batches(None, stream, ['name', 'price'])
+
+    assert [rows for _, rows in staged] == [
+        [['Widget', '1.50'], ['Gadget', '2']],
+        [['Gizmo "XL"', '3'], ['Café', '4']],
+    ]
+    assert staged[0][0] == "INSERT INTO inventory_import_rows (name, price) VALUES %s"
+
+
+def test_short_row_is_malformed(staged):
+    stream = io.BytesIO(b'Widget,1.50\nGadget\n')
+    with pytest.raises(ValueError, match='row 2 has 1 fields, expected 2'):
+        inventory_import._stage_batches(None, stream, ['name', 'price'])
+
+
+# The patterns run in Postgres; Python's re agrees on these anchored,
+# newline-free ASCII values
+@pytest.mark.parametrize('value, valid', [
+    ('0', True), ('42', True), ('999999999', True),
+    ('1000000000', False), ('-1', False), ('1.0', False), ('1e3', False), ('', False),
+])
+def test_integer_pattern(value, valid):
+    assert bool(re.search(INTEGER_PATTERN, value)) is valid
+
+
+@pytest.mark.parametrize('value, valid', [
+    ('0', True), ('1.5', True), ('19.99', True), ('99999999.99', True),
+    ('100000000', False), ('1.999', False), ('-1.00', False), ('.50', False), ('1,50', False),
+])
+def test_money_pattern(value, valid):
+    assert bool(re.search(MONEY_PATTERN, value)) is valid
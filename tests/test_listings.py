@@ -0,0 +1,139 @@
+import base64
+import json
+from datetime import datetime, timedelta
+import pytest
+from listings import encode_cursor, decode_cursor, fetch_history, fetch_inventory, fetch_orders
+
+
+def raw_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+class FakeCursor:
+    """Answers the keyset queries of listings.py from a list of row dicts.
+
+    The page query's last parameter is the LIMIT and the two before it are
+    the cursor key, if the query has one; rows are sorted and filtered the
+    way the query's ORDER BY and row comparison would.
+    """
+
+    def __init__(self, rows, sort_key, descending):
+        self.rows = rows
+        self.sort_key = sort_key
+        self.descending = descending
+        self.queries = []
+        self._result = []
+
+    def execute(self, query, params):
+        self.queries.append((query, params))
+        if 'FROM order_items' in query:
+            self._result = []
+            return
+
+        rows = sorted(self.rows, key=self.sort_key, reverse=self.descending)
+        if ') < (' in query or ') > (' in query:
+            after = self.sort_key({'created_at': params[-3], 'name': params[-3], 'id': params[-2]})
+            if self.descending:
+                rows = [row for row in rows if self.sort_key(row) < after]
+            else:
+                rows = [row for row in rows if self.sort_key(row) > after]
+        self._result = rows[:params[-1]]
+
+    def fetchall(self):
+        return self._result
+
+
+def timestamp_key(row):
+    created_at = row['created_at']
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    return created_at, row['id']
+
+
+def all_pages(fetch, cur, limit):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = fetch(cur, 1, cursor=cursor, limit=limit)
+        pages.append([row['id'] for row in rows])
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 3, 1, 12, 30, 15, 250000)
+    assert decode_cursor(encode_cursor(created_at, 42), timestamp=True) == [created_at.isoformat(), 42]
+    assert decode_cursor(encode_cursor('Widget', 7)) == ['Widget', 7]
+
+
+@pytest.mark.parametrize('cursor', [None, ''])
+def test_no_cursor_is_the_first_page(cursor):
+    assert decode_cursor(cursor) is None
+
+
+@pytest.mark.parametrize('cursor', [
+    'not a cursor',
+    'e30',                                  # truncated base64
+    base64.urlsafe_b64encode(b'\xff\xfe').decode(),
+    raw_cursor({'created_at': '2024-01-01', 'id': 1}),
+    raw_cursor(['2024-01-01T00:00:00']),
+    raw_cursor(['2024-01-01T00:00:00', 1, 2]),
+    raw_cursor(['2024-01-01T00:00:00', '1']),
+    raw_cursor(['2024-01-01T00:00:00', True]),
+    raw_cursor(['2024-01-01T00:00:00', 1.5]),
+    raw_cursor([None, 1]),
+])
+def test_invalid_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_cursor(cursor)
+
+
+def test_timestamp_cursor_needs_a_timestamp():
+    cursor = raw_cursor(['Widget', 7])
+    assert decode_cursor(cursor) == ['Widget', 7]
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_cursor(cursor, timestamp=True)
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        fetch_history(FakeCursor([], timestamp_key, True), 1, cursor=cursor)
+
+
+def test_history_pages_are_stable_on_tied_timestamps():
+    now = datetime(2024, 5, 1, 9, 0)
+    # Five entries share one timestamp, so only the id orders them
+    rows = [{'id': i, 'created_at': now} for i in range(1, 6)]
+    rows += [{'id': 6, 'created_at': now + timedelta(seconds=1)},
+             {'id': 7, 'created_at': now - timedelta(seconds=1)}]
+    cur = FakeCursor(rows, timestamp_key, descending=True)
+
+    assert all_pages(fetch_history, cur, limit=2) == [[6, 5], [4, 3], [2, 1], [7]]
+    query, params = cur.queries[-1]
+    assert 'ORDER BY created_at DESC, id DESC' in query
+    # The partition bound and the row comparison use the same timestamp
+    assert params[-4] == params[-3] == now.isoformat()
+
+
+def test_order_pages_are_stable_on_tied_timestamps():
+    now = datetime(2024, 5, 1, 9, 0)
+    rows = [{'id': i, 'created_at': now} for i in range(1, 8)]
+    cur = FakeCursor(rows, timestamp_key, descending=True)
+
+    pages = all_pages(fetch_orders, cur, limit=3)
+    assert pages == [[7, 6, 5], [4, 3, 2], [1]]
+    assert 'ORDER BY o.created_at DESC, o.id DESC' in cur.queries[0][0]
+
+
+def test_inventory_pages_are_stable_on_tied_names():
+    rows = [{'id': 3, 'name': 'Bolt'}, {'id': 1, 'name': 'Bolt'}, {'id': 2, 'name': 'Anchor'},
+            {'id': 5, 'name': 'Bolt'}, {'id': 4, 'name': 'Clamp'}]
+    cur = FakeCursor(rows, lambda row: (row['name'], row['id']), descending=False)
+
+    assert all_pages(fetch_inventory, cur, limit=2) == [[2, 1], [3, 5], [4]]
+    assert 'ORDER BY i.name ASC, i.id ASC' in cur.queries[0][0]
+
+
+def test_last_full_page_has_no_cursor():
+    rows = [{'id': i, 'name': f'Item {i}'} for i in range(1, 5)]
+    cur = FakeCursor(rows, lambda row: (row['name'], row['id']), descending=False)
+
+    rows, cursor = fetch_inventory(cur, 1, limit=4)
+    assert len(rows) == 4
+    assert cursor is None
@@ -0,0 +1,99 @@
+"""next_order_number under concurrent checkouts.
+
+Needs a database set up with setup_database.py (the usual DB_* settings);
+skipped when none is reachable.
+"""
+import os
+import threading
+import uuid
+import psycopg2
+import pytest
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WORKERS = 8
+ORDERS_PER_WORKER = 25
+
+
+def connect():
+    return psycopg2.connect(
+        database=os.getenv('DB_NAME', 'inv'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', '1234'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432'),
+        connect_timeout=3
+    )
+
+
+@pytest.fixture
+def conn():
+    try:
+        conn = connect()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"no database available: {e}")
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('order_number_counters')")
+        if cur.fetchone()[0] is None:
+            conn.close()
+            pytest.skip("database schema missing; run setup_database.py")
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def tenant(conn):
+    """Throwaway tenant; its orders and counters go with it by ON DELETE CASCADE"""
+    with conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO users (email, username, password) VALUES (%s, %s, %s) RETURNING id",
+            (f'order-numbers-{uuid.uuid4().hex}@example.com', 'order-numbers', '-')
+        )
+        user_id = cur.fetchone()[0]
+    yield user_id
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
+
+
+def create_orders(next_order_number, user_id, orders, errors):
+    """Create orders one transaction each, like concurrent checkouts"""
+    try:
+        conn = connect()
+        try:
+            with conn.cursor() as cur:
+                for _ in range(orders):
+                    with conn:
+                        order_number = next_order_number(cur, user_id)
+                        cur.execute(
+                            "INSERT INTO orders (user_id, order_number, customer, total) "
+                            "VALUES (%s, %s, %s, 0)",
+                            (user_id, order_number, 'Concurrency Test')
+                        )
+        finally:
+            conn.close()
+    except Exception as e:
+        errors.append(e)
+
+
+def test_concurrent_order_numbers_are_unique_and_gap_free(conn, tenant):
+    next_order_number = pytest.importorskip('app').next_order_number
+
+    errors = []
+    threads = [
+        threading.Thread(target=create_orders, args=(next_order_number, tenant, ORDERS_PER_WORKER, errors))
+        for _ in range(WORKERS)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with conn.cursor() as cur:
+        cur.execute("SELECT order_number FROM orders WHERE user_id = %s", (tenant,))
+        numbers = [row[0] for row in cur.fetchall()]
+    expected = WORKERS * ORDERS_PER_WORKER
+    assert len(set(numbers)) == len(numbers) == expected
+    assert sorted(int(number.split('-')[-1]) for number in numbers) == list(range(1, expected + 1))
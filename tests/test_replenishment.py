@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip('pandas')
+
+from replenishment import replenishment_settings, MAX_SETTING_DAYS
+
+
+@pytest.fixture(autouse=True)
+def no_env_settings(monkeypatch):
+    for name in ('REPLENISHMENT_HISTORY_DAYS', 'REPLENISHMENT_LEAD_TIME_DAYS', 'REPLENISHMENT_REVIEW_DAYS'):
+        monkeypatch.delenv(name, raising=False)
+
+
+def test_defaults():
+    assert replenishment_settings() == {'history_days': 30, 'lead_time_days': 7, 'review_days': 7}
+
+
+def test_query_args_override_environment(monkeypatch):
+    monkeypatch.setenv('REPLENISHMENT_LEAD_TIME_DAYS', '14')
+    assert replenishment_settings({})['lead_time_days'] == 14
+    assert replenishment_settings({'lead_time_days': '3'})['lead_time_days'] == 3
+
+
+def test_empty_args_fall_back():
+    assert replenishment_settings({'history_days': '', 'review_days': ''}) == replenishment_settings()
+
+
+def test_zero_lead_time_and_review_are_allowed():
+    settings = replenishment_settings({'lead_time_days': '0', 'review_days': '0'})
+    assert settings['lead_time_days'] == settings['review_days'] == 0
+
+
+@pytest.mark.parametrize('args, message', [
+    ({'history_days': '0'}, 'history_days must be positive'),
+    ({'lead_time_days': '-1'}, 'lead_time_days must not be negative'),
+    ({'review_days': 'soon'}, 'review_days must be a whole number'),
+    ({'history_days': '1.5'}, 'history_days must be a whole number'),
+    ({'history_days': str(MAX_SETTING_DAYS + 1)}, f'history_days must be at most {MAX_SETTING_DAYS}'),
+])
+def test_invalid_settings(args, message):
+    with pytest.raises(ValueError, match=message):
+        replenishment_settings(args)
+
+
+def test_invalid_environment_setting(monkeypatch):
+    monkeypatch.setenv('REPLENISHMENT_HISTORY_DAYS', 'thirty')
+    with pytest.raises(ValueError, match='history_days must be a whole number'):
+        replenishment_settings()